@@ -0,0 +1,143 @@
+import asyncio
+import secrets
+import time
+from collections.abc import Mapping
+from typing import Annotated, Any
+
+import httpx
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+
+from app.channel import Channel
+from app.config import settings
+from app.schedule_cache import schedule_cache
+from app.utils.http import revalidate_upstream
+
+
+def require_admin_token(
+    authorization: Annotated[str | None, Header()] = None,
+) -> None:
+    if settings.admin_token is None:
+        # The admin API does not exist unless a token is configured.
+        raise HTTPException(status_code=404)
+
+    expected = f"Bearer {settings.admin_token.get_secret_value()}"
+    if authorization is None or not secrets.compare_digest(
+        authorization.encode(), expected.encode()
+    ):
+        raise HTTPException(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin_token)])
+
+
+def _channels(request: Request) -> Mapping[str, Channel]:
+    return request.app.state.path_to_channel
+
+
+def _channel(request: Request, path: str) -> Channel:
+    channel = _channels(request).get(path)
+    if channel is None:
+        raise HTTPException(status_code=404)
+    return channel
+
+
+def entry_state(key: str) -> dict[str, Any]:
+    now = time.monotonic()
+    entry = schedule_cache.peek(key)
+    stats = schedule_cache.stats(key)
+    state: dict[str, Any] = {
+        "cached": entry is not None,
+        "refreshing": schedule_cache.refreshing(key),
+        "last_error": stats.last_error,
+        "last_error_age_seconds": (
+            None if stats.last_error_at is None else now - stats.last_error_at
+        ),
+    }
+    if entry is not None:
+        state |= {
+            "fresh": entry.is_fresh(now),
+            "age_seconds": now - entry.fetched_at,
+            "expires_in_seconds": entry.expires_at - now,
+            "size_bytes": entry.size_bytes,
+            "programs": len(entry.schedule.programs),
+        }
+    return state
+
+
+def cache_state(path: str) -> dict[str, Any]:
+    """
+    Returns the state of a feed's cache entry and of its cached windows.
+    """
+    return entry_state(path) | {
+        "windows": {key: entry_state(key) for key in schedule_cache.windows(path)}
+    }
+
+
+async def refresh_feed(
+    path: str, channel: Channel, client: httpx.AsyncClient
+) -> list[BaseException]:
+    """
+    Refreshes a feed and its cached windows, returning the errors of the
+    refreshes that failed.
+    """
+    keys = {path: None, **schedule_cache.windows(path)}
+    results = await asyncio.gather(
+        *(
+            schedule_cache.refresh(key, channel, client, days)
+            for key, days in keys.items()
+        ),
+        return_exceptions=True,
+    )
+    return [r for r in results if isinstance(r, BaseException)]
+
+
+@router.get("/cache")
+async def get_cache_states(request: Request) -> dict[str, dict[str, Any]]:
+    return {path: cache_state(path) for path in _channels(request)}
+
+
+@router.get("/cache/{path}")
+async def get_cache_state(path: str, request: Request) -> dict[str, Any]:
+    _channel(request, path)
+    return cache_state(path)
+
+
+@router.delete("/cache", status_code=204)
+async def invalidate_cache() -> Response:
+    schedule_cache.invalidate()
+    return Response(status_code=204)
+
+
+@router.delete("/cache/{path}", status_code=204)
+async def invalidate_cache_entry(path: str, request: Request) -> Response:
+    _channel(request, path)
+    schedule_cache.invalidate(path)
+    return Response(status_code=204)
+
+
+@router.post("/cache/refresh")
+async def refresh_cache(request: Request) -> dict[str, dict[str, Any]]:
+    """
+    Refreshes every channel now, revalidating cached upstream responses.
+    Refreshes already in flight are joined rather than repeated; failures are
+    reported in each channel's `last_error`.
+    """
+    revalidate_upstream.set(True)
+    client = request.app.state.http_client
+    channels = _channels(request)
+    await asyncio.gather(
+        *(refresh_feed(path, c, client) for path, c in channels.items())
+    )
+    return {path: cache_state(path) for path in channels}
+
+
+@router.post("/cache/{path}/refresh")
+async def refresh_cache_entry(path: str, request: Request) -> dict[str, Any]:
+    channel = _channel(request, path)
+    revalidate_upstream.set(True)
+    errors = await refresh_feed(path, channel, request.app.state.http_client)
+    if errors:
+        raise HTTPException(
+            status_code=502, detail=f"Refresh of {path} failed: {errors[0]}"
+        ) from errors[0]
+    return cache_state(path)
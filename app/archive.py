@@ -0,0 +1,333 @@
+import asyncio
+import base64
+import concurrent.futures
+import datetime
+import logging
+import sqlite3
+import time
+from collections.abc import Callable, Sequence
+from typing import Annotated, Any
+
+from fastapi import APIRouter, HTTPException, Query, Request
+
+from app.channel import TOKYO, Program
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("dtv_archive_programs_total", "Programs added to the archive.")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS programs (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    url TEXT,
+    description TEXT,
+    digest BLOB NOT NULL,
+    first_seen INTEGER NOT NULL,
+    UNIQUE (channel, digest)
+);
+CREATE INDEX IF NOT EXISTS programs_channel_start ON programs (channel, start, id);
+CREATE INDEX IF NOT EXISTS programs_start ON programs (start, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS programs_fts USING fts5(
+    title, description, content='programs', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS programs_fts_insert AFTER INSERT ON programs BEGIN
+    INSERT INTO programs_fts (rowid, title, description)
+    VALUES (new.id, new.title, new.description);
+END;
+"""
+
+# The trigram tokenizer cannot match queries shorter than a trigram.
+_MIN_FTS_QUERY = 3
+
+
+def _encode_cursor(start: int, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{start}:{row_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[int, int]:
+    try:
+        start, row_id = base64.urlsafe_b64decode(cursor).decode().split(":")
+        return int(start), int(row_id)
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _like_pattern(query: str) -> str:
+    escaped = query.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    return f"%{escaped}%"
+
+
+class ProgramArchive:
+    """
+    An append-only SQLite archive of every program seen on each feed.
+
+    A program is stored once per feed and content digest, so unchanged
+    programs are skipped and edited ones are kept as new rows. Rows are
+    indexed on start, with and without the channel, and full-text indexed
+    with trigrams, which match Japanese text without word segmentation.
+    Listings and searches walk a start index and page by keyset cursors, so
+    deep pages cost the same as the first.
+
+    All database work runs on one dedicated thread, off the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="archive"
+        )
+        self._conn: sqlite3.Connection | None = None
+        self._pending: set[asyncio.Future[int]] = set()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            conn.row_factory = sqlite3.Row
+            self._conn = conn
+        return self._conn
+
+    async def _run[T](self, fn: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _append(self, channel: str, programs: Sequence[Program]) -> int:
+        conn = self._connect()
+        now = int(time.time())
+        with conn:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO programs"
+                " (channel, start, title, url, description, digest, first_seen)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        channel,
+                        int(program.start.timestamp()),
+                        program.title,
+                        str(program.url) if program.url else None,
+                        program.description,
+                        program.digest,
+                        now,
+                    )
+                    for program in programs
+                ),
+            )
+        return cursor.rowcount
+
+    async def append(self, channel: str, programs: Sequence[Program]) -> int:
+        """
+        Stores the programs not archived for `channel` yet, in one transaction,
+        and returns how many were new.
+        """
+        added = await self._run(self._append, channel, programs)
+        metrics.inc("dtv_archive_programs_total", added, channel=channel)
+        return added
+
+    def append_in_background(self, channel: str, programs: Sequence[Program]) -> None:
+        future = asyncio.ensure_future(self.append(channel, programs))
+        self._pending.add(future)
+        future.add_done_callback(self._on_append_done)
+
+    def _on_append_done(self, future: asyncio.Future[int]) -> None:
+        self._pending.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Failed to archive programs", exc_info=future.exception())
+
+    def _list(
+        self,
+        channel: str,
+        start: int | None,
+        end: int | None,
+        after: tuple[int, int] | None,
+        limit: int,
+    ) -> list[sqlite3.Row]:
+        clauses = ["channel = ?"]
+        params: list[Any] = [channel]
+        if start is not None:
+            clauses.append("start >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("start < ?")
+            params.append(end)
+        if after is not None:
+            clauses.append("(start, id) > (?, ?)")
+            params.extend(after)
+        return (
+            self._connect()
+            .execute(
+                "SELECT * FROM programs"
+                f" WHERE {' AND '.join(clauses)}"
+                " ORDER BY start, id LIMIT ?",
+                [*params, limit],
+            )
+            .fetchall()
+        )
+
+    async def programs(
+        self,
+        channel: str,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+        cursor: str | None = None,
+        limit: int = 100,
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        """
+        Returns a page of the channel's programs starting in [start, end), in
+        start order, and the cursor of the next page if there is one.
+        """
+        rows = await self._run(
+            self._list,
+            channel,
+            int(start.timestamp()) if start else None,
+            int(end.timestamp()) if end else None,
+            _decode_cursor(cursor) if cursor else None,
+            limit,
+        )
+        return self._page(rows, limit)
+
+    def _search(
+        self,
+        query: str,
+        channel: str | None,
+        before: tuple[int, int] | None,
+        limit: int,
+    ) -> list[sqlite3.Row]:
+        params: list[Any]
+        if len(query) >= _MIN_FTS_QUERY:
+            # Matches are checked as rows are read off a start index, which
+            # stops at the limit, instead of looking up and sorting every
+            # match; `+` keeps the planner from doing the latter.
+            clauses = [
+                "+id IN (SELECT rowid FROM programs_fts WHERE programs_fts MATCH ?)"
+            ]
+            params = ['"' + query.replace('"', '""') + '"']
+        else:
+            # Too short for the index; scan instead.
+            clauses = ["(title LIKE ? ESCAPE '!' OR description LIKE ? ESCAPE '!')"]
+            params = [_like_pattern(query)] * 2
+        if channel is not None:
+            clauses.append("channel = ?")
+            params.append(channel)
+        if before is not None:
+            clauses.append("(start, id) < (?, ?)")
+            params.extend(before)
+        return (
+            self._connect()
+            .execute(
+                "SELECT * FROM programs"
+                f" WHERE {' AND '.join(clauses)}"
+                " ORDER BY start DESC, id DESC LIMIT ?",
+                [*params, limit],
+            )
+            .fetchall()
+        )
+
+    async def search(
+        self,
+        query: str,
+        channel: str | None = None,
+        cursor: str | None = None,
+        limit: int = 100,
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        """
+        Returns a page of programs whose title or description contains
+        `query`, most recent first, and the cursor of the next page.
+        """
+        rows = await self._run(
+            self._search,
+            query,
+            channel,
+            _decode_cursor(cursor) if cursor else None,
+            limit,
+        )
+        return self._page(rows, limit)
+
+    @staticmethod
+    def _page(
+        rows: list[sqlite3.Row], limit: int
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        items = [
+            {
+                "channel": row["channel"],
+                "title": row["title"],
+                "url": row["url"],
+                "description": row["description"],
+                "start": datetime.datetime.fromtimestamp(
+                    row["start"], tz=TOKYO
+                ).isoformat(),
+            }
+            for row in rows
+        ]
+        next_cursor = (
+            _encode_cursor(rows[-1]["start"], rows[-1]["id"])
+            if len(rows) == limit
+            else None
+        )
+        return items, next_cursor
+
+    async def close(self) -> None:
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+
+router = APIRouter(prefix="/archive")
+
+
+def _archive(request: Request) -> ProgramArchive:
+    archive = getattr(request.app.state, "archive", None)
+    if archive is None:
+        raise HTTPException(status_code=404)
+    return archive
+
+
+def _response(
+    page: tuple[list[dict[str, Any]], str | None],
+) -> dict[str, Any]:
+    items, next_cursor = page
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/search")
+async def search_archive(
+    request: Request,
+    q: Annotated[str, Query(min_length=1)],
+    channel: str | None = None,
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+) -> dict[str, Any]:
+    try:
+        page = await _archive(request).search(q, channel, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return _response(page)
+
+
+@router.get("/{path}")
+async def list_archive(
+    request: Request,
+    path: str,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+) -> dict[str, Any]:
+    if path not in request.app.state.path_to_channel:
+        raise HTTPException(status_code=404)
+    for value in (start, end):
+        if value is not None and value.tzinfo is None:
+            raise HTTPException(status_code=400, detail="Times need a UTC offset")
+    try:
+        page = await _archive(request).programs(path, start, end, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return _response(page)
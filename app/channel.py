@@ -1,10 +1,21 @@
 import abc
+import asyncio
 import datetime
+import functools
+import hashlib
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable, Sequence
+from zoneinfo import ZoneInfo
 
 import httpx
 from pydantic import AwareDatetime, BaseModel, HttpUrl
 
 from app import rss
+from app.utils.http import RequestPriority, day_priority
+
+TOKYO = ZoneInfo("Asia/Tokyo")
+
+# Broadcast days run past midnight until 4:00 (28:00 in TV listings).
+BROADCAST_DAY_END = datetime.timedelta(hours=4)
 
 
 class Program(BaseModel):
@@ -13,22 +24,62 @@ class Program(BaseModel):
     description: str | None
     start: AwareDatetime
 
-    @property
-    def rss_description(self) -> str:
+    @functools.cached_property
+    def digest(self) -> bytes:
+        """
+        A digest of the program's content, stable across processes.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for value in (
+            self.title,
+            str(self.url or ""),
+            self.description or "",
+            self.start.isoformat(),
+        ):
+            digest.update(value.encode() + b"\x1f")
+        return digest.digest()
+
+    # The fields below are computed once per program and shared by every
+    # feed format.
+
+    @functools.cached_property
+    def summary(self) -> str:
         return (
             self.start.strftime("%m/%d %H:%M") + "\n\n" + (self.description or "")
         ).strip()
 
-    @property
-    def rss_pub_date(self) -> datetime.datetime:
+    @functools.cached_property
+    def published(self) -> datetime.datetime:
         # to make pubDate in the past, subtract 7 days from start for convenience
         return self.start - datetime.timedelta(days=7)
 
-    def to_rss_item(self) -> rss.Item:
+    @property
+    def rss_description(self) -> str:
+        return self.summary
+
+    @property
+    def rss_pub_date(self) -> datetime.datetime:
+        return self.published
+
+    def guid(self, channel_name: str) -> str:
+        """
+        A stable identifier of the program's airing on a channel, derived from
+        its start and title, so readers recognize it across refreshes even if
+        its description or link change, and tell apart programs sharing a
+        start.
+        """
+        start = self.start.astimezone(datetime.UTC).isoformat()
+        digest = hashlib.blake2b(
+            f"{channel_name}\x1f{start}\x1f{self.title}".encode(), digest_size=16
+        )
+        return f"urn:dtv-schedule-rss:{digest.hexdigest()}"
+
+    def to_rss_item(self, channel_name: str | None = None) -> rss.Item:
         return rss.Item(
             title=self.title,
             link=self.url,
             description=self.rss_description,
+            guid=self.guid(channel_name) if channel_name is not None else None,
             pub_date=self.rss_pub_date,
         )
 
@@ -38,21 +89,147 @@ class Schedule(BaseModel):
     channel_url: HttpUrl
     programs: list[Program]
 
+    @functools.cached_property
+    def version(self) -> str:
+        """
+        A digest of the schedule's content. It is stable across processes, so
+        schedules parsed from unchanged upstream bodies keep their version.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for value in (self.channel_name, str(self.channel_url)):
+            digest.update(value.encode() + b"\x1f")
+        for program in self.programs:
+            digest.update(program.digest)
+        return digest.hexdigest()
+
     def to_rss_channel(self) -> rss.Channel:
         return rss.Channel(
             title=self.channel_name,
             link=self.channel_url,
             description="",
-            item=[program.to_rss_item() for program in self.programs],
+            item=[program.to_rss_item(self.channel_name) for program in self.programs],
         )
 
 
+def broadcast_today() -> datetime.date:
+    return datetime.datetime.now(tz=TOKYO).date()
+
+
+def window_end(days: int) -> datetime.datetime:
+    """
+    Returns when the last of `days` broadcast days starting today ends.
+    """
+    last_day = broadcast_today() + datetime.timedelta(days=days)
+    midnight = datetime.datetime.combine(last_day, datetime.time(), tzinfo=TOKYO)
+    return midnight + BROADCAST_DAY_END
+
+
+def within_days(programs: Iterable[Program], days: int | None) -> list[Program]:
+    """
+    Returns the programs starting before the end of a `days`-day window, or
+    all of them when `days` is None.
+    """
+    if days is None:
+        return list(programs)
+    end = window_end(days)
+    return [program for program in programs if program.start < end]
+
+
+async def iter_weekly_pages(
+    fetch: Callable[[str, RequestPriority], Awaitable[Sequence[Program]]],
+    urls: Sequence[str],
+    days: int | None,
+) -> AsyncIterator[Sequence[Program]]:
+    """
+    Yields the programs of consecutive weekly pages. Without a window, every
+    page is fetched concurrently. With one, a page is fetched only if the
+    pages before it end inside the window.
+    """
+    if days is None:
+        tasks = [fetch(url, day_priority(7 * i)) for i, url in enumerate(urls)]
+        async for programs in iter_in_order(tasks):
+            yield programs
+        return
+
+    end = window_end(days)
+    for i, url in enumerate(urls):
+        programs = await fetch(url, day_priority(7 * i))
+        yield within_days(programs, days)
+        if any(program.start >= end for program in programs):
+            return
+
+
+async def iter_in_order[T](awaitables: Iterable[Awaitable[T]]) -> AsyncIterator[T]:
+    """
+    Runs the awaitables concurrently and yields their results in the given
+    order, each as soon as it and all before it are available.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in awaitables]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # mark as retrieved
+
+
 class Channel(abc.ABC):
+    # Days the sources publish ahead, when fixed; longer windows are the
+    # full schedule.
+    published_days: int | None = None
+
     @property
     @abc.abstractmethod
     def channel_name(self) -> str:
         pass
 
+    @property
     @abc.abstractmethod
-    async def fetch_schedule(self, client: httpx.AsyncClient) -> Schedule:
+    def channel_url(self) -> HttpUrl:
         pass
+
+    @property
+    def upstream_hosts(self) -> frozenset[str]:
+        """
+        The hosts the schedule is fetched from, so connections to them can be
+        opened ahead of the first fetch. By default, the channel page's host.
+        """
+        host = self.channel_url.host
+        return frozenset({host}) if host else frozenset()
+
+    @abc.abstractmethod
+    async def fetch_schedule(
+        self, client: httpx.AsyncClient, days: int | None = None
+    ) -> Schedule:
+        """
+        Fetches the schedule of the `days` broadcast days starting today, or
+        of every day the channel's sources cover when `days` is None.
+        """
+        pass
+
+    async def iter_schedule_segments(
+        self, client: httpx.AsyncClient, days: int | None = None
+    ) -> AsyncIterator[Sequence[Program]]:
+        """
+        Yields the schedule's programs in order, one segment (typically a day)
+        at a time, as soon as each segment is available.
+        """
+        schedule = await self.fetch_schedule(client, days)
+        yield schedule.programs
+
+    async def schedule_from_segments(
+        self, client: httpx.AsyncClient, days: int | None = None
+    ) -> Schedule:
+        programs = [
+            program
+            async for segment in self.iter_schedule_segments(client, days)
+            for program in segment
+        ]
+        return Schedule(
+            channel_name=self.channel_name,
+            channel_url=self.channel_url,
+            programs=programs,
+        )
@@ -1,19 +1,105 @@
-from .fujitv import fujitv
-from .mx_tv import mx_tv_1, mx_tv_2
-from .nhk import nhk_e1_130, nhk_g1_130
-from .ntv import ntv
-from .tbs import tbs
-from .tv_asahi import tv_asahi
-from .tv_tokyo import tv_tokyo
+import importlib
+import threading
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from dataclasses import dataclass
+
+from app.channel import Channel
+from app.channels.nhk_areas import area_channel_name, area_paths
+
+
+@dataclass(frozen=True)
+class ChannelFactory:
+    """
+    Builds (or looks up) a channel, importing its module on first use. The
+    channel's name is known up front, so listing channels imports nothing.
+    """
+
+    channel_name: str
+    load: Callable[[], Channel]
+
+
+def lazy_channel(module: str, name: str, channel_name: str) -> ChannelFactory:
+    """
+    Returns a factory of the channel `name` defined in `app.channels.<module>`,
+    named `channel_name`.
+    """
+
+    def load() -> Channel:
+        return getattr(importlib.import_module(f"{__name__}.{module}"), name)
+
+    return ChannelFactory(channel_name, load)
+
+
+def nhk_area_channels(area_ids: Iterable[str]) -> dict[str, ChannelFactory]:
+    """
+    Returns factories of the NHK channels of the given areas, by feed path.
+    Unknown areas are rejected at once, without importing the NHK module.
+    """
+
+    def factory(service_id: str, area_id: str) -> ChannelFactory:
+        def load() -> Channel:
+            from app.channels.nhk import area_channel
+
+            return area_channel(service_id, area_id)
+
+        return ChannelFactory(area_channel_name(service_id, area_id), load)
+
+    return {
+        path: factory(service_id, area_id)
+        for path, (service_id, area_id) in area_paths(area_ids).items()
+    }
+
+
+class ChannelRegistry(Mapping[str, Channel]):
+    """
+    Channels by feed path. Each channel is built on first access, so channel
+    modules, and the parsers and models they pull in, are imported only when
+    a feed is first requested or when `load_all` warms them up. Membership,
+    iteration over paths and `names` never import anything.
+    """
+
+    def __init__(self, factories: Mapping[str, ChannelFactory]):
+        self._factories = dict(factories)
+        self._channels: dict[str, Channel] = {}
+        # `load_all` may run in a thread while requests load channels.
+        self._lock = threading.Lock()
+
+    def __getitem__(self, path: str) -> Channel:
+        channel = self._channels.get(path)
+        if channel is None:
+            with self._lock:
+                channel = self._channels.get(path)
+                if channel is None:
+                    factory = self._factories[path]
+                    channel = self._channels[path] = factory.load()
+        return channel
+
+    def __contains__(self, path: object) -> bool:
+        return path in self._factories
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._factories)
+
+    def __len__(self) -> int:
+        return len(self._factories)
+
+    def names(self) -> dict[str, str]:
+        """
+        Returns each channel's name by feed path, without building any.
+        """
+        return {path: f.channel_name for path, f in self._factories.items()}
+
+    def loaded(self) -> list[str]:
+        return list(self._channels)
+
+    def load_all(self) -> None:
+        for path in self._factories:
+            self[path]
+
 
 __all__ = [
-    "fujitv",
-    "mx_tv_1",
-    "mx_tv_2",
-    "nhk_e1_130",
-    "nhk_g1_130",
-    "ntv",
-    "tbs",
-    "tv_asahi",
-    "tv_tokyo",
+    "ChannelFactory",
+    "ChannelRegistry",
+    "lazy_channel",
+    "nhk_area_channels",
 ]
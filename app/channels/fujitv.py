@@ -1,14 +1,10 @@
-import asyncio
 import datetime
-import itertools
+from typing import Any
 
-import httpx
-from async_lru import alru_cache
 from pydantic import BaseModel, HttpUrl
 
-from app.channel import Channel, Program, Schedule
-from app.config import settings
-from app.utils.http import fetch_json_with_retry
+from app.channel import Program
+from app.day_channel import DayChannel
 
 
 def parse_datetime(datetime_str: str) -> datetime.datetime:
@@ -37,38 +33,26 @@ class FujitvProgram(BaseModel):
         )
 
 
-async def fetch_fujitv_programs(
-    client: httpx.AsyncClient, date: datetime.date
-) -> tuple[FujitvProgram, ...]:
-    url = (
-        f"https://www.fujitv.co.jp/bangumi/json/timetable_{date.strftime('%Y%m%d')}.js"
-    )
-    response_json = await fetch_json_with_retry(client, url)
-
-    return tuple(
-        FujitvProgram.model_validate(item) for item in response_json["contents"]["item"]
-    )
-
+class Fujitv(DayChannel[FujitvProgram]):
+    item_type = FujitvProgram
+    source_name = "fujitv"
 
-class Fujitv(Channel):
     @property
     def channel_name(self) -> str:
         return "フジテレビ"
 
-    @alru_cache(ttl=settings.schedule_cache_ttl_seconds)
-    async def fetch_schedule(self, client: httpx.AsyncClient) -> Schedule:
-        today = datetime.date.today()
-        dates = [today + datetime.timedelta(days=i) for i in range(7)]
+    @property
+    def channel_url(self) -> HttpUrl:
+        return HttpUrl("https://www.fujitv.co.jp/timetable/weekly/")
 
-        tasks = [fetch_fujitv_programs(client, date) for date in dates]
-        results = await asyncio.gather(*tasks)
-        fujitv_programs = itertools.chain.from_iterable(results)
+    def day_url(self, day: datetime.date) -> str:
+        return f"https://www.fujitv.co.jp/bangumi/json/timetable_{day.strftime('%Y%m%d')}.js"
 
-        return Schedule(
-            channel_name=self.channel_name,
-            channel_url=HttpUrl("https://www.fujitv.co.jp/timetable/weekly/"),
-            programs=[p.to_program() for p in fujitv_programs],
-        )
+    def extract_items(self, response_json: Any) -> list[Any]:
+        return response_json["contents"]["item"]
+
+    def to_program(self, item: FujitvProgram, day: datetime.date) -> Program:
+        return item.to_program()
 
 
 fujitv = Fujitv()
@@ -1,16 +1,10 @@
-import asyncio
 import datetime
-import itertools
-from typing import Literal
-from zoneinfo import ZoneInfo
+from typing import Any, Literal
 
-import httpx
-from async_lru import alru_cache
 from pydantic import BaseModel, Field, HttpUrl
 
-from app.channel import Channel, Program, Schedule
-from app.config import settings
-from app.utils.http import fetch_json_with_retry
+from app.channel import TOKYO, Program
+from app.day_channel import DayChannel
 
 MxTvChannel = Literal[1, 2]
 
@@ -24,7 +18,7 @@ class TokyoMxProgram(BaseModel):
     def to_program(self, mxtv_channel: MxTvChannel) -> Program:
         start = datetime.datetime.strptime(
             self.start_time, "%Y年%m月%d日%H時%M分%S秒"
-        ).replace(tzinfo=ZoneInfo("Asia/Tokyo"))
+        ).replace(tzinfo=TOKYO)
 
         url = f"https://s.mxtv.jp/bangumi/program.html?date={start.strftime('%Y%m%d')}&ch={mxtv_channel}&hm={start.strftime('%H%M')}"
 
@@ -36,25 +30,10 @@ class TokyoMxProgram(BaseModel):
         )
 
 
-async def fetch_mxtv_programs(
-    client: httpx.AsyncClient, mxtv_channel: MxTvChannel, date: datetime.datetime
-) -> tuple[TokyoMxProgram, ...]:
-    url = f"https://s.mxtv.jp/bangumi_file/json01/SV{mxtv_channel}EPG{date.strftime('%Y%m%d')}.json"
-    response_json = await fetch_json_with_retry(client, url)
+class MxTv(DayChannel[TokyoMxProgram]):
+    item_type = TokyoMxProgram
+    source_name = "mx_tv"
 
-    return tuple(TokyoMxProgram.model_validate(item) for item in response_json)
-
-
-async def get_programs(
-    client: httpx.AsyncClient, mxtv_channel: MxTvChannel, date: datetime.datetime
-) -> tuple[Program, ...]:
-    mxtv_programs = await fetch_mxtv_programs(
-        client=client, mxtv_channel=mxtv_channel, date=date
-    )
-    return tuple(p.to_program(mxtv_channel) for p in mxtv_programs)
-
-
-class MxTv(Channel):
     def __init__(self, channel: MxTvChannel):
         super().__init__()
         self.channel = channel
@@ -63,22 +42,18 @@ class MxTv(Channel):
     def channel_name(self) -> str:
         return f"TOKYO MX {self.channel}"
 
-    @alru_cache(ttl=settings.schedule_cache_ttl_seconds)
-    async def fetch_schedule(self, client: httpx.AsyncClient) -> Schedule:
-        today = datetime.datetime.now(tz=ZoneInfo("Asia/Tokyo")).replace(
-            hour=0, minute=0, second=0, microsecond=0
-        )
-        dates = [today + datetime.timedelta(days=i) for i in range(7)]
+    @property
+    def channel_url(self) -> HttpUrl:
+        return HttpUrl("https://s.mxtv.jp/bangumi/")
 
-        tasks = [get_programs(client, self.channel, date) for date in dates]
-        results = await asyncio.gather(*tasks)
-        programs = list(itertools.chain.from_iterable(results))
+    def day_url(self, day: datetime.date) -> str:
+        return f"https://s.mxtv.jp/bangumi_file/json01/SV{self.channel}EPG{day.strftime('%Y%m%d')}.json"
 
-        return Schedule(
-            channel_name=self.channel_name,
-            channel_url=HttpUrl("https://s.mxtv.jp/bangumi/"),
-            programs=programs,
-        )
+    def extract_items(self, response_json: Any) -> list[Any]:
+        return response_json
+
+    def to_program(self, item: TokyoMxProgram, day: datetime.date) -> Program:
+        return item.to_program(self.channel)
 
 
 mx_tv_1 = MxTv(channel=1)
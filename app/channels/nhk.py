@@ -1,15 +1,28 @@
-import asyncio
 import datetime
-import itertools
-from typing import Literal
+import weakref
+from typing import Any, Literal
 
-import httpx
-from async_lru import alru_cache
 from pydantic import BaseModel, HttpUrl
 
-from app.channel import Channel, Program, Schedule
-from app.config import settings
-from app.utils.http import fetch_json_with_retry
+from app.channel import Program
+from app.channels.nhk_areas import PUBLISHED_DAYS, area_channel_name
+from app.day_channel import DayChannel
+
+# Programs broadcast nationwide are parsed once per area; interning keeps a
+# single copy of each while any cached schedule holds it.
+_interned_programs: weakref.WeakValueDictionary[
+    tuple[str, str, str, datetime.datetime], Program
+] = weakref.WeakValueDictionary()
+
+
+def intern_program(program: Program) -> Program:
+    key = (
+        program.title,
+        str(program.url or ""),
+        program.description or "",
+        program.start,
+    )
+    return _interned_programs.setdefault(key, program)
 
 
 class About(BaseModel):
@@ -34,21 +47,11 @@ class BroadcastEvent(BaseModel):
         )
 
 
-async def fetch_broadcast_events(
-    client: httpx.AsyncClient, service_id: str, area_id: str, date: datetime.date
-) -> tuple[BroadcastEvent, ...]:
-    url = (
-        f"https://api.nhk.jp/r7/pg/date/{service_id}/{area_id}/{date.isoformat()}.json"
-    )
-    response_json = await fetch_json_with_retry(client, url)
-
-    return tuple(
-        BroadcastEvent.model_validate(d)
-        for d in response_json[service_id]["publication"]
-    )
-
+class Nhk(DayChannel[BroadcastEvent]):
+    item_type = BroadcastEvent
+    source_name = "nhk"
+    published_days = PUBLISHED_DAYS
 
-class Nhk(Channel):
     def __init__(self, channel_name: str, service_id: str, area_id: str):
         super().__init__()
         self._channel_name = channel_name
@@ -59,26 +62,27 @@ class Nhk(Channel):
     def channel_name(self) -> str:
         return self._channel_name
 
-    @alru_cache(ttl=settings.schedule_cache_ttl_seconds)
-    async def fetch_schedule(self, client: httpx.AsyncClient) -> Schedule:
-        today = datetime.date.today()
-        dates = [today + datetime.timedelta(days=i) for i in range(7)]
-
-        tasks = [
-            fetch_broadcast_events(client, self.service_id, self.area_id, date)
-            for date in dates
-        ]
-        results = await asyncio.gather(*tasks)
-        broadcast_events = itertools.chain.from_iterable(results)
-
-        return Schedule(
-            channel_name=self.channel_name,
-            channel_url=HttpUrl(f"https://www.nhk.jp/timetable/{self.area_id}/tv/"),
-            programs=[
-                broadcast_event.to_program() for broadcast_event in broadcast_events
-            ],
-        )
+    @property
+    def channel_url(self) -> HttpUrl:
+        return HttpUrl(f"https://www.nhk.jp/timetable/{self.area_id}/tv/")
+
+    def day_url(self, day: datetime.date) -> str:
+        return f"https://api.nhk.jp/r7/pg/date/{self.service_id}/{self.area_id}/{day.isoformat()}.json"
+
+    def extract_items(self, response_json: Any) -> list[Any]:
+        return response_json[self.service_id]["publication"]
+
+    def to_program(self, item: BroadcastEvent, day: datetime.date) -> Program:
+        return intern_program(item.to_program())
 
 
 nhk_g1_130 = Nhk(channel_name="NHK総合1・東京", service_id="g1", area_id="130")
 nhk_e1_130 = Nhk(channel_name="NHK Eテレ1・東京", service_id="e1", area_id="130")
+
+
+def area_channel(service_id: str, area_id: str) -> Nhk:
+    return Nhk(
+        channel_name=area_channel_name(service_id, area_id),
+        service_id=service_id,
+        area_id=area_id,
+    )
@@ -0,0 +1,86 @@
+from collections.abc import Iterable
+
+# NHK's program guide area codes, one broadcasting station per prefecture.
+AREAS: dict[str, str] = {
+    "010": "札幌",
+    "020": "青森",
+    "030": "盛岡",
+    "040": "仙台",
+    "050": "秋田",
+    "060": "山形",
+    "070": "福島",
+    "080": "水戸",
+    "090": "宇都宮",
+    "100": "前橋",
+    "110": "さいたま",
+    "120": "千葉",
+    "130": "東京",
+    "140": "横浜",
+    "150": "新潟",
+    "160": "富山",
+    "170": "金沢",
+    "180": "福井",
+    "190": "甲府",
+    "200": "長野",
+    "210": "岐阜",
+    "220": "静岡",
+    "230": "名古屋",
+    "240": "津",
+    "250": "大津",
+    "260": "京都",
+    "270": "大阪",
+    "280": "神戸",
+    "290": "奈良",
+    "300": "和歌山",
+    "310": "鳥取",
+    "320": "松江",
+    "330": "岡山",
+    "340": "広島",
+    "350": "山口",
+    "360": "徳島",
+    "370": "高松",
+    "380": "松山",
+    "390": "高知",
+    "400": "福岡",
+    "410": "佐賀",
+    "420": "長崎",
+    "430": "熊本",
+    "440": "大分",
+    "450": "宮崎",
+    "460": "鹿児島",
+    "470": "沖縄",
+}
+
+SERVICES: dict[str, str] = {"g1": "NHK総合1", "e1": "NHK Eテレ1"}
+
+# Days the program guide API publishes ahead, one document per day.
+PUBLISHED_DAYS = 7
+
+
+def area_channel_name(service_id: str, area_id: str) -> str:
+    return f"{SERVICES[service_id]}・{AREAS[area_id]}"
+
+
+def area_paths(area_ids: Iterable[str]) -> dict[str, tuple[str, str]]:
+    """
+    Returns the service and area of a feed per service for each of the given
+    areas, by feed path (e.g. `nhk-g1-270`). Tokyo is served as joak-dtv and
+    joab-dtv already, so it is skipped.
+    """
+    paths = {}
+    for area_id in area_ids:
+        if area_id not in AREAS:
+            raise ValueError(f"Unknown NHK area: {area_id}")
+        if area_id == "130":
+            continue
+        for service_id in SERVICES:
+            paths[f"nhk-{service_id}-{area_id}"] = (service_id, area_id)
+    return paths
+
+
+def area_documents(area_ids: Iterable[str]) -> int:
+    """
+    Returns how many upstream documents the feeds of the given areas fetch,
+    one per feed and published day.
+    """
+    return len(area_paths(area_ids)) * PUBLISHED_DAYS
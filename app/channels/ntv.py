@@ -1,13 +1,13 @@
 import datetime
 import time
+from typing import Any
 
 import httpx
-from async_lru import alru_cache
 from pydantic import BaseModel, HttpUrl
 
-from app.channel import Channel, Program, Schedule
-from app.config import settings
-from app.utils.http import fetch_json_with_retry
+from app.channel import Channel, Program, Schedule, within_days
+from app.utils.http import fetch_parsed_json_with_retry
+from app.utils.loop_monitor import stage
 
 
 class ActualDatetime(BaseModel):
@@ -41,13 +41,16 @@ class NtvProgram(BaseModel):
         )
 
 
-async def fetch_ntv_programs(client: httpx.AsyncClient) -> tuple[NtvProgram, ...]:
+def parse_ntv_programs(response_json: Any) -> tuple[Program, ...]:
+    with stage("validate_ntv"):
+        return tuple(NtvProgram.model_validate(d).to_program() for d in response_json)
+
+
+async def fetch_ntv_programs(client: httpx.AsyncClient) -> tuple[Program, ...]:
     base_url = "https://www.ntv.co.jp/program/json/program_list.json"
     timestamp = int(time.time() * 1000)
     url = f"{base_url}?_={timestamp}"
-    response_json = await fetch_json_with_retry(client, url)
-
-    return tuple(NtvProgram.model_validate(d) for d in response_json)
+    return await fetch_parsed_json_with_retry(client, url, parse_ntv_programs)
 
 
 class Ntv(Channel):
@@ -55,14 +58,19 @@ class Ntv(Channel):
     def channel_name(self) -> str:
         return "日本テレビ"
 
-    @alru_cache(ttl=settings.schedule_cache_ttl_seconds)
-    async def fetch_schedule(self, client: httpx.AsyncClient) -> Schedule:
+    @property
+    def channel_url(self) -> HttpUrl:
+        return HttpUrl("https://www.ntv.co.jp/program/")
+
+    async def fetch_schedule(
+        self, client: httpx.AsyncClient, days: int | None = None
+    ) -> Schedule:
         ntv_programs = await fetch_ntv_programs(client)
 
         return Schedule(
             channel_name=self.channel_name,
-            channel_url=HttpUrl("https://www.ntv.co.jp/program/"),
-            programs=[broadcast_event.to_program() for broadcast_event in ntv_programs],
+            channel_url=self.channel_url,
+            programs=within_days(ntv_programs, days),
         )
 
 
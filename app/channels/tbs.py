@@ -1,16 +1,14 @@
-import asyncio
 import datetime
-import itertools
 import logging
+from collections.abc import AsyncIterator, Sequence
 
 import httpx
-from async_lru import alru_cache
 from bs4 import BeautifulSoup
 from pydantic import HttpUrl
 
-from app.channel import Channel, Program, Schedule
-from app.config import settings
-from app.utils.http import fetch_text_with_retry
+from app.channel import Channel, Program, Schedule, iter_weekly_pages
+from app.utils.http import RequestPriority, fetch_text_with_retry, memoized_parse
+from app.utils.loop_monitor import stage
 
 logger = logging.getLogger(__name__)
 
@@ -37,11 +35,14 @@ def parse_html(html: str) -> tuple[Program, ...]:
     return tuple(parse_td_item(td) for td in tds)
 
 
-async def fetch_programs(client: httpx.AsyncClient, url: str) -> tuple[Program, ...]:
-    html = await fetch_text_with_retry(client, url)
+async def fetch_programs(
+    client: httpx.AsyncClient, url: str, priority: RequestPriority | None = None
+) -> tuple[Program, ...]:
+    html = await fetch_text_with_retry(client, url, priority)
 
     try:
-        return parse_html(html)
+        with stage("parse_html_tbs"):
+            return memoized_parse(url, html, lambda: parse_html(html))
     except (ValueError, AttributeError):
         html_preview = html[:500] if html else "(empty)"
         logger.exception(f"HTML parse error for {url}, html_preview={html_preview!r}")
@@ -53,21 +54,27 @@ class Tbs(Channel):
     def channel_name(self) -> str:
         return "TBSテレビ"
 
-    @alru_cache(ttl=settings.schedule_cache_ttl_seconds)
-    async def fetch_schedule(self, client: httpx.AsyncClient) -> Schedule:
+    @property
+    def channel_url(self) -> HttpUrl:
+        return HttpUrl("https://www.tbs.co.jp/tv/index.html")
+
+    async def fetch_schedule(
+        self, client: httpx.AsyncClient, days: int | None = None
+    ) -> Schedule:
+        return await self.schedule_from_segments(client, days)
+
+    async def iter_schedule_segments(
+        self, client: httpx.AsyncClient, days: int | None = None
+    ) -> AsyncIterator[Sequence[Program]]:
         urls = [
             "https://www.tbs.co.jp/tv/index.html",
             "https://www.tbs.co.jp/tv/nextweek.html",
         ]
-        tasks = [fetch_programs(client, url) for url in urls]
-        results = await asyncio.gather(*tasks)
-        programs = list(itertools.chain.from_iterable(results))
-
-        return Schedule(
-            channel_name=self.channel_name,
-            channel_url=HttpUrl("https://www.tbs.co.jp/tv/index.html"),
-            programs=programs,
-        )
+        # the second page holds next week's programs
+        async for programs in iter_weekly_pages(
+            lambda url, priority: fetch_programs(client, url, priority), urls, days
+        ):
+            yield programs
 
 
 tbs = Tbs()
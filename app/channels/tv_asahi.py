@@ -1,18 +1,17 @@
-import asyncio
 import datetime
 import itertools
 import logging
 import re
+from collections.abc import AsyncIterator, Sequence
 from zoneinfo import ZoneInfo
 
 import httpx
-from async_lru import alru_cache
 from bs4 import BeautifulSoup, Tag
 from pydantic import HttpUrl
 
-from app.channel import Channel, Program, Schedule
-from app.config import settings
-from app.utils.http import fetch_text_with_retry
+from app.channel import Channel, Program, Schedule, iter_weekly_pages
+from app.utils.http import RequestPriority, fetch_text_with_retry, memoized_parse
+from app.utils.loop_monitor import stage
 
 logger = logging.getLogger(__name__)
 
@@ -92,11 +91,14 @@ def parse_html(html: str) -> tuple[Program, ...]:
     )
 
 
-async def fetch_programs(client: httpx.AsyncClient, url: str) -> tuple[Program, ...]:
-    html = await fetch_text_with_retry(client, url)
+async def fetch_programs(
+    client: httpx.AsyncClient, url: str, priority: RequestPriority | None = None
+) -> tuple[Program, ...]:
+    html = await fetch_text_with_retry(client, url, priority)
 
     try:
-        return parse_html(html)
+        with stage("parse_html_tv_asahi"):
+            return memoized_parse(url, html, lambda: parse_html(html))
     except (ValueError, AttributeError):
         html_preview = html[:500] if html else "(empty)"
         logger.exception(f"HTML parse error for {url}, html_preview={html_preview!r}")
@@ -108,21 +110,27 @@ class TvAsahi(Channel):
     def channel_name(self) -> str:
         return "テレビ朝日"
 
-    @alru_cache(ttl=settings.schedule_cache_ttl_seconds)
-    async def fetch_schedule(self, client: httpx.AsyncClient) -> Schedule:
+    @property
+    def channel_url(self) -> HttpUrl:
+        return HttpUrl("https://www.tv-asahi.co.jp/bangumi/")
+
+    async def fetch_schedule(
+        self, client: httpx.AsyncClient, days: int | None = None
+    ) -> Schedule:
+        return await self.schedule_from_segments(client, days)
+
+    async def iter_schedule_segments(
+        self, client: httpx.AsyncClient, days: int | None = None
+    ) -> AsyncIterator[Sequence[Program]]:
         urls = [
             "https://www.tv-asahi.co.jp/bangumi/index.html",
             "https://www.tv-asahi.co.jp/bangumi/next.html",
         ]
-        tasks = [fetch_programs(client, url) for url in urls]
-        results = await asyncio.gather(*tasks)
-        programs = list(itertools.chain.from_iterable(results))
-
-        return Schedule(
-            channel_name=self.channel_name,
-            channel_url=HttpUrl("https://www.tv-asahi.co.jp/bangumi/"),
-            programs=programs,
-        )
+        # the second page holds next week's programs
+        async for programs in iter_weekly_pages(
+            lambda url, priority: fetch_programs(client, url, priority), urls, days
+        ):
+            yield programs
 
 
 tv_asahi = TvAsahi()
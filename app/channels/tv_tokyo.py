@@ -1,15 +1,10 @@
-import asyncio
 import datetime
-import itertools
-from zoneinfo import ZoneInfo
+from typing import Any
 
-import httpx
-from async_lru import alru_cache
 from pydantic import BaseModel, HttpUrl
 
-from app.channel import Channel, Program, Schedule
-from app.config import settings
-from app.utils.http import fetch_json_with_retry
+from app.channel import TOKYO, Program
+from app.day_channel import DayChannel
 
 
 def calc_start_from_date_hours_and_minutes(
@@ -39,49 +34,29 @@ class TvTokyoProgram(BaseModel):
         )
 
 
-async def fetch_tv_tokyo_programs(
-    client: httpx.AsyncClient, date: datetime.datetime
-) -> tuple[TvTokyoProgram, ...]:
-    url = f"https://www.tv-tokyo.co.jp/tbcms/assets/data/{date.strftime('%Y%m%d')}.json"
-    response_json = await fetch_json_with_retry(client, url)
+class TvTokyo(DayChannel[TvTokyoProgram]):
+    item_type = TvTokyoProgram
+    source_name = "tv_tokyo"
 
-    items = [
-        v["1"] for v in response_json.values() if "1" in v and v["1"]["start_time"]
-    ]
-
-    return tuple(TvTokyoProgram.model_validate(item) for item in items)
-
-
-async def get_programs(
-    client: httpx.AsyncClient, date: datetime.datetime
-) -> tuple[Program, ...]:
-    tv_tokyo_programs = await fetch_tv_tokyo_programs(client, date)
-    return tuple(p.to_program(date) for p in tv_tokyo_programs)
-
-
-class TvTokyo(Channel):
     @property
     def channel_name(self) -> str:
         return "テレ東"
 
-    @alru_cache(ttl=settings.schedule_cache_ttl_seconds)
-    async def fetch_schedule(self, client: httpx.AsyncClient) -> Schedule:
-        today = datetime.datetime.now(tz=ZoneInfo("Asia/Tokyo")).replace(
-            hour=0, minute=0, second=0, microsecond=0
-        )
-        dates = [today + datetime.timedelta(days=i) for i in range(7)]
+    @property
+    def channel_url(self) -> HttpUrl:
+        return HttpUrl("https://www.tv-tokyo.co.jp/timetable/broad_tvtokyo/thisweek/")
 
-        tasks = [get_programs(client, date) for date in dates]
-        results = await asyncio.gather(*tasks)
-        programs = list(itertools.chain.from_iterable(results))
+    def day_url(self, day: datetime.date) -> str:
+        return f"https://www.tv-tokyo.co.jp/tbcms/assets/data/{day.strftime('%Y%m%d')}.json"
 
-        return Schedule(
-            channel_name=self.channel_name,
-            channel_url=HttpUrl(
-                "https://www.tv-tokyo.co.jp/timetable/broad_tvtokyo/thisweek/"
-            ),
-            programs=programs,
-        )
+    def extract_items(self, response_json: Any) -> list[Any]:
+        return [
+            v["1"] for v in response_json.values() if "1" in v and v["1"]["start_time"]
+        ]
+
+    def to_program(self, item: TvTokyoProgram, day: datetime.date) -> Program:
+        midnight = datetime.datetime.combine(day, datetime.time(), tzinfo=TOKYO)
+        return item.to_program(midnight)
 
 
 tv_tokyo = TvTokyo()
@@ -1,11 +1,227 @@
-from pydantic import Field
+import logging
+
+from pydantic import Field, SecretStr
 from pydantic_settings import BaseSettings
 
+logger = logging.getLogger(__name__)
+
 
 class Settings(BaseSettings):
     schedule_cache_ttl_seconds: int = Field(
         default=3600, description="Cache TTL for fetched schedules in seconds."
     )
+    schedule_cache_ttl_overrides: dict[str, int] = Field(
+        default={},
+        description="Cache TTLs in seconds by feed path or channel class name.",
+    )
+    schedule_cache_ttl_jitter_ratio: float = Field(
+        default=0.1,
+        ge=0.0,
+        lt=1.0,
+        description="Cached schedules expire randomly within this ratio of the TTL.",
+    )
+    schedule_cache_max_bytes: int | None = Field(
+        default=64 * 1024 * 1024,
+        description="Memory budget of cached schedules and their rendered feeds.",
+    )
+    schedule_horizon_days: int | None = Field(
+        default=None,
+        ge=1,
+        description="Days of schedule in a full feed; by default, all published.",
+    )
+    schedule_horizon_overrides: dict[str, int] = Field(
+        default={},
+        description="Full feed horizons in days by feed path or channel class name.",
+    )
+    schedule_warm_days: int = Field(
+        default=2,
+        ge=0,
+        description="Days from today refetched on every refresh of a day-based feed.",
+    )
+    schedule_far_day_max_age_seconds: float = Field(
+        default=6 * 3600,
+        description="How long later days of a day-based feed are reused.",
+    )
+    feed_fragment_cache_max_bytes: int | None = Field(
+        default=32 * 1024 * 1024,
+        description="Memory budget of serialized per-program feed fragments.",
+    )
+    delta_history_versions: int = Field(
+        default=16,
+        ge=1,
+        description="Schedule versions per feed that delta requests can start from.",
+    )
+    loop_monitor_interval_seconds: float = Field(
+        default=0.5, description="Sampling interval of the event-loop lag monitor."
+    )
+    loop_slow_threshold_seconds: float = Field(
+        default=0.1,
+        description="Lag or stage duration above which the event loop is slow.",
+    )
+    loop_debug_slow_callbacks: bool = Field(
+        default=False,
+        description="Enable asyncio debug mode to log slow callbacks by name.",
+    )
+    upstream_cache_enabled: bool = Field(
+        default=True,
+        description="Cache upstream responses and revalidate them conditionally.",
+    )
+    upstream_cache_max_entries: int = Field(
+        default=512,
+        description="Maximum number of cached upstream responses, besides one "
+        "per document the NHK_AREAS feeds fetch.",
+    )
+    upstream_max_concurrency_per_host: int = Field(
+        default=4, description="Maximum concurrent requests to one upstream host."
+    )
+    upstream_host_concurrency_limits: dict[str, int] = Field(
+        default={}, description="Per-host overrides of the concurrency limit."
+    )
+    upstream_host_rate_limits: dict[str, float] = Field(
+        default={"api.nhk.jp": 10.0},
+        description="Maximum upstream requests started per second, by host.",
+    )
+    upstream_keepalive_expiry_seconds: float = Field(
+        default=60.0,
+        description="How long idle upstream connections are kept open.",
+    )
+    upstream_proxy_url: str | None = Field(
+        default=None,
+        description="Proxy for upstream requests, in place of HTTPS_PROXY and such.",
+    )
+    upstream_dns_cache_ttl_seconds: float | None = Field(
+        default=300.0,
+        description="How long resolved upstream addresses are reused.",
+    )
+    upstream_prewarm_enabled: bool = Field(
+        default=False,
+        description="Open connections to every upstream host at startup.",
+    )
+    upstream_hedging_enabled: bool = Field(
+        default=False,
+        description="Send a duplicate of upstream requests that run unusually long.",
+    )
+    upstream_hedge_percentile: float = Field(
+        default=95.0,
+        description="Per-host latency percentile after which a request is hedged.",
+    )
+    upstream_hedge_budget_ratio: float = Field(
+        default=0.05, description="Maximum share of upstream requests to hedge."
+    )
+    request_deadline_seconds: float | None = Field(
+        default=10.0,
+        description="Time after which a feed request serves whatever is cached.",
+    )
+    rss_streaming_enabled: bool = Field(
+        default=False,
+        description="Stream feeds day by day when nothing is cached yet.",
+    )
+    cache_control_stale_while_revalidate_seconds: int = Field(
+        default=60,
+        ge=0,
+        description="How long shared caches may serve an expired feed while "
+        "revalidating it.",
+    )
+    cache_control_stale_if_error_seconds: int = Field(
+        default=24 * 3600,
+        ge=0,
+        description="How long shared caches may serve an expired feed when "
+        "revalidating it fails.",
+    )
+    inbound_client_rate_per_second: float | None = Field(
+        default=None,
+        gt=0.0,
+        description=(
+            "Requests per second a client may make on cache misses. Behind a"
+            " proxy, set it only if forwarded client addresses are trusted."
+        ),
+    )
+    inbound_client_burst: float = Field(
+        default=30.0,
+        ge=1.0,
+        description="Requests on cache misses a client may make at once.",
+    )
+    inbound_max_cold_in_flight: int | None = Field(
+        default=64,
+        ge=1,
+        description="Maximum requests waiting on cache misses at once.",
+    )
+    background_refresh_enabled: bool = Field(
+        default=True, description="Refresh requested schedules in the background."
+    )
+    refresh_check_interval_seconds: float = Field(
+        default=30.0, description="How often the refresher looks for due channels."
+    )
+    refresh_min_interval_seconds: float = Field(
+        default=300.0, description="Shortest adaptive refresh interval."
+    )
+    refresh_max_interval_seconds: float = Field(
+        default=3600.0, description="Longest adaptive refresh interval."
+    )
+    channel_warmup_enabled: bool = Field(
+        default=True,
+        description="Import every channel module in the background after startup.",
+    )
+    nhk_areas: list[str] = Field(
+        default=[],
+        description="NHK area codes (e.g. 270 for Osaka) to serve feeds for, "
+        "besides Tokyo.",
+    )
+    archive_enabled: bool = Field(
+        default=False, description="Archive every fetched program in SQLite."
+    )
+    archive_path: str = Field(
+        default="archive.sqlite3", description="SQLite database of the archive."
+    )
+    admin_token: SecretStr | None = Field(
+        default=None,
+        description="Bearer token for the admin API, which is disabled without one.",
+    )
 
 
 settings = Settings()
+
+# Settings read once, to build the channel registry, caches, the upstream
+# client and scheduler, or the background tasks. Reloading them only takes
+# effect on restart; every other setting is looked up where it is used.
+STARTUP_SETTINGS = frozenset(
+    {
+        "feed_fragment_cache_max_bytes",
+        "delta_history_versions",
+        "loop_monitor_interval_seconds",
+        "loop_slow_threshold_seconds",
+        "loop_debug_slow_callbacks",
+        "upstream_cache_enabled",
+        "upstream_cache_max_entries",
+        "upstream_max_concurrency_per_host",
+        "upstream_host_concurrency_limits",
+        "upstream_host_rate_limits",
+        "upstream_keepalive_expiry_seconds",
+        "upstream_proxy_url",
+        "upstream_prewarm_enabled",
+        "upstream_hedge_budget_ratio",
+        "background_refresh_enabled",
+        "channel_warmup_enabled",
+        "nhk_areas",
+        "archive_enabled",
+        "archive_path",
+    }
+)
+
+
+def reload_settings() -> None:
+    """
+    Re-reads the settings from the environment into the shared `settings`
+    object. Changes to `STARTUP_SETTINGS` are logged as pending a restart;
+    the others apply at once.
+    """
+    reloaded = Settings()
+    pending = sorted(
+        name
+        for name in STARTUP_SETTINGS
+        if getattr(reloaded, name) != getattr(settings, name)
+    )
+    if pending:
+        logger.warning(f"Settings applied only on restart changed: {pending}")
+    for name in Settings.model_fields:
+        setattr(settings, name, getattr(reloaded, name))
@@ -0,0 +1,142 @@
+import abc
+import datetime
+import functools
+import time
+from collections.abc import AsyncIterator, Iterable, Sequence
+from typing import Any
+
+import httpx
+from pydantic import BaseModel, TypeAdapter
+
+from app.channel import Channel, Program, Schedule, broadcast_today, iter_in_order
+from app.config import settings
+from app.utils.http import (
+    RequestPriority,
+    day_priority,
+    fetch_parsed_json_with_retry,
+)
+from app.utils.loop_monitor import stage
+from app.utils.metrics import metrics
+
+metrics.describe("dtv_day_fetches_total", "Per-day schedule fetches by source.")
+metrics.describe("dtv_day_programs_total", "Programs parsed from per-day schedules.")
+metrics.describe(
+    "dtv_day_reused_total", "Far days served from an earlier fetch by source."
+)
+
+
+@functools.cache
+def _items_adapter(item_type: type[BaseModel]) -> TypeAdapter[list[Any]]:
+    return TypeAdapter(list[item_type])  # type: ignore[valid-type]
+
+
+class DayChannel[ItemT: BaseModel](Channel):
+    """
+    A channel whose upstream publishes one JSON document per broadcast day.
+
+    Subclasses declare where a day's document lives, where its items are and
+    how an item maps to a `Program`. The engine fetches the days concurrently
+    at day priority, reuses the parse of unchanged documents, validates each
+    day's items in one batch and yields the days in order.
+
+    Only the first `schedule_warm_days` days are refetched on every refresh.
+    Later days, which rarely change, are reused from an earlier fetch until
+    it is `schedule_far_day_max_age_seconds` old.
+    """
+
+    # Item model validated in batch, and the name used in stages and metrics.
+    item_type: type[ItemT]
+    source_name: str
+
+    # Days the upstream publishes ahead, all fetched when no window is
+    # requested, and the most any window fetches.
+    published_days: int = 7
+
+    def __init__(self) -> None:
+        super().__init__()
+        # day -> (time.monotonic() of the fetch, programs)
+        self._days: dict[datetime.date, tuple[float, tuple[Program, ...]]] = {}
+
+    @abc.abstractmethod
+    def day_url(self, day: datetime.date) -> str:
+        pass
+
+    @abc.abstractmethod
+    def extract_items(self, response_json: Any) -> Iterable[Any]:
+        pass
+
+    @abc.abstractmethod
+    def to_program(self, item: ItemT, day: datetime.date) -> Program:
+        pass
+
+    def days(self, days: int | None = None) -> list[datetime.date]:
+        today = broadcast_today()
+        count = self.published_days if days is None else min(days, self.published_days)
+        return [today + datetime.timedelta(days=i) for i in range(count)]
+
+    @property
+    def upstream_hosts(self) -> frozenset[str]:
+        return frozenset({httpx.URL(self.day_url(broadcast_today())).host})
+
+    def parse_day(self, response_json: Any, day: datetime.date) -> tuple[Program, ...]:
+        items = list(self.extract_items(response_json))
+        with stage(f"validate_{self.source_name}"):
+            validated = _items_adapter(self.item_type).validate_python(items)
+            programs = tuple(self.to_program(item, day) for item in validated)
+        metrics.inc("dtv_day_programs_total", len(programs), source=self.source_name)
+        return programs
+
+    async def fetch_day(
+        self,
+        client: httpx.AsyncClient,
+        day: datetime.date,
+        priority: RequestPriority | None = None,
+    ) -> tuple[Program, ...]:
+        try:
+            programs = await fetch_parsed_json_with_retry(
+                client,
+                self.day_url(day),
+                lambda response_json: self.parse_day(response_json, day),
+                priority,
+            )
+        except Exception:
+            metrics.inc(
+                "dtv_day_fetches_total", source=self.source_name, result="error"
+            )
+            raise
+        metrics.inc("dtv_day_fetches_total", source=self.source_name, result="ok")
+
+        today = broadcast_today()
+        for past in [d for d in self._days if d < today]:
+            del self._days[past]
+        self._days[day] = (time.monotonic(), programs)
+        return programs
+
+    async def _reuse_or_fetch_day(
+        self, client: httpx.AsyncClient, day: datetime.date, days_ahead: int
+    ) -> tuple[Program, ...]:
+        fetched = self._days.get(day)
+        if (
+            fetched is not None
+            and days_ahead >= settings.schedule_warm_days
+            and time.monotonic() - fetched[0]
+            < settings.schedule_far_day_max_age_seconds
+        ):
+            metrics.inc("dtv_day_reused_total", source=self.source_name)
+            return fetched[1]
+        return await self.fetch_day(client, day, day_priority(days_ahead))
+
+    async def fetch_schedule(
+        self, client: httpx.AsyncClient, days: int | None = None
+    ) -> Schedule:
+        return await self.schedule_from_segments(client, days)
+
+    async def iter_schedule_segments(
+        self, client: httpx.AsyncClient, days: int | None = None
+    ) -> AsyncIterator[Sequence[Program]]:
+        tasks = [
+            self._reuse_or_fetch_day(client, day, i)
+            for i, day in enumerate(self.days(days))
+        ]
+        async for programs in iter_in_order(tasks):
+            yield programs
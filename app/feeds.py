@@ -0,0 +1,263 @@
+import datetime
+import itertools
+import json
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from xml.etree.ElementTree import Element, SubElement, tostring
+
+from pydantic import HttpUrl
+
+from app import rss
+from app.channel import Program
+from app.fragments import fragments, rss_item
+
+# Serializes a feed's parts around its items, from its channel's name and URL
+# and the programs it holds.
+type PartsRenderer = Callable[[str, HttpUrl, Sequence[Program]], tuple[bytes, bytes]]
+
+# Serializes items from their channel's name, the programs to serialize and
+# every program of the schedule they belong to.
+type ItemsRenderer = Callable[[str, Sequence[Program], Sequence[Program]], bytes]
+
+
+@dataclass(frozen=True)
+class FeedFormat:
+    """
+    A feed format: its media type, the feed's parts around the items and the
+    items themselves, serialized from per-program fragments.
+    """
+
+    name: str
+    media_type: str
+    parts: PartsRenderer
+    items: ItemsRenderer
+
+
+def rss_parts(
+    channel_name: str, channel_url: HttpUrl, programs: Sequence[Program] = ()
+) -> tuple[bytes, bytes]:
+    return rss.Channel(
+        title=channel_name, link=channel_url, description=""
+    ).to_xml_parts()
+
+
+def rss_items(
+    channel_name: str,
+    programs: Sequence[Program],
+    schedule_programs: Sequence[Program] = (),
+) -> bytes:
+    return fragments.join("rss", channel_name, programs, rss_item)
+
+
+def _split(document: bytes, closing: bytes) -> tuple[bytes, bytes]:
+    if not document.endswith(closing):
+        raise ValueError(f"Feed document does not end with {closing!r}: {document!r}")
+    return document[: -len(closing)], closing
+
+
+def atom_parts(
+    channel_name: str, channel_url: HttpUrl, programs: Sequence[Program]
+) -> tuple[bytes, bytes]:
+    updated = max(
+        (program.published for program in programs),
+        default=datetime.datetime.now(datetime.UTC),
+    )
+    feed = Element("feed", xmlns="http://www.w3.org/2005/Atom")
+    SubElement(feed, "title").text = channel_name
+    SubElement(feed, "link", href=str(channel_url))
+    SubElement(feed, "id").text = str(channel_url)
+    SubElement(feed, "updated").text = updated.isoformat()
+    SubElement(SubElement(feed, "author"), "name").text = channel_name
+    return _split(tostring(feed), b"</feed>")
+
+
+def atom_entry(program: Program, channel_name: str) -> bytes:
+    entry = Element("entry")
+    SubElement(entry, "title").text = program.title
+    if program.url:
+        SubElement(entry, "link", href=str(program.url))
+    SubElement(entry, "id").text = program.guid(channel_name)
+    SubElement(entry, "updated").text = program.published.isoformat()
+    SubElement(entry, "summary").text = program.summary
+    return tostring(entry)
+
+
+def atom_items(
+    channel_name: str,
+    programs: Sequence[Program],
+    schedule_programs: Sequence[Program] = (),
+) -> bytes:
+    return fragments.join("atom", channel_name, programs, atom_entry)
+
+
+def json_feed_parts(
+    channel_name: str, channel_url: HttpUrl, programs: Sequence[Program]
+) -> tuple[bytes, bytes]:
+    feed = {
+        "version": "https://jsonfeed.org/version/1.1",
+        "title": channel_name,
+        "home_page_url": str(channel_url),
+        "items": [],
+    }
+    return _split(json.dumps(feed, ensure_ascii=False).encode(), b"]}")
+
+
+def json_feed_item(program: Program, channel_name: str) -> bytes:
+    item = {
+        "id": program.guid(channel_name),
+        "url": str(program.url) if program.url else None,
+        "title": program.title,
+        "content_text": program.summary,
+        "date_published": program.published.isoformat(),
+    }
+    return json.dumps(
+        {k: v for k, v in item.items() if v is not None}, ensure_ascii=False
+    ).encode()
+
+
+def json_feed_items(
+    channel_name: str,
+    programs: Sequence[Program],
+    schedule_programs: Sequence[Program] = (),
+) -> bytes:
+    return b", ".join(
+        fragments.get("json", channel_name, program, json_feed_item)
+        for program in programs
+    )
+
+
+def _ical_text(text: str) -> str:
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def _ical_time(dt: datetime.datetime) -> str:
+    return dt.astimezone(datetime.UTC).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _ical_lines(*lines: str) -> bytes:
+    """
+    Serializes content lines, folded at 75 octets without splitting a
+    character, as RFC 5545 asks.
+    """
+    folded = bytearray()
+    for line in lines:
+        width = 0
+        for char in line:
+            encoded = char.encode()
+            if width + len(encoded) > 75:
+                folded += b"\r\n "
+                width = 1
+            folded += encoded
+            width += len(encoded)
+        folded += b"\r\n"
+    return bytes(folded)
+
+
+def ical_parts(
+    channel_name: str, channel_url: HttpUrl, programs: Sequence[Program]
+) -> tuple[bytes, bytes]:
+    head = _ical_lines(
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//dtv-schedule-rss//EN",
+        f"X-WR-CALNAME:{_ical_text(channel_name)}",
+    )
+    return head, _ical_lines("END:VCALENDAR")
+
+
+def ical_event(program: Program, channel_name: str) -> bytes:
+    """
+    Serializes the program as a VEVENT without its end, which depends on the
+    program after it.
+    """
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{program.guid(channel_name)}",
+        f"DTSTAMP:{_ical_time(program.published)}",
+        f"DTSTART:{_ical_time(program.start)}",
+        f"SUMMARY:{_ical_text(program.title)}",
+    ]
+    if program.description:
+        lines.append(f"DESCRIPTION:{_ical_text(program.description)}")
+    if program.url:
+        lines.append(f"URL:{program.url}")
+    return _ical_lines(*lines)
+
+
+def program_ends(programs: Sequence[Program]) -> dict[bytes, datetime.datetime]:
+    """
+    Returns when each program ends, by digest: when the next one starts. The
+    end of the last one is unknown, so it is left out.
+    """
+    return {
+        program.digest: following.start
+        for program, following in itertools.pairwise(programs)
+    }
+
+
+def ical_items(
+    channel_name: str,
+    programs: Sequence[Program],
+    schedule_programs: Sequence[Program] = (),
+) -> bytes:
+    # Ends come from the whole schedule, since `programs` may be only the
+    # programs that changed.
+    ends = program_ends(schedule_programs or programs)
+    events = []
+    for program in programs:
+        events.append(fragments.get("ical", channel_name, program, ical_event))
+        end = ends.get(program.digest)
+        if end is not None:
+            events.append(_ical_lines(f"DTEND:{_ical_time(end)}"))
+        events.append(_ical_lines("END:VEVENT"))
+    return b"".join(events)
+
+
+FORMATS = {
+    feed_format.name: feed_format
+    for feed_format in (
+        FeedFormat("rss", "application/xml", rss_parts, rss_items),
+        FeedFormat("atom", "application/atom+xml", atom_parts, atom_items),
+        FeedFormat("json", "application/feed+json", json_feed_parts, json_feed_items),
+        FeedFormat("ics", "text/calendar", ical_parts, ical_items),
+    )
+}
+
+_MEDIA_TYPES = {
+    "application/rss+xml": "rss",
+    "application/xml": "rss",
+    "text/xml": "rss",
+    "application/atom+xml": "atom",
+    "application/feed+json": "json",
+    "application/json": "json",
+    "text/calendar": "ics",
+}
+
+
+def negotiate(accept: str) -> FeedFormat:
+    """
+    Returns the format an `Accept` header prefers, or RSS if it names none of
+    the other formats.
+    """
+    best, best_q = "rss", 0.0
+    for media_range in accept.split(","):
+        media_type, *params = (part.strip() for part in media_range.split(";"))
+        name = _MEDIA_TYPES.get(media_type.lower())
+        if name is None:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = name, q
+    return FORMATS[best]
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from xml.etree.ElementTree import tostring
+
+from app.channel import Program
+from app.config import settings
+from app.utils.metrics import metrics
+
+metrics.describe("dtv_fragment_hits_total", "Feed fragments reused by format.")
+metrics.describe("dtv_fragment_misses_total", "Feed fragments serialized by format.")
+metrics.describe("dtv_fragment_cache_bytes", "Memory held by cached feed fragments.")
+
+# Approximate size of a cached fragment besides its content: the bytes
+# object, its key tuple and the key's digest, and its slot in the cache.
+FRAGMENT_OVERHEAD_BYTES = 200
+
+
+class FragmentCache:
+    """
+    Serialized per-program feed fragments (such as RSS `<item>`s), keyed by
+    format, scope (the channel, for fragments that name it) and program
+    digest, and evicted least recently used first. Programs unchanged across
+    refreshes, or shared between feeds, are serialized once. The fragments
+    are kept within a memory budget of their own, besides the schedule cache's.
+    """
+
+    def __init__(self, max_bytes: int | None):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._fragments: OrderedDict[tuple[str, str, bytes], bytes] = OrderedDict()
+
+    def get(
+        self,
+        fmt: str,
+        scope: str,
+        program: Program,
+        render: Callable[[Program, str], bytes],
+    ) -> bytes:
+        key = (fmt, scope, program.digest)
+        fragment = self._fragments.get(key)
+        if fragment is not None:
+            self._fragments.move_to_end(key)
+            metrics.inc("dtv_fragment_hits_total", format=fmt)
+            return fragment
+
+        metrics.inc("dtv_fragment_misses_total", format=fmt)
+        fragment = self._fragments[key] = render(program, scope)
+        self.size_bytes += FRAGMENT_OVERHEAD_BYTES + len(fragment)
+        while self.max_bytes is not None and self.size_bytes > self.max_bytes:
+            _, evicted = self._fragments.popitem(last=False)
+            self.size_bytes -= FRAGMENT_OVERHEAD_BYTES + len(evicted)
+        metrics.set_gauge("dtv_fragment_cache_bytes", self.size_bytes)
+        return fragment
+
+    def join(
+        self,
+        fmt: str,
+        scope: str,
+        programs: Iterable[Program],
+        render: Callable[[Program, str], bytes],
+    ) -> bytes:
+        return b"".join(self.get(fmt, scope, program, render) for program in programs)
+
+    def clear(self) -> None:
+        self._fragments.clear()
+        self.size_bytes = 0
+        metrics.set_gauge("dtv_fragment_cache_bytes", 0)
+
+
+def rss_item(program: Program, channel_name: str) -> bytes:
+    return tostring(program.to_rss_item(channel_name).to_xml())
+
+
+fragments = FragmentCache(max_bytes=settings.feed_fragment_cache_max_bytes)
@@ -0,0 +1,174 @@
+import datetime
+import json
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Query, Request, Response
+
+from app.channel import BROADCAST_DAY_END, TOKYO, Schedule, broadcast_today
+from app.schedule_cache import schedule_cache
+from app.utils.loop_monitor import stage
+from app.utils.metrics import metrics
+
+metrics.describe("dtv_grid_hits_total", "Timetable grids served from the cache.")
+metrics.describe("dtv_grid_builds_total", "Timetable grids built.")
+
+_DAY = 24 * 60 * 60
+
+
+def _channel_grid(
+    schedule: Schedule, start: int, slot_seconds: int, slots: int
+) -> dict[str, Any]:
+    # Imported on first use, since most processes never build a grid.
+    import numpy as np
+
+    programs = schedule.programs
+    starts = np.fromiter(
+        (p.start.timestamp() for p in programs), dtype=np.int64, count=len(programs)
+    )
+    order = np.argsort(starts, kind="stable")
+    starts = starts[order]
+
+    # A program ends when the next one starts; the last one, at the end of
+    # its broadcast day.
+    ends = np.empty_like(starts)
+    ends[:-1] = starts[1:]
+    if len(starts):
+        ends[-1] = start + ((starts[-1] - start) // _DAY + 1) * _DAY
+
+    # The program on air at the start of each slot, or -1.
+    edges = start + np.arange(slots, dtype=np.int64) * slot_seconds
+    on_air = np.searchsorted(starts, edges, side="right") - 1
+    valid = on_air >= 0
+    valid[valid] &= edges[valid] < ends[on_air[valid]]
+    on_air = np.where(valid, on_air, -1)
+
+    # The slots each program touches, clipped to the grid.
+    first = np.clip((starts - start) // slot_seconds, 0, slots)
+    last = np.clip(-((start - ends) // slot_seconds), 0, slots)
+    shown = (last > first) & (starts < ends)
+
+    # Renumber the slot indices to the programs actually shown.
+    if len(starts):
+        index = np.cumsum(shown) - 1
+        on_air = np.where(on_air >= 0, index[np.maximum(on_air, 0)], -1)
+
+    return {
+        "name": schedule.channel_name,
+        "programs": [
+            {
+                "title": programs[i].title,
+                "url": str(programs[i].url) if programs[i].url else None,
+                "start": programs[i].start.isoformat(),
+                "end": datetime.datetime.fromtimestamp(e, tz=TOKYO).isoformat(),
+                "slot": s,
+                "span": t - s,
+            }
+            for i, e, s, t in zip(
+                order[shown].tolist(),
+                ends[shown].tolist(),
+                first[shown].tolist(),
+                last[shown].tolist(),
+                strict=True,
+            )
+        ],
+        "slots": on_air.tolist(),
+    }
+
+
+def build_grid(
+    schedules: Mapping[str, Schedule],
+    start: datetime.datetime,
+    slot_minutes: int,
+    days: int,
+) -> dict[str, Any]:
+    """
+    Lays out the schedules on a grid of `slot_minutes`-wide slots covering
+    `days` days from `start`.
+
+    Each channel lists the programs shown on the grid, with the first slot
+    each touches and how many it spans, and, for every slot, the index of the
+    program on air when it starts (-1 for none). Start times are binned with
+    NumPy, so a week of every channel takes milliseconds.
+    """
+    slot_seconds = slot_minutes * 60
+    slots = -(-days * _DAY // slot_seconds)
+    origin = int(start.timestamp())
+    return {
+        "start": start.isoformat(),
+        "slot_minutes": slot_minutes,
+        "slots": slots,
+        "channels": {
+            path: _channel_grid(schedule, origin, slot_seconds, slots)
+            for path, schedule in schedules.items()
+        },
+    }
+
+
+class GridCache:
+    """
+    Rendered timetable grids, keyed by the version of every schedule on them
+    and the grid's layout, and evicted least recently used first. A grid is
+    rebuilt only once one of its schedules has changed.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._grids: OrderedDict[tuple[Any, ...], bytes] = OrderedDict()
+
+    def get(
+        self,
+        schedules: Mapping[str, Schedule],
+        start: datetime.datetime,
+        slot_minutes: int,
+        days: int,
+    ) -> bytes:
+        versions = tuple((path, s.version) for path, s in schedules.items())
+        key = (versions, start, slot_minutes, days)
+        grid = self._grids.get(key)
+        if grid is not None:
+            self._grids.move_to_end(key)
+            metrics.inc("dtv_grid_hits_total")
+            return grid
+
+        metrics.inc("dtv_grid_builds_total")
+        with stage("build_grid"):
+            built = build_grid(schedules, start, slot_minutes, days)
+            grid = self._grids[key] = json.dumps(built, ensure_ascii=False).encode()
+        if len(self._grids) > self.max_entries:
+            self._grids.popitem(last=False)
+        return grid
+
+    def clear(self) -> None:
+        self._grids.clear()
+
+
+grid_cache = GridCache(max_entries=32)
+
+router = APIRouter()
+
+
+@router.get("/grid")
+async def get_grid(
+    request: Request,
+    slot_minutes: Annotated[int, Query(ge=5, le=240)] = 30,
+    days: Annotated[int, Query(ge=1, le=14)] = 7,
+) -> Response:
+    """
+    Returns the timetable grid of every channel with a cached schedule, from
+    the start of today's broadcast day.
+    """
+    schedules = {}
+    for path in request.app.state.path_to_channel:
+        entry = schedule_cache.peek(path)
+        if entry is not None:
+            schedules[path] = entry.schedule
+    start = (
+        datetime.datetime.combine(broadcast_today(), datetime.time(), tzinfo=TOKYO)
+        + BROADCAST_DAY_END
+    )
+    return Response(
+        content=grid_cache.get(schedules, start, slot_minutes, days),
+        media_type="application/json",
+    )
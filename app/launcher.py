@@ -0,0 +1,200 @@
+"""
+Serves the app from pre-forked uvicorn workers that start with warm caches.
+
+The parent process imports the app, fetches and renders every feed, and
+freezes the garbage collector before forking, so the workers share the
+imported modules and warmed caches copy-on-write instead of each building
+their own. Run it with `python -m app.launcher --workers 4`.
+"""
+
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from collections.abc import Sequence
+
+import uvicorn
+
+from app.config import reload_settings
+from app.feeds import FORMATS
+from app.lifespan import upstream_client
+from app.main import app, path_to_channel, render_feed
+from app.schedule_cache import schedule_cache
+
+logger = logging.getLogger(__name__)
+
+# A worker exiting sooner than this after it started is taken to have crashed
+# at startup, and restarting it is delayed more with each such crash in a row.
+MIN_WORKER_UPTIME_SECONDS = 10.0
+MAX_RESTART_DELAY_SECONDS = 60.0
+
+# The status uvicorn exits with when the app fails to start.
+STARTUP_FAILURE = 3
+
+
+async def warm_up() -> list[str]:
+    """
+    Fetches every feed's schedule into the cache and renders it in every
+    format. Returns the paths that were warmed; the others are fetched by the
+    workers on demand.
+    """
+    async with upstream_client() as client:
+        results = await asyncio.gather(
+            *(
+                schedule_cache.get(path, channel, client)
+                for path, channel in path_to_channel.items()
+            ),
+            return_exceptions=True,
+        )
+
+    warmed = []
+    for path, result in zip(path_to_channel, results, strict=True):
+        if isinstance(result, BaseException):
+            logger.warning(f"Failed to warm up {path}", exc_info=result)
+            continue
+        for fmt in FORMATS.values():
+            render_feed(path, result, fmt)
+        warmed.append(path)
+    return warmed
+
+
+def restart_delay(crashes: int) -> float:
+    """
+    Returns how long to wait before restarting a worker after `crashes`
+    crashes in a row: not at all after a worker that ran for a while, then
+    doubling from a second up to a minute.
+    """
+    if crashes == 0:
+        return 0.0
+    return min(MAX_RESTART_DELAY_SECONDS, 2.0 ** (crashes - 1))
+
+
+def _spawn(config: uvicorn.Config, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    # In the worker: uvicorn installs its own signal handlers, and the app
+    # handles SIGHUP once its lifespan starts.
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    gc.enable()
+    # Never return into the parent's stack.
+    os._exit(_serve_worker(config, sock))
+
+
+def _serve_worker(config: uvicorn.Config, sock: socket.socket) -> int:
+    """
+    Serves the app until the worker is stopped and returns its exit status,
+    so the supervisor sees workers that failed.
+    """
+    try:
+        server = uvicorn.Server(config)
+        server.run(sockets=[sock])
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        logger.exception("Worker failed")
+        return 1
+    return 0 if server.started else STARTUP_FAILURE
+
+
+def _supervise(config: uvicorn.Config, sock: socket.socket, workers: int) -> None:
+    # Workers by pid, with when each started.
+    pids: dict[int, float] = {}
+    stopping = False
+
+    def spawn() -> None:
+        pids[_spawn(config, sock)] = time.monotonic()
+
+    def stop(signum: int, frame: object) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in pids:
+            os.kill(pid, signal.SIGTERM)
+
+    def reload(signum: int, frame: object) -> None:
+        # Reloaded here too, so that restarted workers start with them.
+        try:
+            reload_settings()
+        except Exception:
+            logger.exception("Failed to reload settings; keeping the current ones")
+        for pid in pids:
+            os.kill(pid, signal.SIGHUP)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGHUP, reload)
+    for _ in range(workers):
+        spawn()
+
+    crashes = 0
+    while pids:
+        pid, status = os.wait()
+        started_at = pids.pop(pid, None)
+        if stopping or started_at is None:
+            continue
+        uptime = time.monotonic() - started_at
+        crashes = crashes + 1 if uptime < MIN_WORKER_UPTIME_SECONDS else 0
+        delay = restart_delay(crashes)
+        logger.warning(
+            f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}"
+            f", restarting it in {delay:.0f}s"
+        )
+        time.sleep(delay)
+        if not stopping:
+            spawn()
+
+
+def _parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    # Defaults follow the UVICORN_* variables the uvicorn command reads.
+    parser.add_argument("--host", default=os.environ.get("UVICORN_HOST", "127.0.0.1"))
+    parser.add_argument(
+        "--port", type=int, default=int(os.environ.get("UVICORN_PORT", "8000"))
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)),
+    )
+    parser.add_argument("--root-path", default=os.environ.get("UVICORN_ROOT_PATH", ""))
+    parser.add_argument(
+        "--proxy-headers",
+        action=argparse.BooleanOptionalAction,
+        default=os.environ.get("UVICORN_PROXY_HEADERS", "true").lower() == "true",
+    )
+    parser.add_argument(
+        "--forwarded-allow-ips", default=os.environ.get("UVICORN_FORWARDED_ALLOW_IPS")
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    args = _parse_args(argv)
+    # Collections before the freeze would only move objects around.
+    gc.disable()
+
+    config = uvicorn.Config(
+        app,
+        host=args.host,
+        port=args.port,
+        root_path=args.root_path,
+        proxy_headers=args.proxy_headers,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+    )
+    warmed = asyncio.run(warm_up())
+    logger.info(f"Warmed up {len(warmed)} of {len(path_to_channel)} feeds")
+
+    sock = config.bind_socket()
+    gc.collect()
+    gc.freeze()
+    _supervise(config, sock, args.workers)
+
+
+if __name__ == "__main__":
+    main()
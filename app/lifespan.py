@@ -1,18 +1,153 @@
+import asyncio
+import contextlib
+import logging
+import signal
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
 
 import httpx
 from fastapi import FastAPI
 
+from app.archive import ProgramArchive
+from app.channel import Channel, Schedule
+from app.channels.nhk_areas import area_documents
+from app.config import reload_settings, settings
+from app.refresher import ScheduleRefresher
+from app.schedule_cache import schedule_cache
+from app.utils.connections import (
+    connection_stats,
+    dns_cache,
+    network_transport,
+    prewarm,
+)
+from app.utils.http import parse_memo
+from app.utils.http_cache import CachingTransport
+from app.utils.loop_monitor import LoopLagMonitor
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_TIMEOUT = httpx.Timeout(10.0, connect=5.0, read=30.0)
+UPSTREAM_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=settings.upstream_keepalive_expiry_seconds,
+)
+
+
+def upstream_client() -> httpx.AsyncClient:
+    """
+    Returns the client that fetches upstream: over pooled connections to
+    resolved addresses, through the response cache when it is enabled.
+    """
+    # Each NHK area adds its own documents, which would otherwise evict the
+    # rest from the caches on every refresh.
+    cache_entries = settings.upstream_cache_max_entries + area_documents(
+        settings.nhk_areas
+    )
+    parse_memo.resize(cache_entries)
+    transport: httpx.AsyncBaseTransport = network_transport(
+        UPSTREAM_LIMITS, dns_cache, connection_stats
+    )
+    if settings.upstream_cache_enabled:
+        transport = CachingTransport(transport, max_entries=cache_entries)
+    # Proxies are configured on the transport, so that proxied requests are
+    # cached and counted too.
+    return httpx.AsyncClient(
+        timeout=UPSTREAM_TIMEOUT, transport=transport, trust_env=False
+    )
+
+
+def _reload_settings() -> None:
+    try:
+        reload_settings()
+    except Exception:
+        logger.exception("Failed to reload settings; keeping the current ones")
+    else:
+        logger.info("Reloaded settings")
+
+
+async def _prewarm(
+    app: FastAPI, client: httpx.AsyncClient, warmup: asyncio.Future[None] | None
+) -> None:
+    # The hosts are known once every channel is loaded.
+    if warmup is not None:
+        with contextlib.suppress(Exception):
+            await asyncio.shield(warmup)
+    hosts = {
+        host
+        for channel in app.state.path_to_channel.values()
+        for host in channel.upstream_hosts
+    }
+    warmed = await prewarm(client, hosts)
+    logger.info(f"Pre-warmed connections to {len(warmed)} of {len(hosts)} hosts")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     """
-    Manages the application's lifespan, including the HTTP client.
+    Manages the application's lifespan, including the HTTP client and
+    background tasks.
     """
-    timeout = httpx.Timeout(10.0, connect=5.0, read=30.0)
-    limits = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    monitor = LoopLagMonitor(
+        interval=settings.loop_monitor_interval_seconds,
+        slow_threshold=settings.loop_slow_threshold_seconds,
+    )
+    monitor.start()
+
+    loop = asyncio.get_running_loop()
+    # Signal handlers can only be installed from the main thread.
+    with contextlib.suppress(RuntimeError, ValueError, NotImplementedError):
+        loop.add_signal_handler(signal.SIGHUP, _reload_settings)
+
+    archive = (
+        ProgramArchive(settings.archive_path) if settings.archive_enabled else None
+    )
+    app.state.archive = archive
+
+    def archive_schedule(key: str, channel: Channel, schedule: Schedule) -> None:
+        # Windows are subsets of full feeds, which are archived anyway.
+        if archive is not None and key in app.state.path_to_channel:
+            archive.append_in_background(key, schedule.programs)
+
+    schedule_cache.add_listener(archive_schedule)
+
+    # Channel modules are imported on first use; import the rest off the loop
+    # now, so no request pays for it.
+    warmup = (
+        asyncio.create_task(asyncio.to_thread(app.state.path_to_channel.load_all))
+        if settings.channel_warmup_enabled
+        else None
+    )
+
+    try:
+        async with upstream_client() as client:
+            app.state.http_client = client
 
-    async with httpx.AsyncClient(timeout=timeout, limits=limits, http2=True) as client:
-        app.state.http_client = client
-        yield
+            prewarming = (
+                asyncio.create_task(_prewarm(app, client, warmup))
+                if settings.upstream_prewarm_enabled
+                else None
+            )
+            refresher = ScheduleRefresher(
+                schedule_cache, app.state.path_to_channel, client
+            )
+            if settings.background_refresh_enabled:
+                refresher.start()
+            try:
+                yield
+            finally:
+                if prewarming is not None:
+                    prewarming.cancel()
+                    with contextlib.suppress(asyncio.CancelledError):
+                        await prewarming
+                await refresher.stop()
+    finally:
+        if warmup is not None:
+            with contextlib.suppress(Exception):
+                await warmup
+        schedule_cache.remove_listener(archive_schedule)
+        if archive is not None:
+            await archive.close()
+        with contextlib.suppress(RuntimeError, ValueError, NotImplementedError):
+            loop.remove_signal_handler(signal.SIGHUP)
+        await monitor.stop()
@@ -1,41 +1,64 @@
+import asyncio
 import logging
+import math
+import time
+from collections.abc import AsyncIterator, Sequence
 from pathlib import Path
-from xml.etree.ElementTree import tostring
 
-from fastapi import FastAPI, Request, Response
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Query, Request, Response
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
+from starlette.types import Receive, Scope, Send
 
-from app.channel import Channel
-from app.channels import (
-    fujitv,
-    mx_tv_1,
-    mx_tv_2,
-    nhk_e1_130,
-    nhk_g1_130,
-    ntv,
-    tbs,
-    tv_asahi,
-    tv_tokyo,
-)
+from app import admin, archive, grid
+from app.channel import Channel, Program, Schedule
+from app.channels import ChannelRegistry, lazy_channel, nhk_area_channels
+from app.config import settings
+from app.feeds import FORMATS, FeedFormat, negotiate, rss_items, rss_parts
 from app.lifespan import lifespan
+from app.schedule_cache import (
+    cache_control,
+    feed_key,
+    horizon_days,
+    schedule_cache,
+)
+from app.utils.admission import admission
+from app.utils.http import user_facing
+from app.utils.loop_monitor import stage
+from app.utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
-path_to_channel: dict[str, Channel] = {
-    "joak-dtv": nhk_g1_130,
-    "joab-dtv": nhk_e1_130,
-    "joax-dtv": ntv,
-    "jorx-dtv": tbs,
-    "jocx-dtv": fujitv,
-    "joex-dtv": tv_asahi,
-    "jotx-dtv": tv_tokyo,
-    "jomx-dtv-1": mx_tv_1,
-    "jomx-dtv-2": mx_tv_2,
-}
+# The longest window of days a feed can be asked for; every channel
+# publishes less than this ahead.
+MAX_WINDOW_DAYS = 31
+
+metrics.describe(
+    "dtv_rss_stream_truncated_total",
+    "Streamed RSS feeds closed before all items were sent, by reason.",
+)
+
+path_to_channel = ChannelRegistry(
+    {
+        "joak-dtv": lazy_channel("nhk", "nhk_g1_130", "NHK総合1・東京"),
+        "joab-dtv": lazy_channel("nhk", "nhk_e1_130", "NHK Eテレ1・東京"),
+        "joax-dtv": lazy_channel("ntv", "ntv", "日本テレビ"),
+        "jorx-dtv": lazy_channel("tbs", "tbs", "TBSテレビ"),
+        "jocx-dtv": lazy_channel("fujitv", "fujitv", "フジテレビ"),
+        "joex-dtv": lazy_channel("tv_asahi", "tv_asahi", "テレビ朝日"),
+        "jotx-dtv": lazy_channel("tv_tokyo", "tv_tokyo", "テレ東"),
+        "jomx-dtv-1": lazy_channel("mx_tv", "mx_tv_1", "TOKYO MX 1"),
+        "jomx-dtv-2": lazy_channel("mx_tv", "mx_tv_2", "TOKYO MX 2"),
+        **nhk_area_channels(settings.nhk_areas),
+    }
+)
 
 
 app = FastAPI(lifespan=lifespan)
+app.state.path_to_channel = path_to_channel
+app.include_router(admin.router)
+app.include_router(archive.router)
+app.include_router(grid.router)
 templates = Jinja2Templates(
     directory=Path(__file__).resolve().parent.parent / "templates"
 )
@@ -43,26 +66,233 @@ templates = Jinja2Templates(
 
 @app.get("/", response_class=HTMLResponse, name="index")
 async def get_top_page(request: Request) -> Response:
+    # The page only changes with the settings, so it is kept for a TTL.
     return templates.TemplateResponse(
         request=request,
         name="index.html",
-        context={"channels": path_to_channel},
+        context={"channels": path_to_channel.names()},
+        headers={"Cache-Control": cache_control(settings.schedule_cache_ttl_seconds)},
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse, name="metrics")
+async def get_metrics() -> Response:
+    return PlainTextResponse(metrics.render())
+
+
+async def _get_schedule_within_deadline(
+    key: str, channel: Channel, days: int | None
+) -> Schedule | None:
+    """
+    Returns the channel's schedule, or the last cached one (possibly stale)
+    if a fresh one cannot be had before the request deadline. The refresh
+    keeps running in the background either way.
+    """
+    client = app.state.http_client
+    try:
+        async with asyncio.timeout(settings.request_deadline_seconds):
+            return await schedule_cache.get(key, channel, client, days)
+    except TimeoutError:
+        entry = schedule_cache.peek(key)
+        if entry is None:
+            logger.warning(f"Deadline exceeded for {key} with nothing cached")
+            return None
+        logger.warning(f"Deadline exceeded for {key}, serving stale schedule")
+        return entry.schedule
+
+
+def render_feed_items(
+    fmt: FeedFormat, schedule: Schedule, programs: Sequence[Program]
+) -> bytes:
+    head, tail = fmt.parts(schedule.channel_name, schedule.channel_url, programs)
+    with stage(f"render_{fmt.name}"):
+        items = fmt.items(schedule.channel_name, programs, schedule.programs)
+    return head + items + tail
+
+
+def render_feed(key: str, schedule: Schedule, fmt: FeedFormat) -> bytes:
+    return schedule_cache.render(
+        key,
+        schedule,
+        fmt.name,
+        lambda: render_feed_items(fmt, schedule, schedule.programs),
     )
 
 
+async def stream_rss(
+    channel: Channel,
+    segments: AsyncIterator[Sequence[Program]],
+    timeout: float | None,
+) -> AsyncIterator[bytes]:
+    """
+    Writes the RSS header at once and each segment's items as it arrives.
+    Past `timeout`, or on error, the feed is closed with the items so far,
+    marked by a comment since the status has already been sent.
+    """
+    head, tail = rss_parts(channel.channel_name, channel.channel_url)
+    yield head
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        while True:
+            left = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                segment = await asyncio.wait_for(anext(segments), left)
+            except StopAsyncIteration:
+                break
+            with stage("render_rss_segment"):
+                chunk = rss_items(channel.channel_name, segment)
+            yield chunk
+    except TimeoutError:
+        logger.warning(
+            f"Deadline exceeded streaming {channel.channel_name}, truncating"
+        )
+        metrics.inc("dtv_rss_stream_truncated_total", reason="deadline")
+        yield b"<!-- truncated at the deadline -->"
+    except Exception:
+        logger.exception(f"Error streaming schedule for {channel.channel_name}")
+        metrics.inc("dtv_rss_stream_truncated_total", reason="error")
+        yield b"<!-- truncated by an error -->"
+
+    yield tail
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    A streaming response to an admitted request, released once the response
+    ends, however it ends: a body that never starts, because the client left
+    first, still releases it.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            admission.release()
+
+
 @app.get("/{path}", name="rss_feed")
-async def get_schedule_rss(path: str) -> Response:
-    if path not in path_to_channel:
-        return Response(status_code=404)
+async def get_schedule_rss(
+    path: str,
+    request: Request,
+    days: int | None = Query(default=None, ge=1, le=MAX_WINDOW_DAYS),
+    since: str | None = None,
+) -> Response:
+    # The format is named by a suffix (joak-dtv.ics) or negotiated.
+    vary = {}
+    if path in path_to_channel:
+        fmt = negotiate(request.headers.get("Accept", ""))
+        vary = {"Vary": "Accept"}
+    else:
+        path, _, suffix = path.rpartition(".")
+        if path not in path_to_channel or suffix not in FORMATS:
+            return Response(status_code=404)
+        fmt = FORMATS[suffix]
+    channel = path_to_channel[path]
+
+    # A window shorter than the horizon, and than what the channel
+    # publishes, is cached (and fetched) on its own.
+    limits = [
+        limit
+        for limit in (horizon_days(path, channel), channel.published_days)
+        if limit is not None
+    ]
+    if days is not None and limits and days >= min(limits):
+        days = None
+    key = feed_key(path, days)
+
+    user_facing.set(True)
+    schedule_cache.record_request(key)
+
+    # Cache misses wait on upstreams, so they are admitted within limits.
+    # Once over them, a stale schedule is served if there is one.
+    entry = schedule_cache.peek(key)
+    shed = admitted = False
+    if entry is None or not entry.is_fresh(time.monotonic()):
+        retry_after = admission.try_admit(
+            request.client.host if request.client else None
+        )
+        if retry_after is None:
+            admitted = True
+        elif entry is None:
+            return Response(
+                status_code=503,
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+        else:
+            shed = True
 
     try:
-        client = app.state.http_client
-        schedule = await path_to_channel[path].fetch_schedule(client)
+        if fmt.name == "rss" and settings.rss_streaming_enabled and entry is None:
+            # Cold cache: start sending before all days are fetched.
+            segments = schedule_cache.stream(key, channel, app.state.http_client, days)
+            admitted = False  # released once the response ends
+            return AdmittedStreamingResponse(
+                stream_rss(channel, segments, settings.request_deadline_seconds),
+                media_type=fmt.media_type,
+                # It may be cut short at the deadline.
+                headers={"Cache-Control": "no-store", **vary},
+            )
+
+        schedule: Schedule | None
+        if shed and entry is not None:
+            schedule = entry.schedule
+        else:
+            schedule = await _get_schedule_within_deadline(key, channel, days)
+        if schedule is None:
+            return Response(status_code=504)
+
+        # Shared caches keep the response as long as the cache entry lasts.
+        entry = schedule_cache.peek(key)
+        cache_headers = {
+            "Cache-Control": (
+                entry.cache_control(time.monotonic()) if entry else "no-store"
+            ),
+            **vary,
+        }
+
+        # Each format is a representation of its own.
+        etag = (
+            f'"{schedule.version}"'
+            if fmt.name == "rss"
+            else f'"{schedule.version}.{fmt.name}"'
+        )
+        if (
+            etag in request.headers.get("If-None-Match", "")
+            or since == schedule.version
+        ):
+            return Response(status_code=304, headers={"ETag": etag, **cache_headers})
+
+        headers = {
+            "ETag": etag,
+            "X-Schedule-Version": schedule.version,
+            **cache_headers,
+        }
+        if since is not None:
+            changed = schedule_cache.stats(key).changed_since(since, schedule)
+            if changed is not None:
+                # Only what changed since the client's version, so this is not
+                # a representation of the feed that its ETag would identify.
+                return Response(
+                    content=render_feed_items(fmt, schedule, changed),
+                    media_type=fmt.media_type,
+                    headers={
+                        "X-Schedule-Version": schedule.version,
+                        "X-Feed-Delta": "delta",
+                        **cache_headers,
+                    },
+                )
+            # Too old to compare against: the client resynchronizes in full.
+            headers["X-Feed-Delta"] = "full"
 
         return Response(
-            content=tostring(schedule.to_rss_channel().to_xml()),
-            media_type="application/xml",
+            content=render_feed(key, schedule, fmt),
+            media_type=fmt.media_type,
+            headers=headers,
         )
     except Exception:
         logger.exception(f"Error fetching schedule for path: {path}")
         return Response(status_code=500)
+    finally:
+        if admitted:
+            admission.release()
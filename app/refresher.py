@@ -0,0 +1,100 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections.abc import Mapping
+
+import httpx
+
+from app.channel import Channel
+from app.config import settings
+from app.schedule_cache import ChannelStats, ScheduleCache
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe(
+    "dtv_refresh_interval_seconds", "Current adaptive refresh interval per feed."
+)
+metrics.describe("dtv_background_refreshes_total", "Background schedule refreshes.")
+
+
+def refresh_interval(stats: ChannelStats, now: float) -> float:
+    """
+    Returns how often a channel should be refreshed in the background.
+
+    Starting from the maximum interval, the interval is divided by
+    `1 + requests per minute`, so hot feeds stay fresh, and shortened by up to
+    half for channels whose content changed on most recent refreshes. The
+    result is clamped to the configured bounds.
+    """
+    requests_per_minute = stats.requests.rate(now) * 60
+    interval = settings.refresh_max_interval_seconds / (1 + requests_per_minute)
+    interval *= 1 - 0.5 * stats.change_rate
+    return min(
+        settings.refresh_max_interval_seconds,
+        max(settings.refresh_min_interval_seconds, interval),
+    )
+
+
+class ScheduleRefresher:
+    """
+    Refreshes cached schedules in the background, each at its adaptive
+    interval. Channels nobody requested since their last fetch are left alone.
+    """
+
+    def __init__(
+        self,
+        cache: ScheduleCache,
+        channels: Mapping[str, Channel],
+        client: httpx.AsyncClient,
+    ):
+        self.cache = cache
+        self.channels = channels
+        self.client = client
+        self._task: asyncio.Task[None] | None = None
+
+    def due(self, now: float) -> list[str]:
+        due = []
+        for key in self.channels:
+            entry = self.cache.peek(key)
+            if entry is None:
+                continue
+            stats = self.cache.stats(key)
+            interval = refresh_interval(stats, now)
+            metrics.set_gauge("dtv_refresh_interval_seconds", interval, path=key)
+            if stats.last_request_at < entry.fetched_at:
+                continue
+            if now - entry.fetched_at >= interval:
+                due.append(key)
+        return due
+
+    async def _refresh(self, key: str) -> None:
+        try:
+            await self.cache.refresh(key, self.channels[key], self.client)
+        except Exception:
+            metrics.inc("dtv_background_refreshes_total", path=key, result="error")
+            logger.warning(f"Background refresh of {key} failed", exc_info=True)
+        else:
+            metrics.inc("dtv_background_refreshes_total", path=key, result="ok")
+
+    async def run_once(self) -> list[str]:
+        keys = self.due(time.monotonic())
+        await asyncio.gather(*(self._refresh(key) for key in keys))
+        return keys
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.refresh_check_interval_seconds)
+            await self.run_once()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
@@ -1,5 +1,5 @@
 import datetime
-from xml.etree.ElementTree import Element
+from xml.etree.ElementTree import Element, tostring
 
 from pydantic import AwareDatetime, BaseModel, HttpUrl
 
@@ -12,6 +12,7 @@ class Item(BaseModel):
     title: str | None = None
     link: HttpUrl | None = None
     description: str | None = None
+    guid: str | None = None
     pub_date: AwareDatetime | None = None
 
     def to_xml(self) -> Element:
@@ -32,6 +33,12 @@ class Item(BaseModel):
             description.text = self.description
             item.append(description)
 
+        if self.guid:
+            guid = Element("guid")
+            guid.set("isPermaLink", "false")
+            guid.text = self.guid
+            item.append(guid)
+
         if self.pub_date:
             pub_date = Element("pubDate")
             pub_date.text = datetime_to_rfc822(self.pub_date)
@@ -70,3 +77,14 @@ class Channel(BaseModel):
                 channel.append(item.to_xml())
 
         return rss
+
+    def to_xml_parts(self) -> tuple[bytes, bytes]:
+        """
+        Serializes the channel without its items, split where the items go,
+        so items can be streamed between the two parts.
+        """
+        closing = b"</channel></rss>"
+        xml = tostring(self.model_copy(update={"item": None}).to_xml())
+        if not xml.endswith(closing):
+            raise ValueError(f"RSS document does not end with {closing!r}: {xml!r}")
+        return xml[: -len(closing)], closing
@@ -0,0 +1,499 @@
+import asyncio
+import logging
+import math
+import random
+import sys
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Callable, Sequence
+from dataclasses import dataclass, field
+
+import httpx
+
+from app.channel import Channel, Program, Schedule
+from app.config import settings
+from app.utils.http import upstream_context
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe(
+    "dtv_schedule_cache_bytes", "Estimated memory held by cached schedules."
+)
+metrics.describe("dtv_schedule_cache_entries", "Number of cached schedules.")
+metrics.describe(
+    "dtv_schedule_cache_evictions_total",
+    "Cached schedules evicted to stay within the memory budget.",
+)
+
+# Approximate size of a Program without its strings: the model instance, its
+# __dict__ and fields set, its datetime and its slot in the program list.
+PROGRAM_OVERHEAD_BYTES = 600
+
+
+def estimate_schedule_bytes(schedule: Schedule) -> int:
+    """
+    Estimates the memory held by a schedule, counting its strings as CPython
+    stores them (1, 2 or 4 bytes per character) plus a fixed overhead per
+    program.
+    """
+    size = sys.getsizeof(schedule.channel_name) + len(str(schedule.channel_url))
+    for program in schedule.programs:
+        size += PROGRAM_OVERHEAD_BYTES + sys.getsizeof(program.title)
+        if program.description is not None:
+            size += sys.getsizeof(program.description)
+        if program.url is not None:
+            size += len(str(program.url))
+    return size
+
+
+def feed_key(path: str, days: int | None = None) -> str:
+    """
+    Returns the cache key of a feed, or of a window of its first `days` days.
+    """
+    return path if days is None else f"{path}?days={days}"
+
+
+def split_feed_key(key: str) -> tuple[str, int | None]:
+    """
+    Returns the feed path of a cache key and the days of its window, if any.
+    """
+    path, _, days = key.partition("?days=")
+    return path, int(days) if days else None
+
+
+def _override[T](overrides: dict[str, T], key: str, channel: Channel) -> T | None:
+    for name in (key.partition("?")[0], type(channel).__name__):
+        if name in overrides:
+            return overrides[name]
+    return None
+
+
+def ttl_seconds(key: str, channel: Channel) -> float:
+    """
+    Returns the configured TTL of a channel's schedule: an override for its
+    feed path, else one for its class name, else the global TTL.
+    """
+    ttl = _override(settings.schedule_cache_ttl_overrides, key, channel)
+    return settings.schedule_cache_ttl_seconds if ttl is None else ttl
+
+
+def horizon_days(key: str, channel: Channel) -> int | None:
+    """
+    Returns how many days a channel's full feed covers, resolved like its TTL,
+    or None for every day its sources publish.
+    """
+    days = _override(settings.schedule_horizon_overrides, key, channel)
+    return settings.schedule_horizon_days if days is None else days
+
+
+def ttl_jitter() -> float:
+    """
+    Returns a random factor that spreads expiries of schedules fetched
+    together, within the configured jitter ratio.
+    """
+    ratio = settings.schedule_cache_ttl_jitter_ratio
+    return random.uniform(1 - ratio, 1 + ratio)
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    channel: Channel
+    schedule: Schedule
+    fetched_at: float
+    jitter: float = 1.0
+    # Rendered feeds of this schedule by format, kept as long as the entry.
+    rendered: dict[str, bytes] = field(default_factory=dict)
+    schedule_bytes: int = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.schedule_bytes = estimate_schedule_bytes(self.schedule)
+
+    @property
+    def expires_at(self) -> float:
+        # Looked up on every check, so reloaded TTL settings apply at once.
+        return self.fetched_at + ttl_seconds(self.key, self.channel) * self.jitter
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.expires_at
+
+    def cache_control(self, now: float) -> str:
+        """
+        Returns a Cache-Control header for responses rendered from this entry,
+        so shared caches expire them when the entry expires.
+        """
+        return cache_control(self.expires_at - now)
+
+    @property
+    def size_bytes(self) -> int:
+        return self.schedule_bytes + sum(map(len, self.rendered.values()))
+
+
+def cache_control(max_age: float) -> str:
+    """
+    Returns a Cache-Control header letting shared caches such as CDNs serve a
+    response for `max_age` seconds, and past that while they revalidate it or
+    if revalidating fails.
+    """
+    stale_while_revalidate = settings.cache_control_stale_while_revalidate_seconds
+    return (
+        f"public, max-age={max(0, int(max_age))}"
+        f", stale-while-revalidate={stale_while_revalidate}"
+        f", stale-if-error={settings.cache_control_stale_if_error_seconds}"
+    )
+
+
+class DecayingRate:
+    """
+    An event rate (events per second) that decays exponentially with the
+    given half-life, so recent events weigh more than old ones.
+    """
+
+    def __init__(self, half_life: float):
+        self.half_life = half_life
+        self._value = 0.0
+        self._updated_at = time.monotonic()
+
+    def _decay(self, now: float) -> None:
+        elapsed = max(0.0, now - self._updated_at)
+        self._value *= 0.5 ** (elapsed / self.half_life)
+        self._updated_at = now
+
+    def add(self, now: float, amount: float = 1.0) -> None:
+        self._decay(now)
+        self._value += amount
+
+    def rate(self, now: float) -> float:
+        self._decay(now)
+        return self._value * math.log(2) / self.half_life
+
+
+# Weight of the latest refresh in a channel's change rate.
+CHANGE_RATE_ALPHA = 0.3
+
+
+@dataclass
+class ChannelStats:
+    requests: DecayingRate = field(default_factory=lambda: DecayingRate(3600.0))
+    last_request_at: float = -math.inf
+    # Share of recent refreshes that found different content; unknown at first.
+    change_rate: float = 0.5
+    last_error: str | None = None
+    last_error_at: float | None = None
+    # Recent schedule versions, oldest first, with their programs' digests.
+    versions: deque[tuple[str, frozenset[bytes]]] = field(
+        default_factory=lambda: deque(maxlen=settings.delta_history_versions)
+    )
+
+    def record_refresh(self, changed: bool) -> None:
+        self.change_rate += CHANGE_RATE_ALPHA * (float(changed) - self.change_rate)
+
+    def record_version(self, schedule: Schedule) -> None:
+        if self.versions and self.versions[-1][0] == schedule.version:
+            return
+        digests = frozenset(program.digest for program in schedule.programs)
+        self.versions.append((schedule.version, digests))
+
+    def changed_since(self, version: str, schedule: Schedule) -> list[Program] | None:
+        """
+        Returns the programs of `schedule` added or changed since `version`,
+        or None if `version` is too old (or unknown) to compare against.
+        """
+        for known, digests in self.versions:
+            if known == version:
+                return [p for p in schedule.programs if p.digest not in digests]
+        return None
+
+
+class _Refresh:
+    """
+    A refresh in flight. Publishes schedule segments as they arrive, so
+    streaming responses can follow it while other callers await the result.
+    """
+
+    def __init__(self) -> None:
+        self.segments: list[Sequence[Program]] = []
+        self.task: asyncio.Task[Schedule] | None = None
+        self._changed = asyncio.Event()
+
+    def publish(self, segment: Sequence[Program]) -> None:
+        self.segments.append(segment)
+        self.notify()
+
+    def notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def iter_segments(self) -> AsyncIterator[Sequence[Program]]:
+        assert self.task is not None
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.segments):
+                yield self.segments[index]
+                index += 1
+            if self.task.done():
+                self.task.result()  # raise the refresh's error, if any
+                return
+            await changed.wait()
+
+
+class ScheduleCache:
+    """
+    Caches each channel's schedule for its (jittered, per-channel) TTL and
+    keeps it afterwards, so an expired schedule can still be served when a
+    refresh cannot finish in time.
+    Concurrent refreshes of the same channel share one fetch.
+
+    Entries beyond the memory budget are evicted, least recently used first.
+
+    Entries are keyed by feed path alone. The HTTP client is passed to each
+    call and held only while a refresh is in flight, so a new client keeps
+    the cache warm and an old one can be released.
+    """
+
+    def __init__(self) -> None:
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._refreshes: dict[str, _Refresh] = {}
+        self._stats: dict[str, ChannelStats] = {}
+        self._listeners: list[Callable[[str, Channel, Schedule], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def windows(self, path: str) -> dict[str, int]:
+        """
+        Returns the cache keys of the feed's cached windows, with their days.
+        """
+        windows = {}
+        for key in self._entries:
+            window_path, days = split_feed_key(key)
+            if window_path == path and days is not None:
+                windows[key] = days
+        return windows
+
+    def peek(self, key: str) -> CacheEntry | None:
+        """
+        Returns the cached entry for `key`, fresh or not, without fetching.
+        """
+        return self._entries.get(key)
+
+    def stats(self, key: str) -> ChannelStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = ChannelStats()
+        return stats
+
+    def add_listener(self, listener: Callable[[str, Channel, Schedule], None]) -> None:
+        """
+        Registers `listener` to be called with each new schedule version
+        stored, right after it is cached. It must not block.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(
+        self, listener: Callable[[str, Channel, Schedule], None]
+    ) -> None:
+        self._listeners.remove(listener)
+
+    def refreshing(self, key: str) -> bool:
+        return key in self._refreshes
+
+    def record_request(self, key: str) -> None:
+        now = time.monotonic()
+        stats = self.stats(key)
+        stats.requests.add(now)
+        stats.last_request_at = now
+
+    async def get(
+        self,
+        key: str,
+        channel: Channel,
+        client: httpx.AsyncClient,
+        days: int | None = None,
+    ) -> Schedule:
+        """
+        Returns the cached schedule for `key`, refreshing it if it expired.
+        `days` limits the schedule to a window; by default it covers the
+        configured horizon, or all the channel's sources publish.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if entry.is_fresh(time.monotonic()):
+                return entry.schedule
+        return await self.refresh(key, channel, client, days)
+
+    def render(
+        self, key: str, schedule: Schedule, fmt: str, render: Callable[[], bytes]
+    ) -> bytes:
+        """
+        Returns `schedule` rendered in `fmt`, rendering it only once per
+        cached schedule. Its bytes count towards the entry's size.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry.schedule.version != schedule.version:
+            return render()
+        content = entry.rendered.get(fmt)
+        if content is None:
+            content = entry.rendered[fmt] = render()
+            self._evict(keep=key)
+        return content
+
+    def memory_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._entries.values())
+
+    def _evict(self, keep: str) -> None:
+        budget = settings.schedule_cache_max_bytes
+        if budget is None:
+            return
+        total = self.memory_bytes()
+        for key in list(self._entries):
+            if total <= budget:
+                break
+            if key == keep:
+                continue
+            total -= self._entries.pop(key).size_bytes
+            metrics.inc("dtv_schedule_cache_evictions_total")
+            logger.info(f"Evicted {key} from the schedule cache")
+
+    async def refresh(
+        self,
+        key: str,
+        channel: Channel,
+        client: httpx.AsyncClient,
+        days: int | None = None,
+    ) -> Schedule:
+        task = self._start_refresh(key, channel, client, days, streaming=False).task
+        assert task is not None
+        # Shielded, so a caller giving up does not abort the shared fetch.
+        return await asyncio.shield(task)
+
+    def stream(
+        self,
+        key: str,
+        channel: Channel,
+        client: httpx.AsyncClient,
+        days: int | None = None,
+    ) -> AsyncIterator[Sequence[Program]]:
+        """
+        Starts (or joins) a refresh of `key` and returns an iterator over its
+        schedule segments in order, each yielded as soon as it is fetched.
+        """
+        refresh = self._start_refresh(key, channel, client, days, streaming=True)
+        return refresh.iter_segments()
+
+    def _start_refresh(
+        self,
+        key: str,
+        channel: Channel,
+        client: httpx.AsyncClient,
+        days: int | None,
+        streaming: bool,
+    ) -> _Refresh:
+        refresh = self._refreshes.get(key)
+        if refresh is None:
+            refresh = self._refreshes[key] = _Refresh()
+            # The refresh outlives its first caller, so it runs in a context
+            # of its own, keeping only its upstream request options.
+            refresh.task = asyncio.create_task(
+                self._fetch(key, channel, client, days, refresh, streaming),
+                context=upstream_context(),
+            )
+            refresh.task.add_done_callback(
+                lambda task: self._on_refresh_done(key, refresh, task)
+            )
+        return refresh
+
+    def _on_refresh_done(
+        self, key: str, refresh: _Refresh, task: asyncio.Task[Schedule]
+    ) -> None:
+        self._refreshes.pop(key, None)
+        refresh.notify()
+        # Retrieve the exception even if every caller has stopped waiting.
+        if task.cancelled():
+            return
+        error = task.exception()
+        stats = self.stats(key)
+        if error is None:
+            stats.last_error = stats.last_error_at = None
+            return
+        logger.debug(f"Refresh of {key} failed", exc_info=error)
+        stats.last_error = f"{type(error).__name__}: {error}"
+        stats.last_error_at = time.monotonic()
+
+    async def _fetch(
+        self,
+        key: str,
+        channel: Channel,
+        client: httpx.AsyncClient,
+        days: int | None,
+        refresh: _Refresh,
+        streaming: bool,
+    ) -> Schedule:
+        if days is None:
+            days = horizon_days(key, channel)
+        if streaming:
+            async for segment in channel.iter_schedule_segments(client, days):
+                refresh.publish(segment)
+            schedule = Schedule(
+                channel_name=channel.channel_name,
+                channel_url=channel.channel_url,
+                programs=[p for segment in refresh.segments for p in segment],
+            )
+        else:
+            schedule = await channel.fetch_schedule(client, days)
+            refresh.publish(schedule.programs)
+
+        stats = self.stats(key)
+        previous = self._entries.get(key)
+        changed = previous is None or previous.schedule.version != schedule.version
+        if previous is not None:
+            stats.record_refresh(changed=changed)
+        stats.record_version(schedule)
+
+        self._entries[key] = CacheEntry(
+            key=key,
+            channel=channel,
+            schedule=schedule,
+            fetched_at=time.monotonic(),
+            jitter=ttl_jitter(),
+        )
+        self._entries.move_to_end(key)
+        self._evict(keep=key)
+        if changed:
+            for listener in self._listeners:
+                # A failing listener must neither fail the refresh, which is
+                # already cached, nor keep the others from being called.
+                try:
+                    listener(key, channel, schedule)
+                except Exception:
+                    logger.exception(f"Schedule listener {listener!r} failed for {key}")
+        return schedule
+
+    def invalidate(self, key: str | None = None) -> None:
+        """
+        Drops the cached schedule for `key` and its windows, or for every
+        channel, so the next request fetches it again. Refreshes in flight are
+        left to finish.
+        """
+        if key is None:
+            self._entries.clear()
+            return
+        for window in self.windows(key):
+            del self._entries[window]
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._stats.clear()
+
+
+schedule_cache = ScheduleCache()
+metrics.gauge_callback(
+    "dtv_schedule_cache_bytes", lambda: {(): float(schedule_cache.memory_bytes())}
+)
+metrics.gauge_callback(
+    "dtv_schedule_cache_entries", lambda: {(): float(len(schedule_cache))}
+)
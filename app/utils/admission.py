@@ -0,0 +1,103 @@
+import time
+from collections import OrderedDict
+
+from app.config import settings
+from app.utils.metrics import metrics
+
+metrics.describe(
+    "dtv_cold_requests_in_flight", "Admitted requests waiting on a cache miss."
+)
+metrics.describe(
+    "dtv_cold_requests_shed_total", "Requests on a cache miss turned away by reason."
+)
+
+# Seconds a client is asked to wait when too many cold requests are in flight.
+IN_FLIGHT_RETRY_AFTER = 1.0
+
+
+class TokenBucket:
+    """
+    A token bucket holding up to `burst` tokens and earning `rate` per second.
+    """
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = now
+
+    def _fill(self, now: float) -> None:
+        elapsed = max(0.0, now - self.updated_at)
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def try_take(self, now: float) -> float | None:
+        """
+        Takes a token, or returns how many seconds until one is available.
+        """
+        self._fill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return None
+        return (1.0 - self.tokens) / self.rate
+
+
+class AdmissionControl:
+    """
+    Admits requests that cannot be served from the cache, which wait on
+    upstreams and hold the event loop's attention. Each client spends a token
+    from its own bucket per cold request, and at most a fixed number of cold
+    requests are in flight at once. Requests served from the cache are not
+    counted, so they get through however busy the cold path is.
+
+    Limits are looked up on every request, so reloaded settings apply at once.
+    """
+
+    def __init__(self, max_clients: int = 10_000):
+        self.max_clients = max_clients
+        self.in_flight = 0
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    def _bucket(self, client: str, rate: float, now: float) -> TokenBucket:
+        burst = settings.inbound_client_burst
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(rate, burst, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket.rate, bucket.burst = rate, burst
+        return bucket
+
+    def try_admit(self, client: str | None) -> float | None:
+        """
+        Admits a cold request from `client`, or returns how many seconds it
+        should wait before retrying. An admitted request must be released.
+        """
+        limit = settings.inbound_max_cold_in_flight
+        if limit is not None and self.in_flight >= limit:
+            metrics.inc("dtv_cold_requests_shed_total", reason="in_flight")
+            return IN_FLIGHT_RETRY_AFTER
+
+        rate = settings.inbound_client_rate_per_second
+        if client is not None and rate is not None:
+            now = time.monotonic()
+            retry_after = self._bucket(client, rate, now).try_take(now)
+            if retry_after is not None:
+                metrics.inc("dtv_cold_requests_shed_total", reason="client_rate")
+                return retry_after
+
+        self.in_flight += 1
+        metrics.set_gauge("dtv_cold_requests_in_flight", self.in_flight)
+        return None
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        metrics.set_gauge("dtv_cold_requests_in_flight", self.in_flight)
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+
+admission = AdmissionControl()
@@ -0,0 +1,294 @@
+import asyncio
+import itertools
+import logging
+import socket
+import time
+from collections.abc import Iterable
+from typing import Any
+
+import httpcore
+import httpx
+
+from app.config import settings
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# How long a connection attempt runs before the next address is tried
+# alongside it, as Happy Eyeballs (RFC 8305) recommends.
+HAPPY_EYEBALLS_DELAY = 0.25
+
+metrics.describe("dtv_upstream_dns_lookups_total", "Upstream DNS lookups by result.")
+metrics.describe(
+    "dtv_upstream_connections_total", "Upstream TCP connections opened per host."
+)
+metrics.describe(
+    "dtv_upstream_network_requests_total",
+    "Upstream requests sent over the network (not answered by the HTTP cache).",
+)
+metrics.describe(
+    "dtv_upstream_connection_reuse_ratio",
+    "Share of upstream requests per host sent over an existing connection.",
+)
+
+
+class DnsCache:
+    """
+    Caches resolved addresses per host and port for a fixed TTL, since the
+    system resolver's answers carry none. Looked up on every connection, so a
+    reloaded TTL applies at once.
+    """
+
+    def __init__(self) -> None:
+        self._addresses: dict[tuple[str, int], tuple[float, list[str]]] = {}
+
+    async def resolve(self, host: str, port: int) -> list[str]:
+        ttl = settings.upstream_dns_cache_ttl_seconds
+        now = time.monotonic()
+        cached = self._addresses.get((host, port))
+        if ttl is not None and cached is not None and now < cached[0]:
+            metrics.inc("dtv_upstream_dns_lookups_total", result="hit")
+            return cached[1]
+
+        metrics.inc("dtv_upstream_dns_lookups_total", result="miss")
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            host, port, type=socket.SOCK_STREAM
+        )
+        # Unique addresses in the resolver's order of preference.
+        addresses = list(dict.fromkeys(str(info[4][0]) for info in infos))
+        if ttl is not None:
+            self._addresses[(host, port)] = (now + ttl, addresses)
+        return addresses
+
+    def forget(self, host: str, port: int) -> None:
+        self._addresses.pop((host, port), None)
+
+    def clear(self) -> None:
+        self._addresses.clear()
+
+
+class ConnectionStats:
+    """
+    Counts requests and newly opened connections per upstream host, to tell
+    how often requests reuse a kept-alive connection.
+    """
+
+    def __init__(self) -> None:
+        self.requests: dict[str, int] = {}
+        self.connections: dict[str, int] = {}
+
+    def _update_ratio(self, host: str) -> None:
+        requests = self.requests.get(host, 0)
+        if requests:
+            reused = max(0, requests - self.connections.get(host, 0))
+            metrics.set_gauge(
+                "dtv_upstream_connection_reuse_ratio", reused / requests, host=host
+            )
+
+    def record_request(self, host: str) -> None:
+        self.requests[host] = self.requests.get(host, 0) + 1
+        metrics.inc("dtv_upstream_network_requests_total", host=host)
+        self._update_ratio(host)
+
+    def record_connection(self, host: str) -> None:
+        self.connections[host] = self.connections.get(host, 0) + 1
+        metrics.inc("dtv_upstream_connections_total", host=host)
+        self._update_ratio(host)
+
+
+def interleave_families(addresses: list[str]) -> list[str]:
+    """
+    Orders addresses alternately by family, starting with the family of the
+    resolver's first choice, so a broken family costs one attempt at a time.
+    """
+    ipv6 = [a for a in addresses if ":" in a]
+    ipv4 = [a for a in addresses if ":" not in a]
+    first, second = (ipv6, ipv4) if addresses and ":" in addresses[0] else (ipv4, ipv6)
+    pairs = itertools.zip_longest(first, second)
+    return [address for pair in pairs for address in pair if address is not None]
+
+
+class ResolvingBackend(httpcore.AsyncNetworkBackend):
+    """
+    A network backend that resolves hosts through a `DnsCache` and races
+    connections to their addresses, Happy Eyeballs style: each attempt gets
+    a head start of `HAPPY_EYEBALLS_DELAY` (or until it fails) before the
+    next address joins in, and the first to connect wins. All attempts end
+    within the connect timeout. Every new
+    connection is counted. TLS still verifies the host name, which httpcore
+    passes separately.
+    """
+
+    def __init__(
+        self,
+        backend: httpcore.AsyncNetworkBackend,
+        dns_cache: DnsCache,
+        stats: ConnectionStats,
+    ):
+        self._backend = backend
+        self._dns_cache = dns_cache
+        self._stats = stats
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: float | None = None,
+        local_address: str | None = None,
+        socket_options: Iterable[Any] | None = None,
+    ) -> httpcore.AsyncNetworkStream:
+        try:
+            addresses = await self._dns_cache.resolve(host, port)
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+
+        try:
+            stream = await self._race(
+                interleave_families(addresses),
+                port,
+                timeout,
+                local_address,
+                socket_options,
+            )
+        except (httpcore.ConnectError, httpcore.ConnectTimeout):
+            # The host may have moved; resolve it again next time.
+            self._dns_cache.forget(host, port)
+            raise
+        self._stats.record_connection(host)
+        return stream
+
+    async def _race(
+        self,
+        addresses: list[str],
+        port: int,
+        timeout: float | None,
+        local_address: str | None,
+        socket_options: Iterable[Any] | None,
+    ) -> httpcore.AsyncNetworkStream:
+        # The attempts share one connect timeout, each getting what is left.
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        untried = iter(addresses)
+        pending: set[asyncio.Task[httpcore.AsyncNetworkStream]] = set()
+        error: BaseException | None = None
+        try:
+            while True:
+                address = next(untried, None)
+                if address is not None:
+                    left = (
+                        None if deadline is None else max(0.0, deadline - loop.time())
+                    )
+                    connect = self._backend.connect_tcp(
+                        address, port, left, local_address, socket_options
+                    )
+                    pending.add(asyncio.ensure_future(connect))
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=None if address is None else HAPPY_EYEBALLS_DELAY,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                winner = None
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task.result()
+                    else:
+                        await task.result().aclose()
+                if winner is not None:
+                    return winner
+        finally:
+            for task in pending:
+                task.cancel()
+            # Attempts finishing as they were cancelled must not leak.
+            for result in await asyncio.gather(*pending, return_exceptions=True):
+                if isinstance(result, httpcore.AsyncNetworkStream):
+                    await result.aclose()
+
+        if isinstance(error, Exception):
+            raise error
+        raise httpcore.ConnectError(f"No addresses to connect to among {addresses}")
+
+    async def connect_unix_socket(
+        self,
+        path: str,
+        timeout: float | None = None,
+        socket_options: Iterable[Any] | None = None,
+    ) -> httpcore.AsyncNetworkStream:
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+class UpstreamTransport(httpx.AsyncHTTPTransport):
+    """
+    httpx's HTTP/2-capable transport, counting the requests that reach the
+    network per host. Its connection pool connects through a
+    `ResolvingBackend`, unless requests go through a proxy, which resolves
+    hosts itself.
+    """
+
+    def __init__(
+        self,
+        limits: httpx.Limits,
+        dns_cache: DnsCache,
+        stats: ConnectionStats,
+        proxy: str | None = None,
+        network_backend: httpcore.AsyncNetworkBackend | None = None,
+    ):
+        super().__init__(http2=True, limits=limits, proxy=proxy)
+        self._stats = stats
+        if proxy is None:
+            # The pool httpx builds, over a backend of our own.
+            self._pool = httpcore.AsyncConnectionPool(
+                ssl_context=httpx.create_ssl_context(),
+                max_connections=limits.max_connections,
+                max_keepalive_connections=limits.max_keepalive_connections,
+                keepalive_expiry=limits.keepalive_expiry,
+                http2=True,
+                network_backend=ResolvingBackend(
+                    network_backend or httpcore.AnyIOBackend(), dns_cache, stats
+                ),
+            )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._stats.record_request(request.url.host)
+        return await super().handle_async_request(request)
+
+
+def network_transport(
+    limits: httpx.Limits, dns_cache: DnsCache, stats: ConnectionStats
+) -> httpx.AsyncBaseTransport:
+    """
+    Returns the transport to upstreams, through `upstream_proxy_url` if set,
+    resolving hosts through `dns_cache` and counting requests and
+    connections in `stats`.
+    """
+    return UpstreamTransport(limits, dns_cache, stats, settings.upstream_proxy_url)
+
+
+async def prewarm(client: httpx.AsyncClient, hosts: Iterable[str]) -> list[str]:
+    """
+    Opens a kept-alive connection to each host, with a HEAD request to its
+    root, so the first fetches skip DNS, TCP and TLS setup. Returns the hosts
+    that answered; failures are logged and left to the fetches themselves.
+    """
+
+    async def warm(host: str) -> bool:
+        try:
+            await client.head(f"https://{host}/")
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to pre-warm a connection to {host}: {e!r}")
+            return False
+        return True
+
+    hosts = sorted(set(hosts))
+    results = await asyncio.gather(*(warm(host) for host in hosts))
+    return [host for host, ok in zip(hosts, results, strict=True) if ok]
+
+
+dns_cache = DnsCache()
+connection_stats = ConnectionStats()
@@ -1,5 +1,16 @@
+import asyncio
+import contextlib
+import contextvars
+import enum
+import heapq
+import itertools
 import json
 import logging
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from contextvars import ContextVar
+from dataclasses import dataclass, field
 from typing import Any
 
 import httpx
@@ -11,8 +22,292 @@ from tenacity import (
     wait_exponential,
 )
 
+from app.config import settings
+from app.utils.http_cache import CACHE_STATUS_EXTENSION, ParseMemo, content_digest
+from app.utils.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+parse_memo = ParseMemo(max_entries=settings.upstream_cache_max_entries)
+
+metrics.describe("dtv_parse_reused_total", "Parsed results reused without parsing.")
+metrics.describe("dtv_upstream_in_flight", "Upstream requests in flight per host.")
+metrics.describe("dtv_upstream_queued", "Upstream requests waiting per host.")
+metrics.describe(
+    "dtv_upstream_queue_seconds_total", "Time upstream requests spent queued."
+)
+metrics.describe("dtv_upstream_hedges_total", "Hedged upstream requests by winner.")
+metrics.describe(
+    "dtv_upstream_coalesced_total", "Upstream fetches joined while in flight."
+)
+
+
+class Priority(enum.IntEnum):
+    """Upstream request tiers; lower values are served first."""
+
+    USER = 0  # a user request is waiting on a cache miss
+    TODAY = 1  # background refresh of today's data
+    PREFETCH = 2  # background prefetch of later days
+
+
+# (tier, days ahead), compared lexicographically
+RequestPriority = tuple[int, int]
+
+# Set by request handlers so that fetches they trigger are served first.
+user_facing: ContextVar[bool] = ContextVar("user_facing", default=False)
+
+# Set by forced refreshes so that upstream responses are revalidated rather
+# than served fresh from the HTTP cache.
+revalidate_upstream: ContextVar[bool] = ContextVar("revalidate_upstream", default=False)
+
+
+def upstream_context() -> contextvars.Context:
+    """
+    Returns an empty context carrying only the current upstream request
+    options, for tasks that outlive the caller starting them.
+    """
+    context = contextvars.Context()
+    for var in (user_facing, revalidate_upstream):
+        context.run(var.set, var.get())
+    return context
+
+
+def day_priority(days_ahead: int = 0) -> RequestPriority:
+    """
+    Returns the priority of a fetch for data `days_ahead` days from today.
+    """
+    if user_facing.get():
+        tier = Priority.USER
+    elif days_ahead <= 0:
+        tier = Priority.TODAY
+    else:
+        tier = Priority.PREFETCH
+    return (int(tier), days_ahead)
+
+
+@dataclass
+class _HostQueue:
+    limit: int
+    # Minimum seconds between request starts; 0 when the host is not paced.
+    interval: float = 0.0
+    next_start: float = 0.0
+    active: int = 0
+    waiters: list[tuple[RequestPriority, int, asyncio.Future[None]]] = field(
+        default_factory=list
+    )
+
+
+class UpstreamScheduler:
+    """
+    Caps concurrent upstream requests per host and, when a host is saturated,
+    hands freed slots to waiting requests in priority order (FIFO within the
+    same priority). Hosts with a rate limit also have their request starts
+    spaced out to at most that many per second.
+    """
+
+    def __init__(
+        self,
+        default_limit: int,
+        host_limits: dict[str, int] | None = None,
+        host_rates: dict[str, float] | None = None,
+    ):
+        self.default_limit = default_limit
+        self.host_limits = host_limits or {}
+        self.host_rates = host_rates or {}
+        self._hosts: dict[str, _HostQueue] = {}
+        self._counter = itertools.count()
+
+    def _queue(self, host: str) -> _HostQueue:
+        queue = self._hosts.get(host)
+        if queue is None:
+            limit = self.host_limits.get(host, self.default_limit)
+            rate = self.host_rates.get(host)
+            queue = self._hosts[host] = _HostQueue(
+                limit=max(1, limit), interval=1 / rate if rate else 0.0
+            )
+        return queue
+
+    async def _pace(self, queue: _HostQueue) -> None:
+        if not queue.interval:
+            return
+        # The start is only taken once due, so a request cancelled while it
+        # waits leaves no gap behind, and waiters woken together re-check.
+        while (now := time.monotonic()) < queue.next_start:
+            await asyncio.sleep(queue.next_start - now)
+        queue.next_start = now + queue.interval
+
+    def _update_gauges(self, host: str, queue: _HostQueue) -> None:
+        metrics.set_gauge("dtv_upstream_in_flight", queue.active, host=host)
+        metrics.set_gauge("dtv_upstream_queued", len(queue.waiters), host=host)
+
+    async def _acquire(self, host: str, priority: RequestPriority) -> None:
+        queue = self._queue(host)
+        if queue.active < queue.limit and not queue.waiters:
+            queue.active += 1
+            self._update_gauges(host, queue)
+            return
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.waiters, (priority, next(self._counter), future))
+        self._update_gauges(host, queue)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before cancellation; pass it on.
+                self._release(host)
+            raise
+
+    def _release(self, host: str) -> None:
+        queue = self._queue(host)
+        while queue.waiters:
+            _, _, future = heapq.heappop(queue.waiters)
+            if not future.done():
+                # The slot moves to the waiter, so `active` stays the same.
+                future.set_result(None)
+                self._update_gauges(host, queue)
+                return
+        queue.active -= 1
+        self._update_gauges(host, queue)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, host: str, priority: RequestPriority) -> AsyncIterator[None]:
+        start = time.perf_counter()
+        await self._acquire(host, priority)
+        try:
+            await self._pace(self._queue(host))
+            metrics.inc(
+                "dtv_upstream_queue_seconds_total",
+                time.perf_counter() - start,
+                host=host,
+            )
+            yield
+        finally:
+            self._release(host)
+
+
+scheduler = UpstreamScheduler(
+    default_limit=settings.upstream_max_concurrency_per_host,
+    host_limits=settings.upstream_host_concurrency_limits,
+    host_rates=settings.upstream_host_rate_limits,
+)
+
+
+class LatencyTracker:
+    """
+    Keeps a sliding window of recent request latencies per host.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: dict[str, deque[float]] = {}
+
+    def record(self, host: str, seconds: float) -> None:
+        samples = self._samples.get(host)
+        if samples is None:
+            samples = self._samples[host] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, host: str, percentile: float) -> float | None:
+        """
+        Returns the given percentile of the host's latencies, or None until
+        enough samples have been seen to trust it.
+        """
+        samples = self._samples.get(host)
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+
+class HedgeBudget:
+    """
+    A token bucket that earns `ratio` tokens per primary request and spends
+    one per hedge, so hedges stay below `ratio` of all upstream requests.
+    """
+
+    def __init__(self, ratio: float, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+
+    def on_request(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+latency_tracker = LatencyTracker()
+hedge_budget = HedgeBudget(ratio=settings.upstream_hedge_budget_ratio)
+
+
+async def _timed_get(client: httpx.AsyncClient, url: str, host: str) -> httpx.Response:
+    start = time.perf_counter()
+    headers = {"Cache-Control": "no-cache"} if revalidate_upstream.get() else None
+    response = await client.get(url, headers=headers)
+    # Answers from the local cache say nothing of the host's latency.
+    if response.extensions.get(CACHE_STATUS_EXTENSION) != "fresh":
+        latency_tracker.record(host, time.perf_counter() - start)
+    return response
+
+
+async def _hedge_get(
+    client: httpx.AsyncClient, url: str, host: str, priority: RequestPriority
+) -> httpx.Response:
+    async with scheduler.slot(host, priority):
+        return await _timed_get(client, url, host)
+
+
+async def _get(
+    client: httpx.AsyncClient, url: str, host: str, priority: RequestPriority
+) -> httpx.Response:
+    """
+    Sends a GET. With hedging enabled, a duplicate is sent once the request
+    outlives the host's latency percentile, budget permitting, and whichever
+    succeeds first wins.
+    """
+    if not settings.upstream_hedging_enabled:
+        return await _timed_get(client, url, host)
+
+    hedge_budget.on_request()
+    delay = latency_tracker.percentile(host, settings.upstream_hedge_percentile)
+    primary = asyncio.ensure_future(_timed_get(client, url, host))
+    attempts = [primary]
+    try:
+        if delay is None:
+            return await primary
+
+        finished, _ = await asyncio.wait({primary}, timeout=delay)
+        if finished or not hedge_budget.try_spend():
+            return await primary
+
+        logger.debug(f"Hedging request for {url} after {delay:.3f}s")
+        hedge = asyncio.ensure_future(_hedge_get(client, url, host, priority))
+        attempts.append(hedge)
+        pending: set[asyncio.Future[httpx.Response]] = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    winner = "hedge" if task is hedge else "primary"
+                    metrics.inc("dtv_upstream_hedges_total", host=host, winner=winner)
+                    return task.result()
+        # Both attempts failed; surface the primary's error to the retry logic.
+        return await primary
+    finally:
+        # Also when the caller is cancelled, e.g. while waiting to hedge.
+        for task in attempts:
+            if not task.done():
+                task.cancel()
+
 
 class Http5xxError(Exception):
     """Custom exception for HTTP 5xx errors."""
@@ -38,9 +333,15 @@ def _make_retry_attempt_logger(operation: str):
     return _log_retry_attempt
 
 
+_backoff = wait_exponential(multiplier=1, min=1, max=10)
+
+
+_stop = stop_after_attempt(3)
+
+
 @retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=1, max=10),
+    stop=_stop,
+    wait=_backoff,
     retry=retry_if_exception_type(
         (
             httpx.TimeoutException,
@@ -51,12 +352,19 @@ def _make_retry_attempt_logger(operation: str):
     ),
     before_sleep=_make_retry_attempt_logger("HTTP fetch"),
 )
-async def fetch_with_retry(client: httpx.AsyncClient, url: str) -> httpx.Response:
+async def fetch_with_retry(
+    client: httpx.AsyncClient, url: str, priority: RequestPriority | None = None
+) -> httpx.Response:
     """
-    Fetches a URL with retries on transient errors.
+    Fetches a URL with retries on transient errors. Each attempt waits for a
+    slot from the upstream scheduler; backoff between attempts does not hold one.
     """
     logger.debug(f"Fetching URL: {url}")
-    response = await client.get(url)
+    host = httpx.URL(url).host
+    if priority is None:
+        priority = day_priority()
+    async with scheduler.slot(host, priority):
+        response = await _get(client, url, host, priority)
     if 500 <= response.status_code < 600:
         raise Http5xxError(response)
     response.raise_for_status()
@@ -64,21 +372,34 @@ async def fetch_with_retry(client: httpx.AsyncClient, url: str) -> httpx.Respons
     return response
 
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=1, max=10),
-    retry=retry_if_exception_type(json.JSONDecodeError),
-    before_sleep=_make_retry_attempt_logger("JSON fetch/parse"),
-)
-async def fetch_json_with_retry(client: httpx.AsyncClient, url: str) -> Any:
+_in_flight: dict[str, asyncio.Task[httpx.Response]] = {}
+
+
+async def fetch_shared(
+    client: httpx.AsyncClient, url: str, priority: RequestPriority | None = None
+) -> httpx.Response:
     """
-    Fetches a URL and parses JSON with retries on transient errors
-    and JSON decode errors.
+    Like `fetch_with_retry`, but concurrent fetches of the same URL share one
+    upstream request, made at the priority of the first. The request runs
+    free of the first caller's context, e.g. its deadline.
     """
-    response = await fetch_with_retry(client, url)
+    task = _in_flight.get(url)
+    if task is None:
+        task = asyncio.create_task(
+            fetch_with_retry(client, url, priority or day_priority()),
+            context=upstream_context(),
+        )
+        _in_flight[url] = task
+        task.add_done_callback(lambda _: _in_flight.pop(url, None))
+    else:
+        metrics.inc("dtv_upstream_coalesced_total", host=httpx.URL(url).host)
+    # Shielded, so one caller giving up does not fail the others.
+    return await asyncio.shield(task)
+
 
+def _decode_json(response: httpx.Response, url: str) -> Any:
     try:
-        response_json = response.json()
+        return response.json()
     except json.JSONDecodeError:
         content_type = response.headers.get("Content-Type", "unknown")
         body_preview = response.text[:200] if response.text else "(empty)"
@@ -89,14 +410,74 @@ async def fetch_json_with_retry(client: httpx.AsyncClient, url: str) -> Any:
         )
         raise
 
+
+@retry(
+    stop=_stop,
+    wait=_backoff,
+    retry=retry_if_exception_type(json.JSONDecodeError),
+    before_sleep=_make_retry_attempt_logger("JSON fetch/parse"),
+)
+async def fetch_json_with_retry(
+    client: httpx.AsyncClient, url: str, priority: RequestPriority | None = None
+) -> Any:
+    """
+    Fetches a URL and parses JSON with retries on transient errors
+    and JSON decode errors.
+    """
+    response = await fetch_shared(client, url, priority)
+    response_json = _decode_json(response, url)
+
     logger.debug(f"Successfully parsed JSON from {url}")
     return response_json
 
 
-async def fetch_text_with_retry(client: httpx.AsyncClient, url: str) -> str:
+def memoized_parse[T](url: str, body: bytes | str, parse: Callable[[], T]) -> T:
+    """
+    Returns the result of `parse`, or the result previously parsed from `url`
+    when `body` is byte-identical to the body it was parsed from. `parse` must
+    depend only on the URL and body.
+    """
+    digest = content_digest(body)
+    previous = parse_memo.lookup(url, digest)
+    if previous is not None:
+        metrics.inc("dtv_parse_reused_total")
+        logger.debug(f"Reusing parsed result for unchanged {url}")
+        return previous
+
+    result = parse()
+    parse_memo.store(url, digest, result)
+    return result
+
+
+@retry(
+    stop=_stop,
+    wait=_backoff,
+    retry=retry_if_exception_type(json.JSONDecodeError),
+    before_sleep=_make_retry_attempt_logger("JSON fetch/parse"),
+)
+async def fetch_parsed_json_with_retry[T](
+    client: httpx.AsyncClient,
+    url: str,
+    parse: Callable[[Any], T],
+    priority: RequestPriority | None = None,
+) -> T:
+    """
+    Fetches a URL, parses JSON and converts it with `parse`, skipping both
+    when the body is byte-identical to the previous one fetched from the URL.
+    """
+    response = await fetch_shared(client, url, priority)
+
+    return memoized_parse(
+        url, response.content, lambda: parse(_decode_json(response, url))
+    )
+
+
+async def fetch_text_with_retry(
+    client: httpx.AsyncClient, url: str, priority: RequestPriority | None = None
+) -> str:
     """
     Fetches a URL and returns text content with retries on transient errors.
     """
-    response = await fetch_with_retry(client, url)
+    response = await fetch_shared(client, url, priority)
     logger.debug(f"Successfully fetched text from {url}")
     return response.text
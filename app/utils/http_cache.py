@@ -0,0 +1,260 @@
+import email.utils
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Response extension describing how the cache answered a request:
+# "miss", "fresh" (served without contacting upstream) or "revalidated" (304).
+CACHE_STATUS_EXTENSION = "dtv_cache_status"
+
+# Query parameters that only defeat upstream caches, e.g. NTV's `?_=<timestamp>`.
+CACHE_BUSTER_PARAMS = frozenset({"_"})
+
+metrics.describe("dtv_upstream_cache_total", "Upstream HTTP cache lookups.")
+
+
+def cache_key(url: httpx.URL | str) -> str:
+    """
+    Returns the cache key for a URL, with cache-buster query parameters removed.
+    """
+    url = httpx.URL(url)
+    params = [
+        (k, v) for k, v in url.params.multi_items() if k not in CACHE_BUSTER_PARAMS
+    ]
+    return str(url.copy_with(params=params, fragment=None))
+
+
+def _parse_cache_control(value: str) -> dict[str, str | None]:
+    directives: dict[str, str | None] = {}
+    for part in value.split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+
+def _parse_http_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers: httpx.Headers) -> float:
+    """
+    Computes the freshness lifetime of a response per RFC 9111 section 4.2.1,
+    without heuristic freshness: responses lacking explicit freshness are
+    always revalidated.
+    """
+    directives = _parse_cache_control(headers.get("Cache-Control", ""))
+    if "no-cache" in directives:
+        return 0.0
+
+    max_age = directives.get("max-age")
+    if max_age is not None:
+        try:
+            lifetime = float(max_age)
+        except ValueError:
+            return 0.0
+    else:
+        expires = _parse_http_date(headers.get("Expires"))
+        if expires is None:
+            return 0.0
+        date = _parse_http_date(headers.get("Date")) or time.time()
+        lifetime = expires - date
+
+    try:
+        age = float(headers.get("Age", 0))
+    except ValueError:
+        age = 0.0
+    return max(0.0, lifetime - age)
+
+
+def is_storable(response: httpx.Response) -> bool:
+    if response.status_code != 200:
+        return False
+    directives = _parse_cache_control(response.headers.get("Cache-Control", ""))
+    if "no-store" in directives or response.headers.get("Vary") == "*":
+        return False
+    return bool(
+        response.headers.get("ETag")
+        or response.headers.get("Last-Modified")
+        or freshness_lifetime(response.headers) > 0
+    )
+
+
+@dataclass
+class CacheEntry:
+    headers: httpx.Headers
+    content: bytes
+    stored_at: float
+    lifetime: float
+
+    @property
+    def etag(self) -> str | None:
+        return self.headers.get("ETag")
+
+    @property
+    def last_modified(self) -> str | None:
+        return self.headers.get("Last-Modified")
+
+    def is_fresh(self, now: float) -> bool:
+        return now - self.stored_at < self.lifetime
+
+    def to_response(self, status: str) -> httpx.Response:
+        return httpx.Response(
+            200,
+            headers=self.headers,
+            content=self.content,
+            extensions={CACHE_STATUS_EXTENSION: status},
+        )
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """
+    A private HTTP cache (RFC 9111) wrapped around another transport.
+
+    Stores the body and validators of cacheable GET responses per URL, serves
+    them while fresh, and otherwise revalidates them with `If-None-Match` and
+    `If-Modified-Since`. A 304 answer is turned into a 200 response carrying
+    the stored body. Every response is marked with the `dtv_cache_status`
+    extension, so callers can tell those answered without contacting the
+    upstream, which say nothing of its latency.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_entries: int = 512):
+        self._transport = transport
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+
+    def _store(self, key: str, entry: CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "GET":
+            return await self._transport.handle_async_request(request)
+
+        key = cache_key(request.url)
+        entry = self._entries.get(key)
+        now = time.time()
+
+        # A request with `no-cache` is never answered from storage, only
+        # revalidated (RFC 9111 5.2.1.4).
+        no_cache = "no-cache" in _parse_cache_control(
+            request.headers.get("Cache-Control", "")
+        )
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if entry.is_fresh(now) and not no_cache:
+                metrics.inc("dtv_upstream_cache_total", result="fresh")
+                return entry.to_response("fresh")
+            if entry.etag:
+                request.headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                request.headers["If-Modified-Since"] = entry.last_modified
+
+        response = await self._transport.handle_async_request(request)
+
+        if response.status_code == 304 and entry is not None:
+            await response.aclose()
+            # Headers of a 304 update the stored response (RFC 9111 4.3.4).
+            entry.headers.update(
+                {
+                    k: v
+                    for k, v in response.headers.items()
+                    if k.lower() != "content-length"
+                }
+            )
+            entry.stored_at = now
+            entry.lifetime = freshness_lifetime(entry.headers)
+            metrics.inc("dtv_upstream_cache_total", result="revalidated")
+            logger.debug(f"Revalidated cached response for {key}")
+            return entry.to_response("revalidated")
+
+        metrics.inc("dtv_upstream_cache_total", result="miss")
+        if not is_storable(response):
+            # The stored response is superseded and must not be served later.
+            self._entries.pop(key, None)
+            response.extensions[CACHE_STATUS_EXTENSION] = "miss"
+            return response
+
+        # Keep the raw (possibly compressed) bytes so the stored headers stay
+        # valid; the client decodes them on every read.
+        try:
+            content = b"".join(
+                [chunk async for chunk in response.stream]  # type: ignore[union-attr]
+            )
+        finally:
+            await response.aclose()
+        new_entry = CacheEntry(
+            headers=httpx.Headers(response.headers),
+            content=content,
+            stored_at=now,
+            lifetime=freshness_lifetime(response.headers),
+        )
+        self._store(key, new_entry)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            content=content,
+            extensions={**response.extensions, CACHE_STATUS_EXTENSION: "miss"},
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def content_digest(body: bytes | str) -> str:
+    if isinstance(body, str):
+        body = body.encode()
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ParseMemo:
+    """
+    Remembers the last result parsed from each URL together with a digest of
+    the body it was parsed from, so byte-identical bodies are parsed only once.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self._max_entries = max_entries
+        self._results: OrderedDict[str, tuple[str, Any]] = OrderedDict()
+
+    def lookup(self, url: str, digest: str) -> Any | None:
+        key = cache_key(url)
+        entry = self._results.get(key)
+        if entry is None or entry[0] != digest:
+            return None
+        self._results.move_to_end(key)
+        return entry[1]
+
+    def store(self, url: str, digest: str, result: Any) -> None:
+        key = cache_key(url)
+        self._results[key] = (digest, result)
+        self._results.move_to_end(key)
+        self._evict()
+
+    def resize(self, max_entries: int) -> None:
+        self._max_entries = max_entries
+        self._evict()
+
+    def _evict(self) -> None:
+        while len(self._results) > self._max_entries:
+            self._results.popitem(last=False)
+
+    def clear(self) -> None:
+        self._results.clear()
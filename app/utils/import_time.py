@@ -0,0 +1,101 @@
+"""
+Measures what importing a module costs, from `python -X importtime` run in a
+fresh interpreter, and lists the slowest imports:
+
+    python -m app.utils.import_time app.main --top 20
+"""
+
+import argparse
+import subprocess
+import sys
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ImportTime:
+    module: str
+    depth: int
+    self_seconds: float
+    cumulative_seconds: float
+
+
+def measure(module: str) -> list[ImportTime]:
+    """
+    Imports `module` in a fresh interpreter and returns the time taken by
+    each module it imported, in import order.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header
+        times.append(
+            ImportTime(
+                module=name.strip(),
+                depth=(len(name) - len(name.lstrip()) - 1) // 2,
+                self_seconds=int(self_us) / 1e6,
+                cumulative_seconds=int(cumulative_us) / 1e6,
+            )
+        )
+    return times
+
+
+def total_seconds(times: Sequence[ImportTime], module: str) -> float:
+    """
+    Returns how long importing `module` took, including everything it imported.
+    """
+    return next(
+        t.cumulative_seconds for t in times if t.depth == 0 and t.module == module
+    )
+
+
+def module_seconds(times: Sequence[ImportTime], module: str) -> float:
+    """
+    Returns how long importing `module` took, wherever it was first imported.
+    """
+    return next(t.cumulative_seconds for t in times if t.module == module)
+
+
+def imported_modules(module: str) -> set[str]:
+    """
+    Returns every module loaded by importing `module` in a fresh interpreter.
+    """
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys, {module}; print('\\n'.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(result.stdout.split())
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("module", nargs="?", default="app.main")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    times = measure(args.module)
+    slowest = sorted(times, key=lambda t: t.cumulative_seconds, reverse=True)
+    print(f"{'cumulative':>10}  {'self':>8}  module")
+    for t in slowest[: args.top]:
+        print(f"{t.cumulative_seconds:10.3f}  {t.self_seconds:8.3f}  {t.module}")
+    total = total_seconds(times, args.module)
+    print(f"Importing {args.module} took {total:.3f}s in total")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+from app.config import settings
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("dtv_event_loop_lag_seconds", "Last measured event-loop lag.")
+metrics.describe("dtv_event_loop_lag_max_seconds", "Maximum event-loop lag seen.")
+metrics.describe(
+    "dtv_event_loop_lag_slow_total", "Lag samples above the slow threshold."
+)
+metrics.describe("dtv_stage_seconds_total", "Time spent in instrumented stages.")
+metrics.describe("dtv_stage_calls_total", "Calls of instrumented stages.")
+metrics.describe("dtv_stage_slow_total", "Stage runs above the slow threshold.")
+
+
+@dataclass(frozen=True)
+class SlowStage:
+    name: str
+    duration: float
+    at: float
+
+
+recent_slow_stages: deque[SlowStage] = deque(maxlen=100)
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Times a synchronous stage that runs on the event loop, such as HTML
+    parsing or feed serialization, and records it when it runs longer than
+    the configured slow threshold.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        metrics.inc("dtv_stage_seconds_total", duration, stage=name)
+        metrics.inc("dtv_stage_calls_total", stage=name)
+        if duration >= settings.loop_slow_threshold_seconds:
+            metrics.inc("dtv_stage_slow_total", stage=name)
+            recent_slow_stages.append(SlowStage(name, duration, time.time()))
+            logger.warning(f"Slow stage {name} blocked the event loop {duration:.3f}s")
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop scheduling lag by sleeping for a fixed interval and
+    comparing the actual wake-up time with the expected one.
+    """
+
+    def __init__(self, interval: float, slow_threshold: float):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.max_lag = 0.0
+        self._task: asyncio.Task[None] | None = None
+
+    def record(self, lag: float) -> None:
+        self.max_lag = max(self.max_lag, lag)
+        metrics.set_gauge("dtv_event_loop_lag_seconds", lag)
+        metrics.set_gauge("dtv_event_loop_lag_max_seconds", self.max_lag)
+        if lag >= self.slow_threshold:
+            metrics.inc("dtv_event_loop_lag_slow_total")
+            last = recent_slow_stages[-1] if recent_slow_stages else None
+            logger.warning(
+                f"Event loop lagged {lag:.3f}s"
+                + (f" (last slow stage: {last.name})" if last else "")
+            )
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if settings.loop_debug_slow_callbacks:
+            # asyncio logs every callback or task step slower than this,
+            # naming the coroutine that held the loop.
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.slow_threshold
+        self._task = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
@@ -0,0 +1,93 @@
+import threading
+from collections.abc import Callable
+
+LabelSet = tuple[tuple[str, str], ...]
+
+
+def _label_set(labels: dict[str, str]) -> LabelSet:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(label_set: LabelSet) -> str:
+    if not label_set:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in label_set
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class Metrics:
+    """
+    A minimal in-process registry of counters and gauges, rendered in the
+    Prometheus text exposition format.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[LabelSet, float]] = {}
+        self._gauges: dict[str, dict[LabelSet, float]] = {}
+        self._gauge_callbacks: dict[str, Callable[[], dict[LabelSet, float]]] = {}
+        self._help: dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, amount: float = 1.0, **labels: str) -> None:
+        key = _label_set(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_set(labels)] = value
+
+    def gauge_callback(
+        self, name: str, callback: Callable[[], dict[LabelSet, float]]
+    ) -> None:
+        """
+        Registers a callback evaluated at render time, for gauges whose value
+        is cheaper to compute on scrape than to keep up to date.
+        """
+        self._gauge_callbacks[name] = callback
+
+    def get(self, name: str, **labels: str) -> float:
+        key = _label_set(labels)
+        with self._lock:
+            for family in (self._counters, self._gauges):
+                if name in family and key in family[name]:
+                    return family[name][key]
+        return 0.0
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            families = [
+                ("counter", name, dict(series))
+                for name, series in sorted(self._counters.items())
+            ] + [
+                ("gauge", name, dict(series))
+                for name, series in sorted(self._gauges.items())
+            ]
+        families += [
+            ("gauge", name, callback())
+            for name, callback in sorted(self._gauge_callbacks.items())
+        ]
+
+        lines = []
+        for kind, name, series in families:
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+            for label_set, value in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(label_set)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,69 @@
+import datetime
+
+import pytest
+
+from app.channels import nhk_area_channels
+from app.channels.nhk import Nhk, nhk_g1_130
+from app.channels.nhk_areas import AREAS, area_documents
+
+
+def make_event(event_id: str, name: str) -> dict:
+    return {
+        "type": "BroadcastEvent",
+        "id": event_id,
+        "name": name,
+        "description": "説明",
+        "startDate": "2025-03-20T07:00:00+09:00",
+        "endDate": "2025-03-20T08:00:00+09:00",
+    }
+
+
+def test_areas_cover_every_prefecture():
+    assert len(AREAS) == 47
+    assert AREAS["130"] == "東京"
+
+
+def area_channel(path: str) -> Nhk:
+    area_id = path.rpartition("-")[2]
+    channel = nhk_area_channels([area_id])[path].load()
+    assert isinstance(channel, Nhk)
+    return channel
+
+
+def test_nhk_area_channels_generates_feeds_per_service():
+    factories = nhk_area_channels(["270", "130"])
+
+    assert set(factories) == {"nhk-g1-270", "nhk-e1-270"}
+    assert factories["nhk-g1-270"].channel_name == "NHK総合1・大阪"
+    assert area_channel("nhk-g1-270").channel_name == "NHK総合1・大阪"
+    assert area_channel("nhk-e1-270").area_id == "270"
+
+
+def test_nhk_area_channels_rejects_unknown_area():
+    with pytest.raises(ValueError):
+        nhk_area_channels(["999"])
+
+
+def test_area_documents_counts_every_day_url_of_the_areas():
+    urls = {
+        channel.day_url(day)
+        for factory in nhk_area_channels(AREAS).values()
+        if isinstance(channel := factory.load(), Nhk)
+        for day in channel.days()
+    }
+
+    assert area_documents(AREAS) == len(urls) > 512
+
+
+def test_parse_broadcast_events_interns_programs_across_areas():
+    day = datetime.date(2025, 3, 20)
+    osaka_g1 = area_channel("nhk-g1-270")
+
+    tokyo = nhk_g1_130.parse_day(
+        {"g1": {"publication": [make_event("130-1", "ニュース")]}}, day
+    )
+    osaka = osaka_g1.parse_day(
+        {"g1": {"publication": [make_event("270-1", "ニュース")]}}, day
+    )
+
+    assert osaka[0] is tokyo[0]
@@ -0,0 +1,56 @@
+import sys
+
+import pytest
+
+from app.channels import (
+    ChannelFactory,
+    ChannelRegistry,
+    lazy_channel,
+    nhk_area_channels,
+)
+from app.channels.nhk import Nhk
+from app.main import path_to_channel
+
+
+def test_registry_builds_channels_on_first_access():
+    calls = []
+
+    def load():
+        calls.append(1)
+        return lazy_channel("ntv", "ntv", "日本テレビ").load()
+
+    registry = ChannelRegistry({"joax-dtv": ChannelFactory("日本テレビ", load)})
+
+    assert "joax-dtv" in registry
+    assert "unknown" not in registry
+    assert list(registry) == ["joax-dtv"]
+    assert registry.names() == {"joax-dtv": "日本テレビ"}
+    assert calls == []
+    assert registry["joax-dtv"] is registry["joax-dtv"]
+    assert registry["joax-dtv"] is sys.modules["app.channels.ntv"].ntv
+    assert calls == [1]
+    assert registry.loaded() == ["joax-dtv"]
+
+
+def test_registry_load_all_loads_every_channel():
+    registry = ChannelRegistry(nhk_area_channels(["270"]))
+
+    registry.load_all()
+
+    assert registry.loaded() == ["nhk-g1-270", "nhk-e1-270"]
+    assert isinstance(registry["nhk-e1-270"], Nhk)
+    assert registry["nhk-e1-270"].channel_name == "NHK Eテレ1・大阪"
+
+
+def test_nhk_area_channels_rejects_unknown_areas_at_once():
+    with pytest.raises(ValueError, match="Unknown NHK area"):
+        nhk_area_channels(["999"])
+
+
+def test_registry_names_match_the_channels_built():
+    registry = ChannelRegistry(path_to_channel._factories)
+
+    names = registry.names()
+
+    assert registry.loaded() == []
+    assert names == {path: channel.channel_name for path, channel in registry.items()}
@@ -0,0 +1,45 @@
+import datetime
+
+import pytest
+from pydantic import HttpUrl
+
+from app.channel import TOKYO, Program, Schedule
+from app.schedule_cache import schedule_cache
+from app.utils.admission import admission
+
+# The day test programs air on, from midnight in Tokyo.
+TEST_DAY = datetime.datetime(2025, 3, 20, tzinfo=TOKYO)
+
+
+def make_program(
+    title: str = "Test Program",
+    hour: float = 0,
+    description: str | None = None,
+    url: HttpUrl | None = None,
+) -> Program:
+    """
+    Returns a program starting `hour` hours after the start of `TEST_DAY`.
+    """
+    return Program(
+        title=title,
+        url=url,
+        description=description,
+        start=TEST_DAY + datetime.timedelta(hours=hour),
+    )
+
+
+def make_schedule(*programs: Program, channel_name: str = "Test Channel") -> Schedule:
+    return Schedule(
+        channel_name=channel_name,
+        channel_url=HttpUrl("http://example.com"),
+        programs=list(programs),
+    )
+
+
+@pytest.fixture(autouse=True)
+def clear_schedule_cache():
+    schedule_cache.clear()
+    admission.clear()
+    yield
+    schedule_cache.clear()
+    admission.clear()
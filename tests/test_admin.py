@@ -0,0 +1,188 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+from conftest import make_schedule
+from fastapi.testclient import TestClient
+from pydantic import SecretStr
+
+from app.config import settings
+from app.main import app, path_to_channel
+from app.schedule_cache import schedule_cache
+from app.utils.http import revalidate_upstream
+
+AUTH = {"Authorization": "Bearer secret"}
+
+
+@pytest.fixture(autouse=True)
+def admin_token(monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", SecretStr("secret"))
+
+
+def test_admin_is_disabled_without_token(monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", None)
+    with TestClient(app) as client:
+        response = client.get("/admin/cache", headers=AUTH)
+
+    assert response.status_code == 404
+
+
+def test_admin_rejects_wrong_token():
+    with TestClient(app) as client:
+        assert client.get("/admin/cache").status_code == 401
+        response = client.get("/admin/cache", headers={"Authorization": "Bearer wrong"})
+
+    assert response.status_code == 401
+
+
+def test_admin_lists_cache_states():
+    path = "joak-dtv"
+    with (
+        patch.object(
+            path_to_channel[path],
+            "fetch_schedule",
+            new=AsyncMock(return_value=make_schedule()),
+        ),
+        TestClient(app) as client,
+    ):
+        client.get(f"/{path}")
+        response = client.get("/admin/cache", headers=AUTH)
+
+    assert response.status_code == 200
+    states = response.json()
+    assert set(states) == set(path_to_channel)
+    assert states[path]["cached"]
+    assert states[path]["fresh"]
+    assert states[path]["programs"] == 0
+    assert states[path]["size_bytes"] > 0
+    assert not states["joab-dtv"]["cached"]
+
+
+def test_admin_lists_and_refreshes_windows():
+    path = "joak-dtv"
+    fetch = AsyncMock(return_value=make_schedule())
+    with (
+        patch.object(path_to_channel[path], "fetch_schedule", new=fetch),
+        TestClient(app) as client,
+    ):
+        client.get(f"/{path}?days=2")
+        state = client.get(f"/admin/cache/{path}", headers=AUTH).json()
+        response = client.post(f"/admin/cache/{path}/refresh", headers=AUTH)
+
+    assert state["windows"][f"{path}?days=2"]["cached"]
+    assert response.status_code == 200
+    assert sorted(call.args[1] or 0 for call in fetch.await_args_list) == [0, 2, 2]
+
+
+def test_admin_invalidates_one_channel():
+    path = "joak-dtv"
+    fetch = AsyncMock(return_value=make_schedule())
+    with (
+        patch.object(path_to_channel[path], "fetch_schedule", new=fetch),
+        TestClient(app) as client,
+    ):
+        client.get(f"/{path}")
+        response = client.delete(f"/admin/cache/{path}", headers=AUTH)
+        client.get(f"/{path}")
+
+    assert response.status_code == 204
+    assert fetch.await_count == 2
+
+
+def test_admin_refresh_reports_error():
+    path = "joak-dtv"
+    with (
+        patch.object(
+            path_to_channel[path],
+            "fetch_schedule",
+            new=AsyncMock(side_effect=Exception("Test error")),
+        ),
+        TestClient(app) as client,
+    ):
+        response = client.post(f"/admin/cache/{path}/refresh", headers=AUTH)
+        state = client.get(f"/admin/cache/{path}", headers=AUTH).json()
+
+    assert response.status_code == 502
+    assert state["last_error"] == "Exception: Test error"
+    assert not state["cached"]
+
+
+def test_admin_refresh_is_single_flight():
+    path = "joak-dtv"
+
+    async def fetch_schedule(client, days=None):
+        await asyncio.sleep(0.05)
+        return make_schedule()
+
+    fetch = AsyncMock(side_effect=fetch_schedule)
+
+    async def refresh_twice(client):
+        return await asyncio.gather(
+            schedule_cache.refresh(path, path_to_channel[path], client),
+            schedule_cache.refresh(path, path_to_channel[path], client),
+        )
+
+    with (
+        patch.object(path_to_channel[path], "fetch_schedule", new=fetch),
+        TestClient(app) as client,
+    ):
+        first, second = client.portal.call(refresh_twice, app.state.http_client)
+        response = client.post(f"/admin/cache/{path}/refresh", headers=AUTH)
+
+    assert first is second
+    assert response.status_code == 200
+    assert fetch.await_count == 2
+
+
+def test_admin_refresh_endpoint_joins_refresh_in_flight():
+    path = "joak-dtv"
+
+    async def fetch_schedule(client, days=None):
+        await asyncio.sleep(0.05)
+        return make_schedule()
+
+    fetch = AsyncMock(side_effect=fetch_schedule)
+
+    async def refresh_and_post(client):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as admin:
+            _, response = await asyncio.gather(
+                schedule_cache.refresh(path, path_to_channel[path], client),
+                admin.post(f"/admin/cache/{path}/refresh", headers=AUTH),
+            )
+        return response
+
+    with (
+        patch.object(path_to_channel[path], "fetch_schedule", new=fetch),
+        TestClient(app) as client,
+    ):
+        response = client.portal.call(refresh_and_post, app.state.http_client)
+
+    assert response.status_code == 200
+    assert fetch.await_count == 1
+
+
+def test_admin_refresh_revalidates_upstream_and_clears_error():
+    path = "joak-dtv"
+    revalidating = []
+
+    async def fetch_schedule(client, days=None):
+        revalidating.append(revalidate_upstream.get())
+        if len(revalidating) == 1:
+            raise Exception("Test error")
+        return make_schedule()
+
+    with (
+        patch.object(path_to_channel[path], "fetch_schedule", new=fetch_schedule),
+        TestClient(app) as client,
+    ):
+        failed = client.post(f"/admin/cache/{path}/refresh", headers=AUTH)
+        refreshed = client.post(f"/admin/cache/{path}/refresh", headers=AUTH)
+
+    assert failed.status_code == 502
+    assert refreshed.status_code == 200
+    assert refreshed.json()["last_error"] is None
+    assert revalidating == [True, True]
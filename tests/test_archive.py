@@ -0,0 +1,124 @@
+import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from conftest import make_program, make_schedule
+from fastapi.testclient import TestClient
+
+from app.archive import ProgramArchive
+from app.channel import TOKYO
+from app.config import settings
+from app.main import app, path_to_channel
+
+
+@pytest.fixture
+async def archive(tmp_path):
+    archive = ProgramArchive(str(tmp_path / "archive.sqlite3"))
+    yield archive
+    await archive.close()
+
+
+async def test_archive_appends_only_new_or_changed_programs(archive):
+    programs = [make_program("News", 7), make_program("Drama", 21)]
+
+    assert await archive.append("jorx-dtv", programs) == 2
+    assert await archive.append("jorx-dtv", programs) == 0
+    assert await archive.append("jorx-dtv", [make_program("News", 7, "Edited")]) == 1
+    assert await archive.append("jocx-dtv", programs) == 2
+
+
+async def test_archive_pages_programs_in_start_order(archive):
+    await archive.append("jorx-dtv", [make_program(f"P{h}", h) for h in range(10)])
+
+    titles: list[str] = []
+    cursor = None
+    while True:
+        items, cursor = await archive.programs("jorx-dtv", cursor=cursor, limit=3)
+        titles += [item["title"] for item in items]
+        if cursor is None:
+            break
+
+    assert titles == [f"P{h}" for h in range(10)]
+
+    items, _ = await archive.programs(
+        "jorx-dtv",
+        start=datetime.datetime(2025, 3, 20, 5, tzinfo=TOKYO),
+        end=datetime.datetime(2025, 3, 20, 7, tzinfo=TOKYO),
+    )
+    assert [item["title"] for item in items] == ["P5", "P6"]
+    assert items[0]["start"] == "2025-03-20T05:00:00+09:00"
+
+
+async def test_archive_searches_titles_and_descriptions(archive):
+    await archive.append(
+        "jorx-dtv",
+        [
+            make_program("ニュースウオッチ9", 21),
+            make_program("天気予報", 22, "全国のニュース"),
+            make_program("ドラマ", 23),
+        ],
+    )
+    await archive.append("jocx-dtv", [make_program("めざましニュース", 6)])
+
+    items, _ = await archive.search("ニュース")
+    assert [item["title"] for item in items] == [
+        "天気予報",
+        "ニュースウオッチ9",
+        "めざましニュース",
+    ]
+
+    items, _ = await archive.search("ニュース", channel="jocx-dtv")
+    assert [item["title"] for item in items] == ["めざましニュース"]
+
+    items, _ = await archive.search("ドラ")
+    assert [item["title"] for item in items] == ["ドラマ"]
+
+
+async def test_archive_searches_all_channels_in_start_order(archive):
+    for hour in range(6):
+        channel = ["jorx-dtv", "jocx-dtv"][hour % 2]
+        await archive.append(channel, [make_program(f"ニュース{hour}", hour)])
+    statements: list[str] = []
+    archive._connect().set_trace_callback(statements.append)
+
+    titles: list[str] = []
+    cursor = None
+    while True:
+        items, cursor = await archive.search("ニュース", cursor=cursor, limit=4)
+        titles += [item["title"] for item in items]
+        if cursor is None:
+            break
+
+    assert titles == [f"ニュース{hour}" for hour in reversed(range(6))]
+    plan = archive._connect().execute(f"EXPLAIN QUERY PLAN {statements[0]}")
+    assert "TEMP B-TREE" not in str([row["detail"] for row in plan])
+
+
+def test_archive_endpoints_serve_refreshed_programs(monkeypatch, tmp_path):
+    path = "joak-dtv"
+    monkeypatch.setattr(settings, "archive_enabled", True)
+    monkeypatch.setattr(settings, "archive_path", str(tmp_path / "archive.sqlite3"))
+    schedule = make_schedule(make_program("ニュース7", 19))
+    with (
+        patch.object(
+            path_to_channel[path],
+            "fetch_schedule",
+            new=AsyncMock(return_value=schedule),
+        ),
+        TestClient(app) as client,
+    ):
+        client.get(f"/{path}")
+        listing = client.get(f"/archive/{path}")
+        search = client.get("/archive/search", params={"q": "ニュース"})
+        bad_cursor = client.get(f"/archive/{path}", params={"cursor": "x"})
+
+    assert [item["title"] for item in listing.json()["items"]] == ["ニュース7"]
+    assert [item["title"] for item in search.json()["items"]] == ["ニュース7"]
+    assert bad_cursor.status_code == 400
+
+
+def test_archive_endpoints_are_absent_when_disabled():
+    with TestClient(app) as client:
+        response = client.get("/archive/joak-dtv")
+
+    assert response.status_code == 404
@@ -1,6 +1,17 @@
+import asyncio
 import datetime
 
-from app.channel import Program
+from conftest import make_program, make_schedule
+
+from app.channel import (
+    TOKYO,
+    Program,
+    broadcast_today,
+    iter_in_order,
+    iter_weekly_pages,
+    window_end,
+    within_days,
+)
 
 
 def test_program_rss_description():
@@ -42,3 +53,98 @@ def test_program_rss_pub_date():
     expected_pub_date = start_date - datetime.timedelta(days=7)
 
     assert program.rss_pub_date == expected_pub_date
+
+
+def test_schedule_version_is_stable_for_equal_content():
+    assert (
+        make_schedule(make_program("A")).version
+        == make_schedule(make_program("A")).version
+    )
+
+
+def test_schedule_version_changes_with_content():
+    assert (
+        make_schedule(make_program("A")).version
+        != make_schedule(make_program("B")).version
+    )
+
+
+async def test_iter_in_order_yields_results_in_given_order():
+    async def value(result: int, delay: float) -> int:
+        await asyncio.sleep(delay)
+        return result
+
+    results = [r async for r in iter_in_order([value(1, 0.02), value(2, 0.0)])]
+
+    assert results == [1, 2]
+
+
+def make_program_on(days_ahead: int, hour: int) -> Program:
+    day = broadcast_today() + datetime.timedelta(days=days_ahead)
+    return Program(
+        title=f"{days_ahead}-{hour}",
+        url=None,
+        description=None,
+        start=datetime.datetime.combine(day, datetime.time(hour), tzinfo=TOKYO),
+    )
+
+
+def test_window_end_includes_programs_past_midnight():
+    end = window_end(1)
+
+    assert end.date() == broadcast_today() + datetime.timedelta(days=1)
+    assert end.hour == 4
+
+
+def test_within_days_keeps_programs_inside_window():
+    programs = [make_program_on(0, 20), make_program_on(1, 2), make_program_on(1, 5)]
+
+    assert within_days(programs, None) == programs
+    assert within_days(programs, 1) == programs[:2]
+
+
+async def test_iter_weekly_pages_skips_pages_beyond_window():
+    fetched: list[str] = []
+
+    async def fetch(url, priority):
+        fetched.append(url)
+        return [make_program_on(0, 5), make_program_on(3, 5)]
+
+    pages = [page async for page in iter_weekly_pages(fetch, ["this", "next"], 2)]
+
+    assert fetched == ["this"]
+    assert [[p.title for p in page] for page in pages] == [["0-5"]]
+
+    fetched.clear()
+    pages = [page async for page in iter_weekly_pages(fetch, ["this", "next"], None)]
+
+    assert fetched == ["this", "next"]
+
+
+def test_program_guid_is_stable_across_details_and_timezones():
+    program = make_program_on(1, 20)
+    edited = program.model_copy(update={"description": "Updated", "url": None})
+    in_utc = program.model_copy(
+        update={"start": program.start.astimezone(datetime.UTC)}
+    )
+
+    assert program.guid("A") == edited.guid("A") == in_utc.guid("A")
+    assert program.guid("A") != program.guid("B")
+    assert program.guid("A") != make_program_on(1, 21).guid("A")
+
+
+def test_program_guid_tells_apart_programs_sharing_a_start():
+    program = make_program_on(1, 20)
+    sharing = program.model_copy(update={"title": "Mini program"})
+
+    assert program.guid("A") != sharing.guid("A")
+
+
+def test_schedule_rss_items_have_guids():
+    schedule = make_schedule(make_program_on(0, 5), channel_name="A")
+
+    item = schedule.to_rss_channel().to_xml().find("channel/item/guid")
+
+    assert item is not None
+    assert item.get("isPermaLink") == "false"
+    assert item.text == schedule.programs[0].guid("A")
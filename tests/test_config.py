@@ -0,0 +1,19 @@
+from app.config import STARTUP_SETTINGS, Settings, reload_settings, settings
+
+
+def test_startup_settings_are_settings():
+    assert STARTUP_SETTINGS <= set(Settings.model_fields)
+
+
+def test_reload_settings_warns_of_changes_pending_a_restart(monkeypatch, caplog):
+    monkeypatch.setenv("UPSTREAM_HEDGE_BUDGET_RATIO", "0.5")
+    monkeypatch.setenv("SCHEDULE_CACHE_TTL_SECONDS", "60")
+    reload_settings()
+    try:
+        assert settings.upstream_hedge_budget_ratio == 0.5
+        assert "upstream_hedge_budget_ratio" in caplog.text
+        assert "schedule_cache_ttl_seconds" not in caplog.text
+    finally:
+        monkeypatch.delenv("UPSTREAM_HEDGE_BUDGET_RATIO")
+        monkeypatch.delenv("SCHEDULE_CACHE_TTL_SECONDS")
+        reload_settings()
@@ -0,0 +1,134 @@
+import datetime
+from typing import Any
+
+import httpx
+import pytest
+from pydantic import BaseModel, HttpUrl, ValidationError
+
+from app.channel import TOKYO, Program
+from app.config import settings
+from app.day_channel import DayChannel, broadcast_today
+from app.utils.metrics import metrics
+
+
+class Item(BaseModel):
+    title: str
+    hour: int
+
+
+class ExampleChannel(DayChannel[Item]):
+    item_type = Item
+    source_name = "example"
+    published_days = 3
+
+    @property
+    def channel_name(self) -> str:
+        return "Example"
+
+    @property
+    def channel_url(self) -> HttpUrl:
+        return HttpUrl("https://example.com/")
+
+    def day_url(self, day: datetime.date) -> str:
+        return f"https://example.com/{day.isoformat()}.json"
+
+    def extract_items(self, response_json: Any) -> list[Any]:
+        return response_json["items"]
+
+    def to_program(self, item: Item, day: datetime.date) -> Program:
+        return Program(
+            title=item.title,
+            url=None,
+            description=None,
+            start=datetime.datetime.combine(
+                day, datetime.time(item.hour), tzinfo=TOKYO
+            ),
+        )
+
+
+def test_day_channel_days_start_today_in_tokyo():
+    days = ExampleChannel().days()
+
+    assert days[0] == broadcast_today()
+    assert days == [days[0] + datetime.timedelta(days=i) for i in range(3)]
+
+
+def test_day_channel_upstream_hosts_come_from_day_urls():
+    class ApiChannel(ExampleChannel):
+        def day_url(self, day: datetime.date) -> str:
+            return f"https://api.example.com/{day.isoformat()}.json"
+
+    assert ApiChannel().upstream_hosts == {"api.example.com"}
+    assert ExampleChannel().upstream_hosts == {"example.com"}
+
+
+def test_day_channel_parse_day_validates_items():
+    channel = ExampleChannel()
+    day = datetime.date(2025, 3, 20)
+
+    programs = channel.parse_day({"items": [{"title": "News", "hour": 7}]}, day)
+
+    assert [p.title for p in programs] == ["News"]
+    assert programs[0].start == datetime.datetime(2025, 3, 20, 7, tzinfo=TOKYO)
+    with pytest.raises(ValidationError):
+        channel.parse_day({"items": [{"title": "News"}]}, day)
+
+
+async def test_day_channel_fetches_days_in_order():
+    def handler(request: httpx.Request) -> httpx.Response:
+        day = request.url.path.strip("/").removesuffix(".json")
+        return httpx.Response(200, json={"items": [{"title": day, "hour": 5}]})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        channel = ExampleChannel()
+        schedule = await channel.fetch_schedule(client)
+
+    assert [p.title for p in schedule.programs] == [
+        day.isoformat() for day in channel.days()
+    ]
+    assert metrics.get("dtv_day_fetches_total", source="example", result="ok") >= 3
+
+
+async def test_day_channel_fetches_only_requested_days():
+    requested: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        return httpx.Response(200, json={"items": []})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        await ExampleChannel().fetch_schedule(client, days=1)
+
+    assert requested == [f"/{broadcast_today().isoformat()}.json"]
+
+
+async def test_day_channel_reuses_far_days(monkeypatch):
+    monkeypatch.setattr(settings, "schedule_warm_days", 1)
+    monkeypatch.setattr(settings, "schedule_far_day_max_age_seconds", 3600)
+    requested: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        return httpx.Response(200, json={"items": []})
+
+    channel = ExampleChannel()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        await channel.fetch_schedule(client)
+        requested.clear()
+        await channel.fetch_schedule(client)
+
+    assert requested == [f"/{broadcast_today().isoformat()}.json"]
+
+
+async def test_day_channel_clamps_window_to_published_days():
+    requested: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        return httpx.Response(200, json={"items": []})
+
+    channel = ExampleChannel()
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        await channel.fetch_schedule(client, days=100_000)
+
+    assert requested == [f"/{day.isoformat()}.json" for day in channel.days()]
@@ -0,0 +1,91 @@
+import json
+import xml.etree.ElementTree as ET
+
+from conftest import make_program, make_schedule
+from pydantic import HttpUrl
+
+from app.feeds import FORMATS, negotiate
+from app.main import render_feed_items
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+URL = HttpUrl("https://example.com/program")
+
+
+SCHEDULE = make_schedule(
+    make_program("ニュース", 10, "今日の, 出来事", URL),
+    make_program("ドラマ", 11, url=URL),
+    channel_name="テスト",
+)
+
+
+def render(name: str) -> bytes:
+    return render_feed_items(FORMATS[name], SCHEDULE, SCHEDULE.programs)
+
+
+def test_atom_feed_has_an_entry_per_program():
+    feed = ET.fromstring(render("atom"))
+
+    entries = feed.findall(f"{ATOM}entry")
+    assert feed.findtext(f"{ATOM}title") == "テスト"
+    assert [e.findtext(f"{ATOM}title") for e in entries] == ["ニュース", "ドラマ"]
+    assert entries[0].findtext(f"{ATOM}id") == SCHEDULE.programs[0].guid("テスト")
+    assert entries[0].findtext(f"{ATOM}summary") == SCHEDULE.programs[0].summary
+    assert feed.findtext(f"{ATOM}updated") == "2025-03-13T11:00:00+09:00"
+
+
+def test_json_feed_has_an_item_per_program():
+    feed = json.loads(render("json"))
+
+    assert feed["version"] == "https://jsonfeed.org/version/1.1"
+    assert [item["title"] for item in feed["items"]] == ["ニュース", "ドラマ"]
+    assert feed["items"][1] == {
+        "id": SCHEDULE.programs[1].guid("テスト"),
+        "url": "https://example.com/program",
+        "title": "ドラマ",
+        "content_text": "03/20 11:00",
+        "date_published": "2025-03-13T11:00:00+09:00",
+    }
+    assert json.loads(render_feed_items(FORMATS["json"], SCHEDULE, []))["items"] == []
+
+
+def test_ical_events_end_when_the_next_program_starts():
+    lines = render("ics").decode().split("\r\n")
+
+    assert lines[0] == "BEGIN:VCALENDAR"
+    assert lines[-2:] == ["END:VCALENDAR", ""]
+    assert lines.count("BEGIN:VEVENT") == lines.count("END:VEVENT") == 2
+    assert "DTSTART:20250320T010000Z" in lines
+    assert "DTEND:20250320T020000Z" in lines
+    assert len([line for line in lines if line.startswith("DTEND")]) == 1
+    assert "DESCRIPTION:今日の\\, 出来事" in lines
+    assert render_feed_items(FORMATS["ics"], SCHEDULE, []).count(b"VEVENT") == 0
+
+
+def test_ical_delta_events_end_when_the_next_scheduled_program_starts():
+    programs = [make_program(f"P{hour}", hour, url=URL) for hour in range(10, 15)]
+    schedule = make_schedule(*programs, channel_name="テスト")
+    changed = [schedule.programs[0], schedule.programs[4]]
+
+    lines = render_feed_items(FORMATS["ics"], schedule, changed).decode().split("\r\n")
+
+    assert [line for line in lines if line.startswith("DTEND")] == [
+        "DTEND:20250320T020000Z"
+    ]
+
+
+def test_ical_folds_long_lines_between_characters():
+    program = make_program("番組" * 40, 10, url=URL)
+    schedule = SCHEDULE.model_copy(update={"programs": [program]})
+    body = render_feed_items(FORMATS["ics"], schedule, schedule.programs)
+
+    assert all(len(line) <= 75 for line in body.split(b"\r\n"))
+    unfolded = body.decode().replace("\r\n ", "")
+    assert f"SUMMARY:{'番組' * 40}\r\n" in unfolded
+
+
+def test_negotiate_picks_the_preferred_format():
+    assert negotiate("").name == "rss"
+    assert negotiate("text/html,application/xml;q=0.9,*/*;q=0.8").name == "rss"
+    assert negotiate("application/atom+xml").name == "atom"
+    assert negotiate("text/calendar;q=0.5, application/feed+json").name == "json"
+    assert negotiate("application/rss+xml;q=0.4, text/calendar").name == "ics"
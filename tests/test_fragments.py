@@ -0,0 +1,50 @@
+from unittest.mock import MagicMock
+from xml.etree.ElementTree import tostring
+
+from conftest import make_program, make_schedule
+from pydantic import HttpUrl
+
+from app.feeds import FORMATS
+from app.fragments import FRAGMENT_OVERHEAD_BYTES, FragmentCache, rss_item
+from app.main import render_feed
+
+
+def test_fragment_cache_serializes_each_program_once():
+    cache = FragmentCache(max_bytes=None)
+    render = MagicMock(side_effect=rss_item)
+    programs = [make_program("A"), make_program("B")]
+
+    first = cache.join("rss", "Test", programs, render)
+    second = cache.join("rss", "Test", [make_program("A"), make_program("B")], render)
+
+    assert first == second
+    assert render.call_count == 2
+
+
+def test_fragment_cache_evicts_least_recently_used():
+    render = MagicMock(side_effect=rss_item)
+    # Room for two fragments, not three.
+    size = FRAGMENT_OVERHEAD_BYTES + len(rss_item(make_program("A"), "Test"))
+    cache = FragmentCache(max_bytes=2 * size + size // 2)
+
+    cache.get("rss", "Test", make_program("A"), render)
+    cache.get("rss", "Test", make_program("B"), render)
+    cache.get("rss", "Test", make_program("A"), render)
+    cache.get("rss", "Test", make_program("C"), render)
+    cache.get("rss", "Test", make_program("A"), render)
+    cache.get("rss", "Test", make_program("B"), render)
+
+    assert render.call_count == 4
+
+
+def test_render_rss_matches_full_serialization():
+    url = HttpUrl("https://example.com/program")
+    schedule = make_schedule(
+        make_program("A", description="番組 <説明> & more", url=url),
+        make_program("B", 1, url=url),
+        channel_name="テスト",
+    )
+
+    assert render_feed("test", schedule, FORMATS["rss"]) == tostring(
+        schedule.to_rss_channel().to_xml()
+    )
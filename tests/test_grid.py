@@ -0,0 +1,91 @@
+import datetime
+from unittest.mock import AsyncMock, patch
+
+from conftest import make_program, make_schedule
+from fastapi.testclient import TestClient
+
+from app.channel import TOKYO
+from app.grid import GridCache, build_grid
+from app.main import app, path_to_channel
+
+START = datetime.datetime(2025, 3, 20, 4, tzinfo=TOKYO)
+
+
+def test_build_grid_bins_programs_into_slots():
+    schedule = make_schedule(
+        make_program("Before", 3),
+        make_program("Morning", 4.5),
+        make_program("News", 6),
+        make_program("Late", 27),
+    )
+
+    grid = build_grid({"test": schedule}, START, 60, 1)
+    channel = grid["channels"]["test"]
+
+    assert grid["slots"] == 24
+    assert [p["title"] for p in channel["programs"]] == [
+        "Before",
+        "Morning",
+        "News",
+        "Late",
+    ]
+    assert [(p["slot"], p["span"]) for p in channel["programs"]] == [
+        (0, 1),
+        (0, 2),
+        (2, 21),
+        (23, 1),
+    ]
+    assert channel["slots"][:4] == [0, 1, 2, 2]
+    assert channel["slots"][-1] == 3
+    # The last program runs to the end of its broadcast day.
+    assert channel["programs"][-1]["end"] == "2025-03-21T04:00:00+09:00"
+
+
+def test_build_grid_leaves_slots_without_programs_empty():
+    schedule = make_schedule(make_program("Evening", 24))
+
+    channel = build_grid({"test": schedule}, START, 120, 2)["channels"]["test"]
+
+    assert channel["slots"] == [-1] * 10 + [0] * 2 + [-1] * 12
+    assert build_grid({"test": make_schedule()}, START, 120, 1)["channels"]["test"] == {
+        "name": "Test Channel",
+        "programs": [],
+        "slots": [-1] * 12,
+    }
+
+
+def test_grid_cache_rebuilds_only_when_a_schedule_changes():
+    cache = GridCache(max_entries=4)
+    schedule = make_schedule(make_program("News", 6))
+
+    with patch("app.grid.build_grid", wraps=build_grid) as build:
+        first = cache.get({"test": schedule}, START, 30, 1)
+        second = cache.get(
+            {"test": make_schedule(make_program("News", 6))}, START, 30, 1
+        )
+        cache.get({"test": make_schedule(make_program("Drama", 6))}, START, 30, 1)
+        cache.get({"test": schedule}, START, 60, 1)
+
+    assert first == second
+    assert build.call_count == 3
+
+
+def test_grid_endpoint_covers_cached_schedules():
+    path = "joak-dtv"
+    with (
+        patch.object(
+            path_to_channel[path],
+            "fetch_schedule",
+            new=AsyncMock(return_value=make_schedule(make_program("News", 6))),
+        ),
+        TestClient(app) as client,
+    ):
+        empty = client.get("/grid")
+        client.get(f"/{path}")
+        response = client.get("/grid", params={"slot_minutes": 60, "days": 1})
+        invalid = client.get("/grid", params={"slot_minutes": 1})
+
+    assert empty.json()["channels"] == {}
+    assert list(response.json()["channels"]) == [path]
+    assert response.json()["slots"] == 24
+    assert invalid.status_code == 422
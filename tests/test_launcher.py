@@ -0,0 +1,117 @@
+import contextlib
+import itertools
+import os
+import signal
+import time
+from collections.abc import Callable
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from conftest import make_schedule
+
+from app.feeds import FORMATS
+from app.launcher import (
+    STARTUP_FAILURE,
+    _parse_args,
+    _serve_worker,
+    _supervise,
+    restart_delay,
+    warm_up,
+)
+from app.main import path_to_channel
+from app.schedule_cache import schedule_cache
+from app.utils.http_cache import CachingTransport
+
+
+async def test_warm_up_fetches_and_renders_every_feed():
+    schedule = make_schedule()
+    failing, *others = path_to_channel
+    fetches: list[AsyncMock] = []
+    with contextlib.ExitStack() as stack:
+        for path in path_to_channel:
+            fetch = (
+                AsyncMock(side_effect=RuntimeError("upstream down"))
+                if path == failing
+                else AsyncMock(return_value=schedule)
+            )
+            fetches.append(fetch)
+            stack.enter_context(
+                patch.object(path_to_channel[path], "fetch_schedule", new=fetch)
+            )
+        warmed = await warm_up()
+
+    assert warmed == others
+    assert schedule_cache.peek(failing) is None
+    for path in others:
+        entry = schedule_cache.peek(path)
+        assert entry is not None
+        assert set(entry.rendered) == set(FORMATS)
+    # Fetched like the workers fetch, through the response cache.
+    client = fetches[0].call_args.args[0]
+    assert isinstance(client._transport, CachingTransport)
+
+
+def test_parse_args_follows_uvicorn_environment(monkeypatch):
+    monkeypatch.setenv("UVICORN_ROOT_PATH", "/dtv-rss")
+    monkeypatch.setenv("UVICORN_PROXY_HEADERS", "false")
+
+    args = _parse_args(["--workers", "3", "--port", "80"])
+
+    assert args.workers == 3
+    assert args.port == 80
+    assert args.root_path == "/dtv-rss"
+    assert not args.proxy_headers
+
+
+def test_restart_delay_backs_off_on_repeated_crashes():
+    assert restart_delay(0) == 0
+    assert [restart_delay(n) for n in range(1, 5)] == [1, 2, 4, 8]
+    assert restart_delay(100) == 60
+
+
+def test_supervise_backs_off_restarts_and_forwards_signals(monkeypatch):
+    handlers: dict[int, Callable[[int, object], None]] = {}
+    pids = itertools.count(1)
+    kills: list[tuple[int, int]] = []
+    sleeps: list[float] = []
+
+    def wait() -> tuple[int, int]:
+        # Workers crash at once; before the second one does, settings are
+        # reloaded, and before the third one does, the launcher is stopped.
+        pid = waits.pop(0)
+        if pid == 2:
+            handlers[signal.SIGHUP](signal.SIGHUP, None)
+        elif pid == 3:
+            handlers[signal.SIGTERM](signal.SIGTERM, None)
+        return pid, 1 << 8
+
+    waits = [1, 2, 3]
+    monkeypatch.setattr(signal, "signal", handlers.__setitem__)
+    monkeypatch.setattr(os, "wait", wait)
+    monkeypatch.setattr(os, "kill", lambda pid, signum: kills.append((pid, signum)))
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    with (
+        patch("app.launcher._spawn", side_effect=lambda config, sock: next(pids)),
+        patch("app.launcher.reload_settings") as reload_settings,
+    ):
+        _supervise(None, None, workers=1)  # type: ignore[arg-type]
+
+    assert sleeps == [1, 2]
+    reload_settings.assert_called_once()
+    assert kills == [(2, signal.SIGHUP), (3, signal.SIGTERM)]
+
+
+@pytest.mark.parametrize(
+    ("run", "started", "status"),
+    [
+        (None, True, 0),
+        (None, False, STARTUP_FAILURE),
+        (SystemExit(2), False, 2),
+        (RuntimeError("boom"), True, 1),
+    ],
+)
+def test_serve_worker_returns_the_worker_exit_status(run, started, status):
+    server = MagicMock(started=started)
+    server.run.side_effect = run
+    with patch("app.launcher.uvicorn.Server", return_value=server):
+        assert _serve_worker(None, None) == status  # type: ignore[arg-type]
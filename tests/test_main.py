@@ -1,12 +1,22 @@
+import asyncio
+import gc
+import weakref
 import xml.etree.ElementTree as ET
 from unittest.mock import AsyncMock, patch
 
 import pytest
+from conftest import make_program, make_schedule
 from fastapi.testclient import TestClient
-from pydantic import HttpUrl
+from starlette.requests import ClientDisconnect
 
-from app.channel import Schedule
-from app.main import app, path_to_channel
+from app import main
+from app.channels import ChannelRegistry
+from app.config import settings
+from app.main import AdmittedStreamingResponse, app, path_to_channel
+from app.schedule_cache import schedule_cache
+from app.utils.admission import admission
+from app.utils.http import user_facing
+from app.utils.metrics import metrics
 
 
 def test_get_schedule_rss_returns_404_for_unknown_path():
@@ -26,6 +36,18 @@ def test_get_top_page_returns_html():
             assert f">{channel.channel_name}</a>" in response.text
 
 
+def test_get_top_page_builds_no_channels(monkeypatch):
+    registry = ChannelRegistry(path_to_channel._factories)
+    monkeypatch.setattr(main, "path_to_channel", registry)
+    monkeypatch.setattr(settings, "channel_warmup_enabled", False)
+
+    with TestClient(app) as client:
+        response = client.get("/")
+
+    assert response.status_code == 200
+    assert registry.loaded() == []
+
+
 def test_get_top_page_with_root_path_returns_html():
     with TestClient(app, root_path="/dtv-rss") as client:
         response = client.get("/")
@@ -41,13 +63,7 @@ def test_get_schedule_rss_returns_xml(path: str):
         patch.object(
             channel_instance,
             "fetch_schedule",
-            new=AsyncMock(
-                return_value=Schedule(
-                    channel_name="Test Channel",
-                    channel_url=HttpUrl("http://example.com"),
-                    programs=[],
-                )
-            ),
+            new=AsyncMock(return_value=make_schedule()),
         ),
         TestClient(app) as client,
     ):
@@ -80,3 +96,334 @@ def test_get_schedule_rss_logs_error_on_exception(path: str, caplog):
         and r.levelname == "ERROR"
         for r in caplog.records
     )
+
+
+def test_get_metrics_returns_prometheus_text():
+    metrics.inc("dtv_test_total")
+    with TestClient(app) as client:
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "dtv_test_total 1" in response.text
+
+
+def test_get_schedule_rss_returns_304_for_matching_etag():
+    path = "joak-dtv"
+    schedule = make_schedule()
+    with (
+        patch.object(
+            path_to_channel[path],
+            "fetch_schedule",
+            new=AsyncMock(return_value=schedule),
+        ),
+        TestClient(app) as client,
+    ):
+        response = client.get(f"/{path}")
+        etag = response.headers["ETag"]
+        not_modified = client.get(f"/{path}", headers={"If-None-Match": etag})
+
+    assert etag == f'"{schedule.version}"'
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+
+def make_slow_fetch(delay: float):
+    async def fetch_schedule(client, days=None):
+        await asyncio.sleep(delay)
+        return make_schedule(channel_name="Fresh Channel")
+
+    return fetch_schedule
+
+
+def test_get_schedule_rss_serves_stale_schedule_after_deadline(monkeypatch):
+    path = "joak-dtv"
+    stale = make_schedule(channel_name="Stale Channel")
+    monkeypatch.setattr(settings, "request_deadline_seconds", 0.05)
+    monkeypatch.setattr(settings, "schedule_cache_ttl_seconds", 0.0)
+
+    with TestClient(app) as client:
+        with patch.object(
+            path_to_channel[path], "fetch_schedule", new=AsyncMock(return_value=stale)
+        ):
+            client.get(f"/{path}")
+        with patch.object(
+            path_to_channel[path], "fetch_schedule", new=make_slow_fetch(1)
+        ):
+            response = client.get(f"/{path}")
+
+    assert response.status_code == 200
+    assert "Stale Channel" in response.text
+
+
+def test_shared_refresh_outlives_the_request_deadline(monkeypatch):
+    path = "joak-dtv"
+    monkeypatch.setattr(settings, "request_deadline_seconds", 0.05)
+    seen = []
+
+    async def fetch_schedule(client, days=None):
+        await asyncio.sleep(0.1)
+        seen.append(user_facing.get())
+        return await make_slow_fetch(0)(client)
+
+    with (
+        patch.object(path_to_channel[path], "fetch_schedule", new=fetch_schedule),
+        TestClient(app) as client,
+    ):
+        response = client.get(f"/{path}")
+        client.portal.call(asyncio.sleep, 0.2)
+
+    assert response.status_code == 504
+    # The refresh finished after the response, at the user's priority.
+    assert seen == [True]
+    assert schedule_cache.peek(path) is not None
+
+
+def test_get_schedule_rss_returns_504_after_deadline_without_cache(monkeypatch):
+    path = "joak-dtv"
+    monkeypatch.setattr(settings, "request_deadline_seconds", 0.05)
+
+    with (
+        patch.object(path_to_channel[path], "fetch_schedule", new=make_slow_fetch(1)),
+        TestClient(app) as client,
+    ):
+        response = client.get(f"/{path}")
+
+    assert response.status_code == 504
+
+
+def test_get_schedule_rss_streams_segments_on_cold_cache(monkeypatch):
+    path = "joak-dtv"
+    monkeypatch.setattr(settings, "rss_streaming_enabled", True)
+
+    async def iter_schedule_segments(client, days=None):
+        yield [make_program("Day 1")]
+        yield [make_program("Day 2")]
+
+    with (
+        patch.object(
+            path_to_channel[path], "iter_schedule_segments", new=iter_schedule_segments
+        ),
+        TestClient(app) as client,
+    ):
+        response = client.get(f"/{path}")
+
+    assert response.status_code == 200
+    titles = [e.text for e in ET.fromstring(response.text).iter("title")]
+    assert titles[1:] == ["Day 1", "Day 2"]
+    entry = schedule_cache.peek(path)
+    assert entry is not None
+    assert [p.title for p in entry.schedule.programs] == ["Day 1", "Day 2"]
+
+
+def test_get_schedule_rss_stream_is_truncated_at_deadline(monkeypatch):
+    path = "joak-dtv"
+    monkeypatch.setattr(settings, "rss_streaming_enabled", True)
+    monkeypatch.setattr(settings, "request_deadline_seconds", 0.1)
+
+    async def iter_schedule_segments(client, days=None):
+        yield [make_program("Day 1")]
+        await asyncio.sleep(1)
+        yield [make_program("Day 2")]
+
+    with (
+        patch.object(
+            path_to_channel[path], "iter_schedule_segments", new=iter_schedule_segments
+        ),
+        TestClient(app) as client,
+    ):
+        response = client.get(f"/{path}")
+
+    assert response.status_code == 200
+    titles = [e.text for e in ET.fromstring(response.text).iter("title")]
+    assert titles[1:] == ["Day 1"]
+    assert response.text.endswith("<!-- truncated at the deadline --></channel></rss>")
+    assert metrics.get("dtv_rss_stream_truncated_total", reason="deadline") >= 1
+
+
+def test_schedule_cache_is_shared_across_http_clients():
+    path = "joak-dtv"
+    fetches = 0
+
+    async def fetch_schedule(client, days=None):
+        nonlocal fetches
+        fetches += 1
+        return make_schedule(make_program("Test Program"))
+
+    with patch.object(path_to_channel[path], "fetch_schedule", new=fetch_schedule):
+        with TestClient(app) as client:
+            client.get(f"/{path}")
+            first_http_client = weakref.ref(app.state.http_client)
+        with TestClient(app) as client:
+            response = client.get(f"/{path}")
+
+    assert response.status_code == 200
+    assert fetches == 1
+    # The cache must not keep a closed client (and its pools) alive.
+    gc.collect()
+    assert first_http_client() is None
+
+
+def test_get_schedule_rss_serves_window_of_days(monkeypatch):
+    path = "joak-dtv"
+    monkeypatch.setattr(settings, "schedule_horizon_days", 7)
+    fetch = AsyncMock(return_value=make_schedule())
+    with (
+        patch.object(path_to_channel[path], "fetch_schedule", new=fetch),
+        TestClient(app) as client,
+    ):
+        window = client.get(f"/{path}?days=2")
+        full = client.get(f"/{path}?days=30")
+        invalid = client.get(f"/{path}?days=0")
+        too_long = client.get(f"/{path}?days=100000")
+
+    assert window.status_code == 200
+    assert full.status_code == 200
+    assert invalid.status_code == 422
+    assert too_long.status_code == 422
+    assert [call.args[1] for call in fetch.await_args_list] == [2, 7]
+    assert schedule_cache.peek(f"{path}?days=2") is not None
+    assert schedule_cache.peek(path) is not None
+
+
+def test_get_schedule_rss_serves_full_feed_for_window_past_published_days():
+    path = "joak-dtv"
+    fetch = AsyncMock(return_value=make_schedule())
+    with (
+        patch.object(path_to_channel[path], "fetch_schedule", new=fetch),
+        TestClient(app) as client,
+    ):
+        response = client.get(f"/{path}?days=10")
+
+    assert response.status_code == 200
+    assert [call.args[1] for call in fetch.await_args_list] == [None]
+    assert schedule_cache.peek(f"{path}?days=10") is None
+
+
+def test_get_schedule_rss_returns_delta_since_version():
+    path = "joak-dtv"
+    first = make_schedule(make_program("Kept"))
+    second = first.model_copy(
+        update={"programs": [make_program("Kept"), make_program("Added")]}
+    )
+    fetch = AsyncMock(side_effect=[first, second])
+    with (
+        patch.object(path_to_channel[path], "fetch_schedule", new=fetch),
+        TestClient(app) as client,
+    ):
+        version = client.get(f"/{path}").headers["X-Schedule-Version"]
+        schedule_cache.invalidate(path)
+        delta = client.get(f"/{path}?since={version}")
+        current = client.get(f"/{path}?since={delta.headers['X-Schedule-Version']}")
+        unknown = client.get(f"/{path}?since=unknown")
+
+    assert delta.headers["X-Feed-Delta"] == "delta"
+    titles = [e.text for e in ET.fromstring(delta.text).iter("title")]
+    assert titles == ["Test Channel", "Added"]
+    assert current.status_code == 304
+    assert unknown.headers["X-Feed-Delta"] == "full"
+    assert len(ET.fromstring(unknown.text).findall("channel/item")) == 2
+
+
+def test_get_schedule_rss_renders_formats_by_suffix_or_accept():
+    path = "joak-dtv"
+    schedule = make_schedule(make_program("News"))
+    with (
+        patch.object(
+            path_to_channel[path],
+            "fetch_schedule",
+            new=AsyncMock(return_value=schedule),
+        ),
+        TestClient(app) as client,
+    ):
+        rss = client.get(f"/{path}")
+        ics = client.get(f"/{path}.ics")
+        atom = client.get(f"/{path}", headers={"Accept": "application/atom+xml"})
+        not_modified = client.get(
+            f"/{path}.ics", headers={"If-None-Match": ics.headers["ETag"]}
+        )
+        unknown = client.get(f"/{path}.pdf")
+
+    assert rss.headers["content-type"] == "application/xml"
+    assert ics.headers["content-type"].startswith("text/calendar")
+    assert "SUMMARY:News" in ics.text
+    assert ics.headers["ETag"] == f'"{schedule.version}.ics"'
+    assert atom.headers["content-type"] == "application/atom+xml"
+    assert atom.headers["Vary"] == "Accept"
+    assert ET.fromstring(atom.text).tag == "{http://www.w3.org/2005/Atom}feed"
+    assert not_modified.status_code == 304
+    assert unknown.status_code == 404
+
+
+def test_get_schedule_rss_sets_cache_control_from_remaining_ttl(monkeypatch):
+    path = "joak-dtv"
+    monkeypatch.setattr(settings, "schedule_cache_ttl_seconds", 600)
+    monkeypatch.setattr(settings, "schedule_cache_ttl_jitter_ratio", 0.0)
+    schedule = make_schedule()
+    with (
+        patch.object(
+            path_to_channel[path],
+            "fetch_schedule",
+            new=AsyncMock(return_value=schedule),
+        ),
+        TestClient(app) as client,
+    ):
+        fresh = client.get(f"/{path}")
+        entry = schedule_cache.peek(path)
+        assert entry is not None
+        entry.fetched_at -= 500
+        aged = client.get(f"/{path}")
+        index = client.get("/")
+
+    assert fresh.headers["Cache-Control"].startswith("public, max-age=")
+    assert 599 <= int(fresh.headers["Cache-Control"].split("=")[1].split(",")[0])
+    assert "stale-while-revalidate=" in fresh.headers["Cache-Control"]
+    assert "stale-if-error=" in fresh.headers["Cache-Control"]
+    assert aged.headers["Cache-Control"].startswith("public, max-age=99,")
+    assert index.headers["Cache-Control"].startswith("public, max-age=600,")
+
+
+def test_get_schedule_rss_sheds_cache_misses_over_the_limit(monkeypatch):
+    path = "joak-dtv"
+    monkeypatch.setattr(settings, "inbound_client_rate_per_second", 0.01)
+    monkeypatch.setattr(settings, "inbound_client_burst", 1.0)
+    schedule = make_schedule(make_program("Cached"))
+    fetch = AsyncMock(return_value=schedule)
+    with (
+        patch.object(path_to_channel[path], "fetch_schedule", new=fetch),
+        TestClient(app) as client,
+    ):
+        first = client.get(f"/{path}")
+        hit = client.get(f"/{path}")
+        entry = schedule_cache.peek(path)
+        assert entry is not None
+        entry.fetched_at -= 10**6
+        stale = client.get(f"/{path}")
+        rejected = client.get("/joab-dtv")
+
+    assert first.status_code == hit.status_code == stale.status_code == 200
+    assert fetch.await_count == 1
+    assert "Cached" in stale.text
+    assert stale.headers["Cache-Control"].startswith("public, max-age=0,")
+    assert rejected.status_code == 503
+    assert int(rejected.headers["Retry-After"]) >= 1
+
+
+async def test_admitted_stream_is_released_when_the_client_leaves_first():
+    async def body():
+        yield b"never sent"
+
+    async def send(message):
+        raise OSError("client disconnected")
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    assert admission.try_admit(None) is None
+    response = AdmittedStreamingResponse(body())
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+
+    with pytest.raises(ClientDisconnect):
+        await response(scope, receive, send)
+
+    assert admission.in_flight == 0
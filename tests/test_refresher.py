@@ -0,0 +1,81 @@
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+from conftest import make_schedule
+
+from app.channel import Channel
+from app.config import settings
+from app.refresher import ScheduleRefresher, refresh_interval
+from app.schedule_cache import ChannelStats, ScheduleCache
+
+
+@pytest.fixture(autouse=True)
+def refresh_bounds(monkeypatch):
+    monkeypatch.setattr(settings, "refresh_min_interval_seconds", 60.0)
+    monkeypatch.setattr(settings, "refresh_max_interval_seconds", 3600.0)
+
+
+def make_channel() -> Channel:
+    channel = MagicMock(spec=Channel)
+    channel.fetch_schedule = AsyncMock(return_value=make_schedule())
+    return channel
+
+
+def test_refresh_interval_is_shorter_for_hot_channels():
+    now = time.monotonic()
+    cold = ChannelStats()
+    hot = ChannelStats()
+    for _ in range(600):
+        hot.requests.add(now)
+
+    assert refresh_interval(hot, now) < refresh_interval(cold, now)
+
+
+def test_refresh_interval_is_shorter_for_changing_channels():
+    now = time.monotonic()
+    static = ChannelStats(change_rate=0.0)
+    changing = ChannelStats(change_rate=1.0)
+
+    assert refresh_interval(changing, now) < refresh_interval(static, now)
+
+
+def test_refresh_interval_stays_within_bounds():
+    now = time.monotonic()
+    hot = ChannelStats(change_rate=1.0)
+    for _ in range(100_000):
+        hot.requests.add(now)
+
+    assert refresh_interval(hot, now) == 60.0
+    assert refresh_interval(ChannelStats(change_rate=0.0), now) == 3600.0
+
+
+def test_channel_stats_tracks_change_rate():
+    stats = ChannelStats()
+    for _ in range(20):
+        stats.record_refresh(changed=False)
+
+    assert stats.change_rate < 0.01
+
+
+async def test_refresher_refreshes_only_requested_due_channels():
+    cache = ScheduleCache()
+    channels = {"requested": make_channel(), "idle": make_channel()}
+    client = AsyncMock(spec=httpx.AsyncClient)
+    for key, channel in channels.items():
+        await cache.get(key, channel, client)
+    cache.record_request("requested")
+    refresher = ScheduleRefresher(cache, channels, client)
+
+    assert refresher.due(time.monotonic()) == []
+    assert refresher.due(time.monotonic() + 3600) == ["requested"]
+
+    for entry in (cache.peek("requested"), cache.peek("idle")):
+        assert entry is not None
+        entry.fetched_at -= 3600
+    refreshed = await refresher.run_once()
+
+    assert refreshed == ["requested"]
+    assert channels["requested"].fetch_schedule.await_count == 2
+    assert channels["idle"].fetch_schedule.await_count == 1
@@ -0,0 +1,273 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+from conftest import make_program, make_schedule
+
+from app.channel import Channel, Program
+from app.config import reload_settings, settings
+from app.schedule_cache import (
+    PROGRAM_OVERHEAD_BYTES,
+    CacheEntry,
+    ChannelStats,
+    ScheduleCache,
+    estimate_schedule_bytes,
+    feed_key,
+    horizon_days,
+    ttl_jitter,
+    ttl_seconds,
+)
+
+
+def make_channel(fetch_schedule) -> Channel:
+    channel = MagicMock(spec=Channel)
+    channel.fetch_schedule = fetch_schedule
+    return channel
+
+
+async def test_schedule_cache_returns_fresh_entry_without_fetching():
+    cache = ScheduleCache()
+    channel = make_channel(AsyncMock(return_value=make_schedule()))
+    client = AsyncMock(spec=httpx.AsyncClient)
+
+    first = await cache.get("test", channel, client)
+    second = await cache.get("test", channel, client)
+
+    assert second is first
+    channel.fetch_schedule.assert_awaited_once()
+
+
+async def test_schedule_cache_shares_concurrent_refreshes():
+    cache = ScheduleCache()
+
+    async def fetch_schedule(client, days=None):
+        await asyncio.sleep(0.01)
+        return make_schedule()
+
+    fetch = AsyncMock(side_effect=fetch_schedule)
+    channel = make_channel(fetch)
+    client = AsyncMock(spec=httpx.AsyncClient)
+
+    results = await asyncio.gather(
+        *(cache.get("test", channel, client) for _ in range(5))
+    )
+
+    assert all(result is results[0] for result in results)
+    fetch.assert_awaited_once()
+
+
+async def test_schedule_cache_keeps_entry_when_caller_gives_up():
+    cache = ScheduleCache()
+
+    async def fetch_schedule(client, days=None):
+        await asyncio.sleep(0.02)
+        return make_schedule()
+
+    channel = make_channel(fetch_schedule)
+    client = AsyncMock(spec=httpx.AsyncClient)
+
+    try:
+        async with asyncio.timeout(0.001):
+            await cache.get("test", channel, client)
+    except TimeoutError:
+        pass
+    assert cache.peek("test") is None
+
+    await asyncio.sleep(0.05)
+
+    assert cache.peek("test") is not None
+
+
+def test_ttl_seconds_prefers_path_over_class_overrides(monkeypatch):
+    channel = make_channel(AsyncMock())
+    monkeypatch.setattr(settings, "schedule_cache_ttl_seconds", 3600)
+    monkeypatch.setattr(settings, "schedule_cache_ttl_overrides", {})
+    assert ttl_seconds("test", channel) == 3600
+
+    monkeypatch.setattr(
+        settings, "schedule_cache_ttl_overrides", {type(channel).__name__: 600}
+    )
+    assert ttl_seconds("test", channel) == 600
+
+    monkeypatch.setattr(
+        settings,
+        "schedule_cache_ttl_overrides",
+        {type(channel).__name__: 600, "test": 60},
+    )
+    assert ttl_seconds("test", channel) == 60
+    assert ttl_seconds("other", channel) == 600
+
+
+def test_ttl_jitter_stays_within_ratio(monkeypatch):
+    monkeypatch.setattr(settings, "schedule_cache_ttl_jitter_ratio", 0.1)
+    jitters = [ttl_jitter() for _ in range(1000)]
+
+    assert all(0.9 <= jitter <= 1.1 for jitter in jitters)
+    assert len(set(jitters)) > 1
+
+
+def test_cache_entry_expiry_follows_reloaded_settings(monkeypatch):
+    channel = make_channel(AsyncMock())
+    entry = CacheEntry(
+        key="test", channel=channel, schedule=make_schedule(), fetched_at=0.0
+    )
+
+    monkeypatch.setenv("SCHEDULE_CACHE_TTL_OVERRIDES", '{"test": 60}')
+    reload_settings()
+    try:
+        assert entry.is_fresh(59.0)
+        assert not entry.is_fresh(61.0)
+    finally:
+        monkeypatch.delenv("SCHEDULE_CACHE_TTL_OVERRIDES")
+        reload_settings()
+
+    assert settings.schedule_cache_ttl_overrides == {}
+    assert entry.is_fresh(61.0)
+
+
+def test_cache_entry_cache_control_counts_down_its_ttl(monkeypatch):
+    monkeypatch.setattr(settings, "schedule_cache_ttl_seconds", 600)
+    monkeypatch.setattr(settings, "cache_control_stale_while_revalidate_seconds", 30)
+    monkeypatch.setattr(settings, "cache_control_stale_if_error_seconds", 3600)
+    entry = CacheEntry(
+        key="test",
+        channel=make_channel(AsyncMock()),
+        schedule=make_schedule(),
+        fetched_at=100.0,
+    )
+
+    assert entry.cache_control(100.0) == (
+        "public, max-age=600, stale-while-revalidate=30, stale-if-error=3600"
+    )
+    assert entry.cache_control(550.5).startswith("public, max-age=149,")
+    assert entry.cache_control(800.0).startswith("public, max-age=0,")
+
+
+def numbered_programs(count: int) -> list[Program]:
+    return [make_program(f"番組 {i}", description="説明" * 50) for i in range(count)]
+
+
+def test_estimate_schedule_bytes_grows_with_programs():
+    small = estimate_schedule_bytes(make_schedule(*numbered_programs(1)))
+    large = estimate_schedule_bytes(make_schedule(*numbered_programs(10)))
+
+    assert small > PROGRAM_OVERHEAD_BYTES
+    assert large > 9 * small
+
+
+async def test_schedule_cache_evicts_least_recently_used(monkeypatch):
+    cache = ScheduleCache()
+    client = AsyncMock(spec=httpx.AsyncClient)
+    schedule = make_schedule(*numbered_programs(10))
+    size = estimate_schedule_bytes(schedule)
+    monkeypatch.setattr(settings, "schedule_cache_max_bytes", 2 * size)
+    channel = make_channel(AsyncMock(return_value=schedule))
+
+    await cache.get("a", channel, client)
+    await cache.get("b", channel, client)
+    await cache.get("a", channel, client)
+    await cache.get("c", channel, client)
+
+    assert cache.peek("a") is not None
+    assert cache.peek("b") is None
+    assert cache.peek("c") is not None
+    assert cache.memory_bytes() == 2 * size
+
+
+async def test_schedule_cache_counts_rendered_bytes(monkeypatch):
+    cache = ScheduleCache()
+    client = AsyncMock(spec=httpx.AsyncClient)
+    schedule = make_schedule(*numbered_programs(10))
+    size = estimate_schedule_bytes(schedule)
+    monkeypatch.setattr(settings, "schedule_cache_max_bytes", 2 * size + 100)
+    channel = make_channel(AsyncMock(return_value=schedule))
+    render = MagicMock(return_value=b"x" * 200)
+
+    await cache.get("a", channel, client)
+    await cache.get("b", channel, client)
+    first = cache.render("b", schedule, "rss", render)
+    second = cache.render("b", schedule, "rss", render)
+
+    assert first is second
+    render.assert_called_once()
+    assert cache.peek("a") is None
+    assert cache.peek("b") is not None
+    assert cache.memory_bytes() == size + 200
+
+
+def test_horizon_days_applies_overrides_to_windows(monkeypatch):
+    channel = make_channel(AsyncMock())
+    monkeypatch.setattr(settings, "schedule_horizon_days", 7)
+    monkeypatch.setattr(settings, "schedule_horizon_overrides", {"test": 3})
+
+    assert horizon_days("test", channel) == 3
+    assert horizon_days(feed_key("test", 2), channel) == 3
+    assert horizon_days("other", channel) == 7
+
+
+async def test_schedule_cache_fetches_horizon_by_default(monkeypatch):
+    cache = ScheduleCache()
+    channel = make_channel(AsyncMock(return_value=make_schedule()))
+    client = AsyncMock(spec=httpx.AsyncClient)
+    monkeypatch.setattr(settings, "schedule_horizon_days", 5)
+
+    await cache.get("test", channel, client)
+    await cache.get(feed_key("test", 2), channel, client, 2)
+
+    assert [call.args[1] for call in channel.fetch_schedule.await_args_list] == [5, 2]
+
+
+async def test_schedule_cache_fetches_full_schedule_without_horizon():
+    cache = ScheduleCache()
+    channel = make_channel(AsyncMock(return_value=make_schedule()))
+    client = AsyncMock(spec=httpx.AsyncClient)
+
+    await cache.get("test", channel, client)
+
+    assert channel.fetch_schedule.await_args.args[1] is None
+
+
+async def test_schedule_cache_isolates_failing_listeners(caplog):
+    cache = ScheduleCache()
+    channel = make_channel(AsyncMock(return_value=make_schedule()))
+    client = AsyncMock(spec=httpx.AsyncClient)
+    failing = MagicMock(side_effect=RuntimeError("archive down"))
+    listener = MagicMock()
+    cache.add_listener(failing)
+    cache.add_listener(listener)
+
+    schedule = await cache.get("test", channel, client)
+
+    listener.assert_called_once_with("test", channel, schedule)
+    assert cache.peek("test") is not None
+    assert "archive down" in caplog.text
+
+
+async def test_schedule_cache_invalidates_windows_with_their_feed():
+    cache = ScheduleCache()
+    channel = make_channel(AsyncMock(return_value=make_schedule()))
+    client = AsyncMock(spec=httpx.AsyncClient)
+    await cache.get("test", channel, client)
+    await cache.get(feed_key("test", 2), channel, client, 2)
+    await cache.get(feed_key("other", 2), channel, client, 2)
+
+    assert cache.windows("test") == {"test?days=2": 2}
+    cache.invalidate("test")
+
+    assert cache.peek("test") is None
+    assert cache.windows("test") == {}
+    assert cache.windows("other") == {"other?days=2": 2}
+
+
+def test_channel_stats_tracks_programs_changed_since_version():
+    stats = ChannelStats()
+    old = make_schedule(*numbered_programs(2))
+    new = old.model_copy(
+        update={"programs": [*old.programs[1:], *numbered_programs(3)[2:]]}
+    )
+    stats.record_version(old)
+    stats.record_version(new)
+
+    assert stats.changed_since(old.version, new) == new.programs[1:]
+    assert stats.changed_since(new.version, new) == []
+    assert stats.changed_since("unknown", new) is None
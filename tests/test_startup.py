@@ -0,0 +1,33 @@
+from app.utils.import_time import (
+    imported_modules,
+    measure,
+    module_seconds,
+    total_seconds,
+)
+
+# Importing the app, with every module it needs before the first request, may
+# take this many times as long as importing FastAPI, which it cannot start
+# without. Both are measured in the same fresh interpreter, so a slow machine
+# slows both alike; what matters is catching imports that multiply it.
+STARTUP_BUDGET_RATIO = 3.0
+
+
+def test_app_import_leaves_channel_modules_for_first_use():
+    modules = imported_modules("app.main")
+
+    assert "app.main" in modules
+    assert not modules & {
+        "bs4",
+        "numpy",
+        "app.channels.nhk",
+        "app.channels.tbs",
+        "app.channels.tv_asahi",
+        "app.day_channel",
+    }
+
+
+def test_app_import_stays_within_startup_budget():
+    times = measure("app.main")
+
+    budget = STARTUP_BUDGET_RATIO * module_seconds(times, "fastapi")
+    assert total_seconds(times, "app.main") < budget
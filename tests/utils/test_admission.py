@@ -0,0 +1,36 @@
+from app.config import settings
+from app.utils.admission import IN_FLIGHT_RETRY_AFTER, AdmissionControl, TokenBucket
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=2.0, burst=2.0, now=0.0)
+
+    assert bucket.try_take(0.0) is None
+    assert bucket.try_take(0.0) is None
+    assert bucket.try_take(0.0) == 0.5
+    assert bucket.try_take(0.5) is None
+    assert bucket.try_take(10.0) is None
+    assert bucket.tokens == 1.0
+
+
+def test_admission_limits_each_client(monkeypatch):
+    monkeypatch.setattr(settings, "inbound_client_rate_per_second", 0.1)
+    monkeypatch.setattr(settings, "inbound_client_burst", 2.0)
+    admission = AdmissionControl()
+
+    assert admission.try_admit("a") is None
+    assert admission.try_admit("a") is None
+    retry_after = admission.try_admit("a")
+    assert retry_after is not None and 9.0 < retry_after <= 10.0
+    assert admission.try_admit("b") is None
+    assert admission.in_flight == 3
+
+
+def test_admission_limits_requests_in_flight(monkeypatch):
+    monkeypatch.setattr(settings, "inbound_max_cold_in_flight", 1)
+    admission = AdmissionControl()
+
+    assert admission.try_admit("a") is None
+    assert admission.try_admit("b") == IN_FLIGHT_RETRY_AFTER
+    admission.release()
+    assert admission.try_admit("b") is None
@@ -0,0 +1,214 @@
+import asyncio
+
+import httpcore
+import httpx
+import pytest
+
+from app.config import settings
+from app.utils import connections
+from app.utils.connections import (
+    ConnectionStats,
+    DnsCache,
+    ResolvingBackend,
+    UpstreamTransport,
+    interleave_families,
+    network_transport,
+    prewarm,
+)
+from app.utils.metrics import metrics
+
+
+class FakeBackend(httpcore.AsyncNetworkBackend):
+    def __init__(self, unreachable: set[str], blackholed: frozenset[str] = frozenset()):
+        self.unreachable = unreachable
+        self.blackholed = blackholed
+        self.connected: list[str] = []
+        self.timeouts: list[float | None] = []
+
+    async def connect_tcp(
+        self, host, port, timeout=None, local_address=None, socket_options=None
+    ):
+        self.timeouts.append(timeout)
+        if host in self.blackholed:
+            await asyncio.sleep(60 if timeout is None else timeout)
+            raise httpcore.ConnectTimeout(host)
+        if host in self.unreachable:
+            raise httpcore.ConnectError(host)
+        self.connected.append(host)
+        return httpcore.AsyncNetworkStream()
+
+    async def sleep(self, seconds):
+        pass
+
+
+def test_dns_cache_reuses_addresses_for_its_ttl(monkeypatch):
+    monkeypatch.setattr(settings, "upstream_dns_cache_ttl_seconds", 60.0)
+    cache = DnsCache()
+
+    async def main():
+        await cache.resolve("localhost", 443)
+        hits = metrics.get("dtv_upstream_dns_lookups_total", result="hit")
+        addresses = await cache.resolve("localhost", 443)
+        assert metrics.get("dtv_upstream_dns_lookups_total", result="hit") == hits + 1
+        return addresses
+
+    assert asyncio.run(main())
+
+
+def test_dns_cache_is_bypassed_without_a_ttl(monkeypatch):
+    monkeypatch.setattr(settings, "upstream_dns_cache_ttl_seconds", None)
+    cache = DnsCache()
+
+    async def main():
+        misses = metrics.get("dtv_upstream_dns_lookups_total", result="miss")
+        await cache.resolve("localhost", 443)
+        await cache.resolve("localhost", 443)
+        assert (
+            metrics.get("dtv_upstream_dns_lookups_total", result="miss") == misses + 2
+        )
+
+    asyncio.run(main())
+
+
+def test_resolving_backend_tries_each_address():
+    cache = DnsCache()
+    stats = ConnectionStats()
+    cache._addresses[("example.com", 443)] = (float("inf"), ["192.0.2.1", "192.0.2.2"])
+    backend = FakeBackend(unreachable={"192.0.2.1"})
+
+    asyncio.run(ResolvingBackend(backend, cache, stats).connect_tcp("example.com", 443))
+
+    assert backend.connected == ["192.0.2.2"]
+    assert stats.connections == {"example.com": 1}
+
+
+def test_resolving_backend_races_past_blackholed_addresses(monkeypatch):
+    monkeypatch.setattr(connections, "HAPPY_EYEBALLS_DELAY", 0.01)
+    cache = DnsCache()
+    addresses = ["2001:db8::1", "2001:db8::2", "192.0.2.1"]
+    cache._addresses[("example.com", 443)] = (float("inf"), addresses)
+    backend = FakeBackend(unreachable=set(), blackholed=frozenset(addresses[:1]))
+
+    async def main():
+        async with asyncio.timeout(1):
+            backend_ = ResolvingBackend(backend, cache, ConnectionStats())
+            await backend_.connect_tcp("example.com", 443)
+
+    asyncio.run(main())
+
+    # The IPv4 address is tried second, not after every IPv6 one.
+    assert backend.connected == ["192.0.2.1"]
+
+
+def test_interleave_families_alternates_starting_with_the_first():
+    assert interleave_families(["::1", "::2", "10.0.0.1", "10.0.0.2"]) == [
+        "::1",
+        "10.0.0.1",
+        "::2",
+        "10.0.0.2",
+    ]
+    assert interleave_families(["10.0.0.1", "::1"]) == ["10.0.0.1", "::1"]
+    assert interleave_families([]) == []
+
+
+def test_resolving_backend_forgets_unreachable_hosts():
+    cache = DnsCache()
+    cache._addresses[("example.com", 443)] = (float("inf"), ["192.0.2.1"])
+    backend = FakeBackend(unreachable={"192.0.2.1"})
+
+    with pytest.raises(httpcore.ConnectError):
+        asyncio.run(
+            ResolvingBackend(backend, cache, ConnectionStats()).connect_tcp(
+                "example.com", 443
+            )
+        )
+    assert ("example.com", 443) not in cache._addresses
+
+
+def test_connection_stats_report_reuse():
+    stats = ConnectionStats()
+    stats.record_request("reuse.example")
+    stats.record_connection("reuse.example")
+    for _ in range(3):
+        stats.record_request("reuse.example")
+
+    ratio = metrics.get("dtv_upstream_connection_reuse_ratio", host="reuse.example")
+    assert ratio == 0.75
+
+
+def make_transport(
+    backend: httpcore.AsyncNetworkBackend, stats: ConnectionStats
+) -> UpstreamTransport:
+    cache = DnsCache()
+    cache._addresses[("example.com", 80)] = (float("inf"), ["192.0.2.1"])
+    return UpstreamTransport(httpx.Limits(), cache, stats, network_backend=backend)
+
+
+def test_upstream_transport_counts_requests_and_connections():
+    stats = ConnectionStats()
+    response = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"
+    transport = make_transport(httpcore.AsyncMockBackend([response] * 2), stats)
+
+    async def main():
+        async with httpx.AsyncClient(transport=transport) as client:
+            return [(await client.get("http://example.com/")).text for _ in "ab"]
+
+    assert asyncio.run(main()) == ["ok", "ok"]
+    assert stats.requests == {"example.com": 2}
+    assert stats.connections == {"example.com": 1}
+
+
+def test_upstream_transport_raises_httpx_errors():
+    transport = make_transport(
+        FakeBackend(unreachable={"192.0.2.1"}), ConnectionStats()
+    )
+
+    async def main():
+        async with httpx.AsyncClient(transport=transport) as client:
+            await client.get("http://example.com/")
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(main())
+
+
+def test_network_transport_goes_through_the_configured_proxy(monkeypatch):
+    monkeypatch.setattr(settings, "upstream_proxy_url", "http://proxy.example:3128")
+    transport = network_transport(httpx.Limits(), DnsCache(), ConnectionStats())
+
+    assert isinstance(transport, UpstreamTransport)
+    assert isinstance(transport._pool, httpcore.AsyncHTTPProxy)
+
+
+def test_resolving_backend_shares_the_connect_timeout(monkeypatch):
+    monkeypatch.setattr(connections, "HAPPY_EYEBALLS_DELAY", 0.05)
+    cache = DnsCache()
+    addresses = ["192.0.2.1", "192.0.2.2", "192.0.2.3"]
+    cache._addresses[("example.com", 443)] = (float("inf"), addresses)
+    backend = FakeBackend(unreachable=set(), blackholed=frozenset(addresses))
+
+    async def main():
+        started = asyncio.get_running_loop().time()
+        with pytest.raises(httpcore.ConnectTimeout):
+            await ResolvingBackend(backend, cache, ConnectionStats()).connect_tcp(
+                "example.com", 443, timeout=0.2
+            )
+        return asyncio.get_running_loop().time() - started
+
+    # Every attempt ends with the first one, not a full timeout after its start.
+    assert asyncio.run(main()) < 0.3
+    assert backend.timeouts[0] == pytest.approx(0.2, abs=0.01)
+    assert backend.timeouts[0] > backend.timeouts[1] > backend.timeouts[2]
+
+
+def test_prewarm_skips_failing_hosts():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "down.example":
+            raise httpx.ConnectError("down", request=request)
+        assert request.method == "HEAD"
+        return httpx.Response(200)
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await prewarm(client, ["up.example", "down.example", "up.example"])
+
+    assert asyncio.run(main()) == ["up.example"]
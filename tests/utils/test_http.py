@@ -1,3 +1,4 @@
+import asyncio
 import json
 from unittest.mock import AsyncMock, MagicMock
 
@@ -6,10 +7,22 @@ import pytest
 import tenacity
 from tenacity import wait_fixed
 
+from app.config import settings
+from app.utils import http
 from app.utils.http import (
+    HedgeBudget,
+    LatencyTracker,
+    Priority,
+    RequestPriority,
+    UpstreamScheduler,
+    day_priority,
     fetch_json_with_retry,
+    fetch_parsed_json_with_retry,
     fetch_with_retry,
+    revalidate_upstream,
+    user_facing,
 )
+from app.utils.http_cache import CACHE_STATUS_EXTENSION, CachingTransport
 
 
 @pytest.fixture
@@ -18,7 +31,7 @@ def mock_client():
 
 
 async def test_fetch_with_retry_success(mock_client):
-    mock_response = MagicMock(spec=httpx.Response)
+    mock_response = MagicMock(spec=httpx.Response, extensions={})
     mock_response.status_code = 200
     mock_response.json.return_value = {"key": "value"}
     mock_client.get.return_value = mock_response
@@ -29,6 +42,17 @@ async def test_fetch_with_retry_success(mock_client):
     mock_client.get.assert_called_once()
 
 
+async def test_fetch_with_retry_asks_for_revalidation(mock_client):
+    mock_response = MagicMock(spec=httpx.Response, extensions={})
+    mock_response.status_code = 200
+    mock_client.get.return_value = mock_response
+
+    revalidate_upstream.set(True)
+    await fetch_with_retry(mock_client, "http://example.com")
+
+    assert mock_client.get.call_args.kwargs["headers"] == {"Cache-Control": "no-cache"}
+
+
 @pytest.mark.parametrize(
     "exception",
     [
@@ -40,7 +64,7 @@ async def test_fetch_with_retry_success(mock_client):
 async def test_fetch_with_retry_retries_on_exception(mock_client, exception):
     mock_client.get.side_effect = [
         exception,
-        MagicMock(spec=httpx.Response, status_code=200),
+        MagicMock(spec=httpx.Response, extensions={}, status_code=200),
     ]
 
     await fetch_with_retry.retry_with(wait=wait_fixed(0))(
@@ -53,7 +77,7 @@ async def test_fetch_with_retry_retries_on_exception(mock_client, exception):
 async def test_fetch_with_retry_logs_retry_attempt(mock_client, caplog):
     mock_client.get.side_effect = [
         httpx.TimeoutException("timeout"),
-        MagicMock(spec=httpx.Response, status_code=200),
+        MagicMock(spec=httpx.Response, extensions={}, status_code=200),
     ]
 
     with caplog.at_level("WARNING"):
@@ -67,10 +91,10 @@ async def test_fetch_with_retry_logs_retry_attempt(mock_client, caplog):
 
 
 async def test_fetch_with_retry_5xx_error(mock_client):
-    mock_503_response = MagicMock(spec=httpx.Response, status_code=503)
+    mock_503_response = MagicMock(spec=httpx.Response, extensions={}, status_code=503)
     mock_client.get.side_effect = [
         mock_503_response,
-        MagicMock(spec=httpx.Response, status_code=200),
+        MagicMock(spec=httpx.Response, extensions={}, status_code=200),
     ]
 
     await fetch_with_retry.retry_with(wait=wait_fixed(0))(
@@ -106,7 +130,7 @@ async def test_fetch_with_retry_logs_all_retry_attempts(mock_client, caplog):
 
 
 async def test_fetch_json_with_retry_success(mock_client):
-    mock_response = MagicMock(spec=httpx.Response)
+    mock_response = MagicMock(spec=httpx.Response, extensions={})
     mock_response.status_code = 200
     mock_response.json.return_value = {"key": "value"}
     mock_client.get.return_value = mock_response
@@ -118,14 +142,14 @@ async def test_fetch_json_with_retry_success(mock_client):
 
 
 async def test_fetch_json_with_retry_json_decode_error_retry(mock_client):
-    mock_response_1 = MagicMock(spec=httpx.Response)
+    mock_response_1 = MagicMock(spec=httpx.Response, extensions={})
     mock_response_1.status_code = 200
     mock_response_1.json.side_effect = json.JSONDecodeError("Expecting value", "", 0)
     mock_response_1.headers = MagicMock()
     mock_response_1.headers.get.return_value = "application/json"
     mock_response_1.text = "invalid json"
 
-    mock_response_2 = MagicMock(spec=httpx.Response)
+    mock_response_2 = MagicMock(spec=httpx.Response, extensions={})
     mock_response_2.status_code = 200
     mock_response_2.json.return_value = {"key": "value"}
 
@@ -140,7 +164,7 @@ async def test_fetch_json_with_retry_json_decode_error_retry(mock_client):
 
 
 async def test_fetch_json_with_retry_logs_json_decode_error(mock_client, caplog):
-    mock_response = MagicMock(spec=httpx.Response)
+    mock_response = MagicMock(spec=httpx.Response, extensions={})
     mock_response.status_code = 200
     mock_response.json.side_effect = json.JSONDecodeError("Expecting value", "", 0)
     mock_response.headers = MagicMock()
@@ -164,7 +188,7 @@ async def test_fetch_json_with_retry_logs_json_decode_error(mock_client, caplog)
 
 
 async def test_fetch_json_with_retry_json_decode_error_final_failure(mock_client):
-    mock_response = MagicMock(spec=httpx.Response)
+    mock_response = MagicMock(spec=httpx.Response, extensions={})
     mock_response.status_code = 200
     mock_response.json.side_effect = json.JSONDecodeError("Expecting value", "", 0)
     mock_response.headers = MagicMock()
@@ -181,7 +205,7 @@ async def test_fetch_json_with_retry_json_decode_error_final_failure(mock_client
 
 
 async def test_fetch_json_with_retry_logs_all_retry_attempts(mock_client, caplog):
-    mock_response = MagicMock(spec=httpx.Response)
+    mock_response = MagicMock(spec=httpx.Response, extensions={})
     mock_response.status_code = 200
     mock_response.json.side_effect = json.JSONDecodeError("Expecting value", "", 0)
     mock_response.headers = MagicMock()
@@ -199,3 +223,318 @@ async def test_fetch_json_with_retry_logs_all_retry_attempts(mock_client, caplog
     assert len(caplog.records) == 5
     assert caplog.text.count("JSON decode error") == 3
     assert caplog.text.count("JSON fetch/parse attempt") == 2
+
+
+async def test_fetch_parsed_json_with_retry_reuses_result_on_revalidation():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"'})
+        return httpx.Response(200, headers={"ETag": '"v1"'}, json=[1, 2, 3])
+
+    parse = MagicMock(side_effect=lambda response_json: tuple(response_json))
+    url = "http://example.com/revalidated.json"
+
+    async with httpx.AsyncClient(
+        transport=CachingTransport(httpx.MockTransport(handler))
+    ) as client:
+        first = await fetch_parsed_json_with_retry(client, url, parse)
+        second = await fetch_parsed_json_with_retry(client, url, parse)
+
+    assert first == second == (1, 2, 3)
+    assert second is first
+    parse.assert_called_once()
+
+
+async def test_fetch_parsed_json_with_retry_reuses_result_for_identical_body(
+    mock_client,
+):
+    request = httpx.Request("GET", "http://example.com/identical.json")
+    mock_client.get.return_value = httpx.Response(200, json=[1, 2, 3], request=request)
+    parse = MagicMock(side_effect=lambda response_json: tuple(response_json))
+    url = "http://example.com/identical.json"
+
+    first = await fetch_parsed_json_with_retry(mock_client, url, parse)
+    second = await fetch_parsed_json_with_retry(mock_client, url, parse)
+
+    assert second is first
+    parse.assert_called_once()
+
+
+async def test_fetch_parsed_json_with_retry_parses_changed_body(mock_client):
+    request = httpx.Request("GET", "http://example.com/changed.json")
+    mock_client.get.side_effect = [
+        httpx.Response(200, json=[1], request=request),
+        httpx.Response(200, json=[2], request=request),
+    ]
+    url = "http://example.com/changed.json"
+
+    first = await fetch_parsed_json_with_retry(mock_client, url, tuple)
+    second = await fetch_parsed_json_with_retry(mock_client, url, tuple)
+
+    assert first == (1,)
+    assert second == (2,)
+
+
+async def test_upstream_scheduler_caps_concurrency_per_host():
+    scheduler = UpstreamScheduler(default_limit=2)
+    active = 0
+    max_active = 0
+
+    async def request(host: str) -> None:
+        nonlocal active, max_active
+        async with scheduler.slot(host, day_priority()):
+            active += 1
+            max_active = max(max_active, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    await asyncio.gather(*(request("a.example.com") for _ in range(6)))
+
+    assert max_active == 2
+
+
+async def test_upstream_scheduler_serves_waiters_in_priority_order():
+    scheduler = UpstreamScheduler(default_limit=1)
+    order: list[str] = []
+    release = asyncio.Event()
+
+    async def hold() -> None:
+        async with scheduler.slot("a.example.com", (Priority.USER, 0)):
+            await release.wait()
+
+    async def request(name: str, priority: RequestPriority) -> None:
+        async with scheduler.slot("a.example.com", priority):
+            order.append(name)
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiters = [
+        asyncio.create_task(request("prefetch", (Priority.PREFETCH, 6))),
+        asyncio.create_task(request("today", (Priority.TODAY, 0))),
+        asyncio.create_task(request("user", (Priority.USER, 3))),
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, *waiters)
+
+    assert order == ["user", "today", "prefetch"]
+
+
+async def test_upstream_scheduler_skips_cancelled_waiters():
+    scheduler = UpstreamScheduler(default_limit=1)
+    release = asyncio.Event()
+
+    async def hold() -> None:
+        async with scheduler.slot("a.example.com", day_priority()):
+            await release.wait()
+
+    async def request() -> str:
+        async with scheduler.slot("a.example.com", day_priority()):
+            return "done"
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    cancelled = asyncio.create_task(request())
+    waiting = asyncio.create_task(request())
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    release.set()
+
+    assert await waiting == "done"
+    await holder
+
+
+async def test_upstream_scheduler_paces_rate_limited_hosts():
+    scheduler = UpstreamScheduler(default_limit=4, host_rates={"a.example.com": 50})
+    starts: list[float] = []
+
+    async def request() -> None:
+        async with scheduler.slot("a.example.com", day_priority()):
+            starts.append(asyncio.get_running_loop().time())
+
+    await asyncio.gather(*(request() for _ in range(4)))
+
+    gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+    assert all(gap >= 0.015 for gap in gaps)
+
+
+async def test_upstream_scheduler_pacing_skips_cancelled_requests():
+    scheduler = UpstreamScheduler(default_limit=4, host_rates={"a.example.com": 10})
+    starts: list[float] = []
+
+    async def request() -> None:
+        async with scheduler.slot("a.example.com", day_priority()):
+            starts.append(asyncio.get_running_loop().time())
+
+    await request()
+    cancelled = asyncio.create_task(request())
+    await asyncio.sleep(0.02)
+    cancelled.cancel()
+    await request()
+
+    # The second start takes the slot the cancelled request waited for.
+    assert len(starts) == 2
+    assert 0.09 <= starts[1] - starts[0] < 0.15
+
+
+async def test_fetch_shared_retries_after_the_first_caller_gives_up(
+    mock_client, monkeypatch
+):
+    monkeypatch.setattr(fetch_with_retry.retry, "wait", wait_fixed(0))
+    seen = []
+
+    async def get(url, headers=None):
+        seen.append(user_facing.get())
+        await asyncio.sleep(0.02)
+        if len(seen) == 1:
+            raise httpx.TimeoutException("timeout")
+        return httpx.Response(200, request=httpx.Request("GET", url))
+
+    mock_client.get.side_effect = get
+
+    token = user_facing.set(True)
+    try:
+        with pytest.raises(TimeoutError):
+            async with asyncio.timeout(0.01):
+                await http.fetch_shared(mock_client, "http://example.com")
+        # A later caller joins the request, which retried on its own.
+        response = await http.fetch_shared(mock_client, "http://example.com")
+    finally:
+        user_facing.reset(token)
+
+    assert response.status_code == 200
+    # Both attempts ran at the first caller's priority.
+    assert seen == [True, True]
+
+
+async def test_fetch_json_coalesces_concurrent_fetches(mock_client):
+    async def get(url, headers=None):
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json=[1], request=httpx.Request("GET", url))
+
+    mock_client.get.side_effect = get
+
+    results = await asyncio.gather(
+        *(fetch_json_with_retry(mock_client, "http://example.com") for _ in range(3))
+    )
+
+    assert results == [[1], [1], [1]]
+    mock_client.get.assert_awaited_once()
+
+
+def test_day_priority_prefers_user_facing_requests():
+    assert day_priority(0) == (Priority.TODAY, 0)
+    assert day_priority(3) == (Priority.PREFETCH, 3)
+
+    token = user_facing.set(True)
+    try:
+        assert day_priority(3) == (Priority.USER, 3)
+    finally:
+        user_facing.reset(token)
+
+
+def test_latency_tracker_percentile_requires_min_samples():
+    tracker = LatencyTracker(min_samples=10)
+    for i in range(9):
+        tracker.record("a.example.com", i / 10)
+
+    assert tracker.percentile("a.example.com", 50) is None
+
+    tracker.record("a.example.com", 0.9)
+
+    assert tracker.percentile("a.example.com", 50) == 0.5
+    assert tracker.percentile("a.example.com", 100) == 0.9
+
+
+def test_hedge_budget_limits_hedges_to_ratio_of_requests():
+    budget = HedgeBudget(ratio=0.25)
+    hedges = 0
+    for _ in range(100):
+        budget.on_request()
+        hedges += budget.try_spend()
+
+    assert hedges == 25
+
+
+async def test_fetch_with_retry_hedges_slow_request(mock_client, monkeypatch):
+    monkeypatch.setattr(settings, "upstream_hedging_enabled", True)
+    monkeypatch.setattr(http, "hedge_budget", HedgeBudget(ratio=1.0))
+    tracker = LatencyTracker(min_samples=1)
+    tracker.record("hedge.example.com", 0.01)
+    monkeypatch.setattr(http, "latency_tracker", tracker)
+
+    fast_response = MagicMock(spec=httpx.Response, extensions={}, status_code=200)
+
+    async def get(url, headers=None):
+        if mock_client.get.call_count == 1:
+            await asyncio.sleep(10)
+        return fast_response
+
+    mock_client.get.side_effect = get
+
+    response = await fetch_with_retry(mock_client, "http://hedge.example.com")
+
+    assert response is fast_response
+    assert mock_client.get.call_count == 2
+
+
+async def test_fetch_with_retry_does_not_hedge_without_budget(mock_client, monkeypatch):
+    monkeypatch.setattr(settings, "upstream_hedging_enabled", True)
+    monkeypatch.setattr(http, "hedge_budget", HedgeBudget(ratio=0.0))
+    tracker = LatencyTracker(min_samples=1)
+    tracker.record("hedge.example.com", 0.001)
+    monkeypatch.setattr(http, "latency_tracker", tracker)
+
+    async def get(url, headers=None):
+        await asyncio.sleep(0.02)
+        return MagicMock(spec=httpx.Response, extensions={}, status_code=200)
+
+    mock_client.get.side_effect = get
+
+    await fetch_with_retry(mock_client, "http://hedge.example.com")
+
+    assert mock_client.get.call_count == 1
+
+
+async def test_fetch_with_retry_cancels_request_while_waiting_to_hedge(
+    mock_client, monkeypatch
+):
+    monkeypatch.setattr(settings, "upstream_hedging_enabled", True)
+    tracker = LatencyTracker(min_samples=1)
+    tracker.record("hedge.example.com", 10)
+    monkeypatch.setattr(http, "latency_tracker", tracker)
+    cancelled = asyncio.Event()
+
+    async def get(url, headers=None):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    mock_client.get.side_effect = get
+
+    fetch = asyncio.create_task(
+        fetch_with_retry(mock_client, "http://hedge.example.com")
+    )
+    await asyncio.sleep(0.01)
+    fetch.cancel()
+
+    async with asyncio.timeout(1):
+        await cancelled.wait()
+
+
+async def test_fetch_with_retry_leaves_fresh_cache_hits_out_of_latency(
+    mock_client, monkeypatch
+):
+    tracker = LatencyTracker(min_samples=1)
+    monkeypatch.setattr(http, "latency_tracker", tracker)
+    mock_client.get.return_value = httpx.Response(
+        200,
+        request=httpx.Request("GET", "http://cached.example.com"),
+        extensions={CACHE_STATUS_EXTENSION: "fresh"},
+    )
+
+    await fetch_with_retry(mock_client, "http://cached.example.com")
+
+    assert tracker.percentile("cached.example.com", 50) is None
@@ -0,0 +1,150 @@
+import httpx
+import pytest
+
+from app.utils.http_cache import (
+    CACHE_STATUS_EXTENSION,
+    CachingTransport,
+    cache_key,
+    freshness_lifetime,
+)
+
+
+def make_client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=CachingTransport(httpx.MockTransport(handler)))
+
+
+def test_cache_key_removes_cache_buster():
+    assert (
+        cache_key("https://example.com/list.json?_=1700000000000&a=1")
+        == "https://example.com/list.json?a=1"
+    )
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        ({}, 0.0),
+        ({"Cache-Control": "max-age=60"}, 60.0),
+        ({"Cache-Control": "max-age=60", "Age": "20"}, 40.0),
+        ({"Cache-Control": "no-cache, max-age=60"}, 0.0),
+        (
+            {
+                "Date": "Mon, 01 Jan 2024 00:00:00 GMT",
+                "Expires": "Mon, 01 Jan 2024 00:05:00 GMT",
+            },
+            300.0,
+        ),
+    ],
+)
+def test_freshness_lifetime(headers, expected):
+    assert freshness_lifetime(httpx.Headers(headers)) == expected
+
+
+async def test_caching_transport_revalidates_with_etag():
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"'})
+        return httpx.Response(200, headers={"ETag": '"v1"'}, json={"key": "value"})
+
+    async with make_client(handler) as client:
+        first = await client.get("https://example.com/data.json?_=1")
+        second = await client.get("https://example.com/data.json?_=2")
+
+    assert first.extensions[CACHE_STATUS_EXTENSION] == "miss"
+    assert second.status_code == 200
+    assert second.extensions[CACHE_STATUS_EXTENSION] == "revalidated"
+    assert second.json() == {"key": "value"}
+    assert "If-None-Match" not in requests[0].headers
+    assert requests[1].headers["If-None-Match"] == '"v1"'
+
+
+async def test_caching_transport_sends_if_modified_since():
+    last_modified = "Mon, 01 Jan 2024 00:00:00 GMT"
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, headers={"Last-Modified": last_modified}, text="a")
+
+    async with make_client(handler) as client:
+        await client.get("https://example.com/page.html")
+        await client.get("https://example.com/page.html")
+
+    assert requests[1].headers["If-Modified-Since"] == last_modified
+
+
+async def test_caching_transport_serves_fresh_entry_without_request():
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(200, headers={"Cache-Control": "max-age=60"}, text="a")
+
+    async with make_client(handler) as client:
+        await client.get("https://example.com/page.html")
+        response = await client.get("https://example.com/page.html")
+
+    assert calls == 1
+    assert response.text == "a"
+    assert response.extensions[CACHE_STATUS_EXTENSION] == "fresh"
+
+
+async def test_caching_transport_does_not_store_no_store_response():
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(
+            200, headers={"ETag": '"v1"', "Cache-Control": "no-store"}, text="a"
+        )
+
+    async with make_client(handler) as client:
+        await client.get("https://example.com/page.html")
+        await client.get("https://example.com/page.html")
+
+    assert "If-None-Match" not in requests[1].headers
+
+
+async def test_caching_transport_drops_entry_replaced_by_unstorable_response():
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if len(requests) == 1:
+            return httpx.Response(200, headers={"ETag": '"v1"'}, text="v1")
+        return httpx.Response(200, headers={"Cache-Control": "no-store"}, text="v2")
+
+    async with make_client(handler) as client:
+        await client.get("https://example.com/page.html")
+        second = await client.get("https://example.com/page.html")
+        third = await client.get("https://example.com/page.html")
+
+    assert second.text == third.text == "v2"
+    # The old validators no longer describe what upstream serves.
+    assert "If-None-Match" not in requests[2].headers
+
+
+async def test_caching_transport_revalidates_fresh_entry_on_no_cache():
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(
+            200, headers={"ETag": '"v1"', "Cache-Control": "max-age=60"}, json=[]
+        )
+
+    async with make_client(handler) as client:
+        await client.get("https://example.com/data.json")
+        fresh = await client.get("https://example.com/data.json")
+        forced = await client.get(
+            "https://example.com/data.json", headers={"Cache-Control": "no-cache"}
+        )
+
+    assert fresh.extensions[CACHE_STATUS_EXTENSION] == "fresh"
+    assert forced.extensions[CACHE_STATUS_EXTENSION] == "miss"
+    assert len(requests) == 2
+    assert requests[1].headers["If-None-Match"] == '"v1"'
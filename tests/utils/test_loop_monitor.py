@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+from app.config import settings
+from app.utils.loop_monitor import LoopLagMonitor, recent_slow_stages, stage
+from app.utils.metrics import metrics
+
+
+def test_stage_records_slow_stage(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "loop_slow_threshold_seconds", 0.0)
+    before = metrics.get("dtv_stage_slow_total", stage="test_slow")
+
+    with caplog.at_level("WARNING"):
+        with stage("test_slow"):
+            time.sleep(0.001)
+
+    assert metrics.get("dtv_stage_slow_total", stage="test_slow") == before + 1
+    assert recent_slow_stages[-1].name == "test_slow"
+    assert any("Slow stage test_slow" in r.message for r in caplog.records)
+
+
+def test_stage_does_not_record_fast_stage(monkeypatch):
+    monkeypatch.setattr(settings, "loop_slow_threshold_seconds", 10.0)
+    before = metrics.get("dtv_stage_slow_total", stage="test_fast")
+
+    with stage("test_fast"):
+        pass
+
+    assert metrics.get("dtv_stage_slow_total", stage="test_fast") == before
+    assert metrics.get("dtv_stage_calls_total", stage="test_fast") >= 1
+
+
+async def test_loop_lag_monitor_detects_blocking_call(caplog):
+    monitor = LoopLagMonitor(interval=0.01, slow_threshold=0.05)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.02)
+        with caplog.at_level("WARNING"):
+            time.sleep(0.1)  # block the event loop
+            await asyncio.sleep(0.05)
+    finally:
+        await monitor.stop()
+
+    assert monitor.max_lag >= 0.05
+    assert any("Event loop lagged" in r.message for r in caplog.records)
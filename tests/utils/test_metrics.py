@@ -0,0 +1,39 @@
+from app.utils.metrics import Metrics
+
+
+def test_metrics_render_counters_and_gauges():
+    metrics = Metrics()
+    metrics.describe("requests_total", "Requests served.")
+    metrics.inc("requests_total", path="a")
+    metrics.inc("requests_total", 2, path="a")
+    metrics.set_gauge("lag_seconds", 0.25)
+
+    rendered = metrics.render()
+
+    assert "# HELP requests_total Requests served." in rendered
+    assert "# TYPE requests_total counter" in rendered
+    assert 'requests_total{path="a"} 3' in rendered
+    assert "# TYPE lag_seconds gauge" in rendered
+    assert "lag_seconds 0.25" in rendered
+
+
+def test_metrics_get_returns_zero_for_unknown_series():
+    metrics = Metrics()
+    metrics.inc("requests_total", path="a")
+
+    assert metrics.get("requests_total", path="a") == 1
+    assert metrics.get("requests_total", path="b") == 0
+
+
+def test_metrics_gauge_callback_is_evaluated_on_render():
+    metrics = Metrics()
+    metrics.gauge_callback("cache_bytes", lambda: {(("cache", "x"),): 42.0})
+
+    assert 'cache_bytes{cache="x"} 42' in metrics.render()
+
+
+def test_metrics_escapes_label_values():
+    metrics = Metrics()
+    metrics.inc("errors_total", reason='bad "quote"')
+
+    assert 'errors_total{reason="bad \\"quote\\""} 1' in metrics.render()